@@ -0,0 +1,80 @@
+"""
+Throughput and peak memory of `BatchScorer` for several numbers of worker processes, scoring data/train.csv replicated
+to `--rows` rows and saved as Parquet.
+
+A GradientBoosting pipeline fitted on data/train.csv is registered in a temporary registry, so the benchmark does not
+depend on the trained models on disk. Every run is the `python -m src.batch_scoring` command in its own process, and
+peak memory is the largest resident set size of that process and its workers; it should stay flat as `--rows` grows,
+since it depends on `--chunksize` and the number of workers only. Throughput scales with the workers up to the number
+of CPUs, which the script prints.
+
+Run from the repository root with `python -m benchmarks.batch_scoring [--rows 1000000] [--workers 0,1,2,4]`.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.fused_preprocessing import replicate
+from src.data_preprocessing import tree_preprocessor
+from src.ingest_data import DataIngestorFactory
+from src.model_registry import ModelRegistry
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+
+
+def run_scoring(input_path: str, output_path: str, registry_dir: str, n_workers: int, chunksize: int):
+    """Runs the scoring command and returns its seconds and its peak resident set size in MB."""
+    command = [sys.executable, '-m', 'src.batch_scoring', input_path, output_path, '--workers', str(n_workers),
+               '--chunksize', str(chunksize), '--registry-dir', registry_dir]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # The resource usage of this child and of the workers it waited for
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"Scoring failed: {' '.join(command)}")
+    return seconds, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch scoring of a Parquet file.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', default='0,1,2,4', help="The comma-separated numbers of workers to run.")
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    args = parser.parse_args()
+
+    data = DataIngestorFactory().get_data_ingestor('.csv').ingest(DATA_PATH)
+    X, y = data.drop(columns=['Id', 'SalePrice']), data[['SalePrice']]
+    scaler = StandardScaler().fit(np.log(y))
+    pipeline = Pipeline(steps=[('preprocessor', clone(tree_preprocessor)),
+                               ('model', GradientBoostingRegressor(n_estimators=200, max_depth=4, random_state=42))])
+    pipeline.fit(X, scaler.transform(np.log(y)).ravel())
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        registry_dir = os.path.join(tmp_dir, 'registry')
+        ModelRegistry(registry_dir).register("GradientBoosting_v1.0", pipeline, scaler)
+        input_path = os.path.join(tmp_dir, 'houses.parquet')
+        houses = replicate(data, args.rows)
+        houses['Id'] = np.arange(1, args.rows + 1)
+        houses.to_parquet(input_path)
+        del houses
+
+        print(f"{args.rows} rows, chunks of {args.chunksize}, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} | {'seconds':>8} | {'rows/s':>9} | {'peak RSS (MB)':>13}")
+        for n_workers in (int(value) for value in args.workers.split(',')):
+            seconds, peak_mb = run_scoring(input_path, os.path.join(tmp_dir, 'prices.parquet'), registry_dir,
+                                           n_workers, args.chunksize)
+            print(f"{n_workers:>7} | {seconds:>8.2f} | {args.rows / seconds:>9.0f} | {peak_mb:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
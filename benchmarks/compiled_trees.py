@@ -0,0 +1,119 @@
+"""
+Single-record and batch prediction latency of saved tree pipelines, sklearn versus `compile_pipeline`, on
+data/train.csv.
+
+    GradientBoosting    tree_preprocessor + GradientBoostingRegressor(n_estimators=300, max_depth=4)
+    RandomForest        tree_preprocessor + RandomForestRegressor(n_estimators=100)
+
+Single-record latency is the median over `--records` calls with one row each, as `PredictionService` predicts.
+Batch latency is one call on the rows replicated to `--rows`. Both are measured for the whole pipeline, preprocessing
+included, and for the model alone on the preprocessed matrix. The match check compares the compiled predictions with
+sklearn's on the batch, and those of a shallow and a deep tree model fitted on the preprocessed matrix with a tenth of
+its entries set to NaN, so the missing-value directions of both layouts are exercised. The script exits with status 1
+when a difference exceeds `--tolerance`.
+
+Run from the repository root with `python -m benchmarks.compiled_trees [--rows 100000]`.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.tree import DecisionTreeRegressor
+
+from benchmarks.fused_preprocessing import replicate
+from src.compiled_trees import CompiledTreeEnsemble, compile_pipeline
+from src.data_preprocessing import tree_preprocessor
+from src.ingest_data import DataIngestorFactory
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+MODELS = {
+    "GradientBoosting": GradientBoostingRegressor(n_estimators=300, max_depth=4, random_state=42),
+    "RandomForest": RandomForestRegressor(n_estimators=100, random_state=42),
+}
+# Fitted on a matrix with missing values; the shallow tree fits in the complete levels, the forest's trees do not
+MISSING_VALUE_MODELS = {
+    "DecisionTree": DecisionTreeRegressor(max_depth=6, random_state=42),
+    "RandomForest": RandomForestRegressor(n_estimators=20, random_state=42),
+}
+
+
+def median_latency(predict, rows) -> float:
+    """The median seconds of one `predict` call per row of `rows`."""
+    predict(rows[0])
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def batch_latency(predict, X):
+    start = time.perf_counter()
+    predictions = predict(X)
+    return predictions, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compiled tree pipelines against sklearn.")
+    parser.add_argument('--rows', type=int, default=100_000, help="The number of rows of the batch.")
+    parser.add_argument('--records', type=int, default=200, help="The number of single-record calls.")
+    parser.add_argument('--tolerance', type=float, default=1e-9, help="The largest accepted prediction difference.")
+    args = parser.parse_args()
+
+    data = DataIngestorFactory().get_data_ingestor('.csv').ingest(DATA_PATH)
+    X, y = data.drop(columns=['Id', 'SalePrice']), np.log(data['SalePrice'])
+    X_batch = replicate(X, args.rows)
+    records = [X.iloc[[i]] for i in range(min(args.records, len(X)))]
+
+    print(f"{'model':<17} | {'step':<8} | {'record sklearn (ms)':>19} | {'record compiled (ms)':>20} | "
+          f"{'batch sklearn (s)':>17} | {'batch compiled (s)':>18} | {'max abs diff':>12}")
+    failed = False
+    for name, model in MODELS.items():
+        pipeline = Pipeline(steps=[('preprocessor', clone(tree_preprocessor)), ('model', clone(model))]).fit(X, y)
+        compiled = compile_pipeline(pipeline)
+
+        X_matrix = pipeline[0].transform(X_batch)
+        X_matrix = X_matrix.toarray() if hasattr(X_matrix, 'toarray') else np.asarray(X_matrix)
+        matrix_records = [X_matrix[[i]] for i in range(len(records))]
+
+        steps = (
+            ("pipeline", pipeline.predict, compiled.predict, records, X_batch),
+            ("model", pipeline[-1].predict, compiled.ensemble.predict, matrix_records, X_matrix),
+        )
+        for step, reference, candidate, step_records, step_batch in steps:
+            reference_record = median_latency(reference, step_records)
+            candidate_record = median_latency(candidate, step_records)
+            expected, reference_batch = batch_latency(reference, step_batch)
+            predictions, candidate_batch = batch_latency(candidate, step_batch)
+            max_abs_diff = float(np.max(np.abs(expected - predictions)))
+            failed |= max_abs_diff > args.tolerance
+            print(f"{name:<17} | {step:<8} | {reference_record * 1e3:>19.3f} | {candidate_record * 1e3:>20.3f} | "
+                  f"{reference_batch:>17.2f} | {candidate_batch:>18.2f} | {max_abs_diff:>12.2e}"
+                  f"{'  FAIL' if max_abs_diff > args.tolerance else ''}")
+
+        ensemble = compiled.ensemble
+        print(f"{name:<17} | compiled into {ensemble.n_trees} trees of depth <= {ensemble.max_depth}, "
+              f"{ensemble.complete_depth} complete levels, {ensemble.nbytes / 2 ** 20:.1f} MB")
+
+    X_missing = pipeline[0].transform(X)
+    X_missing = X_missing.toarray() if hasattr(X_missing, 'toarray') else np.array(X_missing, dtype=np.float64)
+    X_missing[np.random.default_rng(42).random(X_missing.shape) < 0.1] = np.nan
+    for name, model in MISSING_VALUE_MODELS.items():
+        model = clone(model).fit(X_missing, y)
+        missing_diff = float(np.max(np.abs(model.predict(X_missing)
+                                           - CompiledTreeEnsemble.from_estimator(model).predict(X_missing))))
+        failed |= missing_diff > args.tolerance
+        print(f"{name:<17} | {'NaN':<8} | {'-':>19} | {'-':>20} | {'-':>17} | {'-':>18} | {missing_diff:>12.2e}"
+              f"{'  FAIL' if missing_diff > args.tolerance else ''}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Peak memory and per-fold overhead of hyperparameter searches with the in-memory and the memory-mapped CV backends, on
+data/train.csv read without a schema, so its text columns are strings as in a plain `pd.read_csv`, and bootstrapped to
+`--scale` times its rows.
+
+    dispatch            GridSearchCV of a DummyRegressor, 4 candidates x 5 folds; the fits take no time, so the
+                        wall time per fit is the cost of shipping the data to the workers and slicing the folds
+    LinearRegression    the LinearRegressionStrategy pipeline, one-hot preprocessing included, 2 candidates x 5 folds
+
+Every search runs in its own process with `--workers` joblib workers. Peak memory is the largest sum over that process
+and all its workers of the proportional set size, which counts pages shared between processes, such as the mapped
+training data, once rather than once per worker. The script reads /proc and so runs on Linux only.
+
+Run from the repository root with `python -m benchmarks.cv_backends [--scale 50] [--workers 8]`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.suite import synthesize
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+BACKENDS = ('memory', 'memmap')
+WORKLOADS = ('dispatch', 'LinearRegression')
+
+
+def descendants(pid: int) -> List[int]:
+    """The process and all its live descendants."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The parent pid follows the parenthesized command name, which may contain spaces
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(parent, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def total_pss_mb(pid: int) -> float:
+    total_kb = 0
+    for process in descendants(pid):
+        try:
+            with open(f'/proc/{process}/smaps_rollup') as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+        except (OSError, StopIteration):
+            continue
+    return total_kb / 1024
+
+
+def measure(backend: str, workload: str, scale: int, n_workers: int) -> Dict[str, float]:
+    """Runs one search in a child process while sampling the memory of its process tree."""
+    command = [sys.executable, '-m', 'benchmarks.cv_backends', '--run', backend, '--workload', workload,
+               '--scale', str(scale), '--workers', str(n_workers)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    peak = [0.0]
+
+    def sample():
+        while process.poll() is None:
+            peak[0] = max(peak[0], total_pss_mb(process.pid))
+            time.sleep(0.02)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    output, _ = process.communicate()
+    sampler.join()
+    if process.returncode != 0:
+        raise RuntimeError(f"The search failed: {' '.join(command)}")
+    return {**json.loads(output.strip().splitlines()[-1]), "peak_pss_mb": peak[0]}
+
+
+def run(backend: str, workload: str, scale: int, n_workers: int):
+    """Runs one search in this process and prints its timings as JSON."""
+    import numpy as np
+    import pandas as pd
+    from sklearn.dummy import DummyRegressor
+    from sklearn.model_selection import GridSearchCV
+    from sklearn.pipeline import Pipeline
+
+    from pipelines.linear_regression_pipeline import LinearRegressionStrategy
+    from src.cv_backend import InMemoryCVBackend, MemmapCVBackend
+    from src.model_building import ModelBuilder
+
+    data = synthesize(pd.read_csv(DATA_PATH), scale)
+    X, y = data.drop(columns=['Id', 'SalePrice']), np.log(data['SalePrice'])
+    cv_backend = MemmapCVBackend() if backend == 'memmap' else InMemoryCVBackend()
+
+    start = time.perf_counter()
+    if workload == 'dispatch':
+        with cv_backend.share(X, y) as (X_shared, y_shared):
+            search = GridSearchCV(Pipeline(steps=[('model', DummyRegressor())]),
+                                  {'model__strategy': ['mean', 'median', 'quantile'], 'model__quantile': [0.25, 0.75]},
+                                  cv=5, n_jobs=n_workers, error_score='raise')
+            search.fit(X_shared, y_shared)
+        n_fits = 4 * 5
+    else:
+        strategy = LinearRegressionStrategy(param_grid={'model__fit_intercept': [True, False]}, cv_backend=cv_backend)
+        strategy.set_n_jobs(n_workers)
+        ModelBuilder(strategy).build_model(X, y)
+        n_fits = 2 * 5
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "ms_per_fit": seconds / n_fits * 1000}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-memory and memory-mapped CV backends.")
+    parser.add_argument('--scale', type=int, default=50, help="The multiple of the rows of data/train.csv.")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--run', choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument('--workload', choices=WORKLOADS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        run(args.run, args.workload, args.scale, args.workers)
+        return
+
+    print(f"{args.scale}x rows, {args.workers} workers, {os.cpu_count()} CPUs")
+    print(f"{'workload':<16} | {'backend':<7} | {'seconds':>8} | {'ms per fit':>10} | {'peak PSS (MB)':>13}")
+    for workload in WORKLOADS:
+        for backend in BACKENDS:
+            result = measure(backend, workload, args.scale, args.workers)
+            print(f"{workload:<16} | {backend:<7} | {result['seconds']:>8.2f} | {result['ms_per_fit']:>10.0f} | "
+                  f"{result['peak_pss_mb']:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Overhead of drift monitoring on the scoring path, and a check that it flags shifted data and only that, on
+data/train.csv.
+
+A GradientBoosting pipeline fitted on data/train.csv is registered with the reference profile of its training data in a
+temporary registry, so the benchmark does not depend on the trained models on disk.
+
+    single record   the median latency of `PredictionService.predict_frame` for one house, with and without a
+                    monitor, called in turn on each of `--records` houses
+    batch           the best of `--repeats` alternating runs of `BatchScorer` in the current process on the rows
+                    replicated to `--rows`, with and without a monitor, so the counting runs on the same CPU as the
+                    predictions
+
+The check scores the training data, which should drift nowhere, and a copy with GrLivArea scaled by 1.3, a tenth of
+the neighborhoods replaced by an unseen one and LotFrontage missing in a third of the rows, which should drift in
+those three columns. The script exits with status 1 when the drifted columns differ from these.
+
+Run from the repository root with `python -m benchmarks.drift_monitor [--rows 500000]`.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.compiled_trees import median_latency
+from benchmarks.fused_preprocessing import replicate
+from src.batch_scoring import BatchScorer
+from src.data_preprocessing import tree_preprocessor
+from src.drift_monitor import DriftMonitor, ReferenceProfile
+from src.ingest_data import DataIngestorFactory
+from src.model_registry import ModelRegistry
+from src.prediction_service import PredictionService
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+SHIFTED_COLUMNS = ['GrLivArea', 'LotFrontage', 'Neighborhood']
+
+
+def shift(data: pd.DataFrame) -> pd.DataFrame:
+    shifted = data.copy()
+    rng = np.random.default_rng(42)
+    shifted['GrLivArea'] = shifted['GrLivArea'] * 1.3
+    shifted['Neighborhood'] = shifted['Neighborhood'].astype(object)
+    shifted.loc[rng.random(len(shifted)) < 0.1, 'Neighborhood'] = 'NewDevelopment'
+    shifted.loc[rng.random(len(shifted)) < 0.33, 'LotFrontage'] = np.nan
+    return shifted
+
+
+def drifted_columns(profile: ReferenceProfile, data: pd.DataFrame):
+    return sorted(DriftMonitor(profile).update(data).report()["drifted"])
+
+
+def interleaved_latencies(predicts, rows):
+    """The median seconds of one call per row of each predict, calling them in turn on every row."""
+    timings = {key: [] for key in predicts}
+    for predict in predicts.values():
+        predict(rows[0])
+    for row in rows:
+        for key, predict in predicts.items():
+            start = time.perf_counter()
+            predict(row)
+            timings[key].append(time.perf_counter() - start)
+    return {key: float(np.median(values)) for key, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the overhead of drift monitoring on scoring.")
+    parser.add_argument('--rows', type=int, default=500_000, help="The number of rows of the batch.")
+    parser.add_argument('--records', type=int, default=200, help="The number of single-record calls.")
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--repeats', type=int, default=3, help="The number of runs of each batch.")
+    args = parser.parse_args()
+
+    data = DataIngestorFactory().get_data_ingestor('.csv').ingest(DATA_PATH)
+    X, y = data.drop(columns=['Id', 'SalePrice']), data[['SalePrice']]
+    scaler = StandardScaler().fit(np.log(y))
+    pipeline = Pipeline(steps=[('preprocessor', clone(tree_preprocessor)),
+                               ('model', GradientBoostingRegressor(n_estimators=200, max_depth=4, random_state=42))])
+    pipeline.fit(X, scaler.transform(np.log(y)).ravel())
+    profile = ReferenceProfile.build(X)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        registry_dir = os.path.join(tmp_dir, 'registry')
+        ModelRegistry(registry_dir).register("GradientBoosting_v1.0", pipeline, scaler, profile=profile.to_dict())
+
+        services = {monitored: PredictionService.from_registry("GradientBoosting", ModelRegistry(registry_dir),
+                                                               monitor_drift=monitored) for monitored in (False, True)}
+        # Houses as the service builds them from JSON records
+        records = [services[False].to_frame([record]) for record in data.head(args.records).to_dict('records')]
+        latencies = interleaved_latencies({monitored: service.predict_frame for monitored, service in services.items()},
+                                          records)
+        update_latency = median_latency(DriftMonitor(profile).update, records)
+
+        input_path = os.path.join(tmp_dir, 'houses.parquet')
+        replicate(data, args.rows).to_parquet(input_path)
+        # Alternating the runs spreads the drift of the machine over both
+        seconds = {False: float('inf'), True: float('inf')}
+        for _ in range(args.repeats):
+            for monitored in (False, True):
+                scorer = BatchScorer("GradientBoosting", registry_dir, n_workers=0, chunksize=args.chunksize,
+                                     monitor_drift=monitored)
+                start = time.perf_counter()
+                scorer.score(input_path, os.path.join(tmp_dir, 'prices.parquet'))
+                seconds[monitored] = min(seconds[monitored], time.perf_counter() - start)
+
+    print(f"profile: {len(profile.columns)} columns, {len(str(profile.to_dict())) / 1024:.1f} KB, "
+          f"{DriftMonitor(profile).counts.nbytes} bytes of counts")
+    print(f"{'path':<14} | {'unmonitored':>11} | {'monitored':>9} | {'overhead':>8}")
+    print(f"{'record (ms)':<14} | {latencies[False] * 1e3:>11.3f} | {latencies[True] * 1e3:>9.3f} | "
+          f"{latencies[True] / latencies[False] - 1:>8.1%}   (update alone {update_latency * 1e3:.3f} ms)")
+    print(f"{'batch (s)':<14} | {seconds[False]:>11.2f} | {seconds[True]:>9.2f} | "
+          f"{seconds[True] / seconds[False] - 1:>8.1%}   ({args.rows} rows)")
+
+    for name, frame, expected in (("training data", X, []), ("shifted data", shift(X), SHIFTED_COLUMNS)):
+        drifted = drifted_columns(profile, frame)
+        failed |= drifted != expected
+        print(f"{name}: drifted {drifted}{'  FAIL' if drifted != expected else ''}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Load time and peak memory of the untyped CSV path versus typed CSV, Parquet and Feather ingestion with column
+projection, on data/train.csv replicated to n rows. Every measurement runs in a fresh process so peak RSS is not
+shared between runs.
+
+Run from the repository root with `python -m benchmarks.ingestion [n_rows]`.
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from src.data_preprocessing import get_required_columns
+from src.data_schema import ID_COLUMN, TARGET_COLUMN, HOUSE_PRICES_SCHEMA
+from src.ingest_data import DataIngestorFactory
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+
+
+def current_rss_mb() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def measure(label: str, file_path: str, typed: bool, projected: bool, results):
+    columns = [ID_COLUMN, *get_required_columns(), TARGET_COLUMN] if projected else None
+    rss_before = current_rss_mb()
+
+    start = time.perf_counter()
+    if typed:
+        df = DataIngestorFactory().get_data_ingestor(os.path.splitext(file_path)[1]).ingest(file_path, columns)
+    else:
+        df = pd.read_csv(file_path)
+    elapsed = time.perf_counter() - start
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((label, elapsed, peak_rss_mb - rss_before, df.memory_usage(deep=True).sum() / 1024 ** 2))
+
+
+def run_isolated(*args):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(*args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main(n_rows: int):
+    data = pd.read_csv(DATA_PATH, dtype=HOUSE_PRICES_SCHEMA)
+    data = pd.concat([data] * -(-n_rows // len(data)), ignore_index=True).iloc[:n_rows]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'train.csv')
+        parquet_path = os.path.join(tmp_dir, 'train.parquet')
+        feather_path = os.path.join(tmp_dir, 'train.feather')
+        data.to_csv(csv_path, index=False)
+        data.to_parquet(parquet_path, index=False)
+        data.reset_index(drop=True).to_feather(feather_path)
+        del data
+
+        runs = [
+            ("csv, untyped (current)", csv_path, False, False),
+            ("csv, typed + projected", csv_path, True, True),
+            ("parquet, typed + projected", parquet_path, True, True),
+            ("feather, typed + projected", feather_path, True, True),
+        ]
+        print(f"rows: {n_rows}")
+        print(f"{'ingestion':<28} | {'load (s)':>8} | {'peak RSS delta (MB)':>19} | {'dataframe (MB)':>14}")
+        for run in runs:
+            label, elapsed, rss_delta, frame_mb = run_isolated(*run)
+            print(f"{label:<28} | {elapsed:>8.2f} | {rss_delta:>19.1f} | {frame_mb:>14.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
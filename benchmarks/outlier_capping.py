@@ -0,0 +1,52 @@
+"""
+Per-call latency of OutlierHandlerCap.transform for fitted bounds versus bounds recomputed from every batch.
+
+Run from the repository root with `python -m benchmarks.outlier_capping`.
+"""
+import os
+import time
+
+import numpy as np
+
+from src.data_preprocessing import numerical_features
+from src.ingest_data import DataIngestorFactory
+from src.outlier_detection import OutlierHandlerCap
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+BATCH_SIZES = [1, 100, 100_000]
+
+
+def time_per_call(func, n_calls: int) -> float:
+    """Returns the median wall time of `func()` in microseconds over `n_calls` calls."""
+    timings = []
+    for _ in range(n_calls):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1e6
+
+
+def main():
+    data = DataIngestorFactory().get_data_ingestor('.csv').ingest(DATA_PATH)
+    X = data[numerical_features]
+    rng = np.random.default_rng(42)
+
+    fitted_handler = OutlierHandlerCap(method='iqr', threshold=1.5).fit(X)
+    per_batch_handler = OutlierHandlerCap(method='iqr', threshold=1.5, per_batch=True).fit(X)
+
+    print(f"{'batch size':>10} | {'per-batch bounds (us)':>22} | {'fitted bounds (us)':>19} | {'fitted, ndarray in place (us)':>30}")
+    for batch_size in BATCH_SIZES:
+        batch = X.iloc[rng.integers(0, len(X), size=batch_size)].reset_index(drop=True)
+        batch_array = np.ascontiguousarray(batch, dtype=np.float64)
+        in_place_handler = OutlierHandlerCap(method='iqr', threshold=1.5, copy=False).fit(X)
+        n_calls = 2000 if batch_size <= 100 else 20
+
+        per_batch = time_per_call(lambda: per_batch_handler.transform(batch), n_calls)
+        fitted = time_per_call(lambda: fitted_handler.transform(batch), n_calls)
+        in_place = time_per_call(lambda: in_place_handler.transform(batch_array), n_calls)
+
+        print(f"{batch_size:>10} | {per_batch:>22.1f} | {fitted:>19.1f} | {in_place:>30.1f}")
+
+
+if __name__ == '__main__':
+    main()
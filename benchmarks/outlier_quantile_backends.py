@@ -0,0 +1,123 @@
+"""
+Fit time, peak memory and accuracy of the IQR bounds of OutlierHandlerCap with the exact and the KLL quantile backends
+on 10M rows bootstrapped from numeric columns of data/train.csv.
+
+    exact               `fit` on the whole array, np.nanpercentile
+    kll                 `fit` on the whole array
+    kll, chunked        `partial_fit` on 1M-row chunks, as when streaming a file
+    kll, 4 workers      four handlers fitted on a quarter of the rows each, then merged
+
+Peak memory is the tracemalloc peak of the fit above the memory held before it, measured in a separate run so tracing
+does not slow the timed run down. The accuracy check compares every KLL bound with the exact one: the bounds are
+derived from Q1 and Q3, so the rank error of the sketched quartiles, the fraction of rows below them minus 0.25 or
+0.75, is the quantity that must stay within `--tolerance`. The script exits with status 1 when it does not.
+
+Run from the repository root with `python -m benchmarks.outlier_quantile_backends [--rows 10000000]`.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.ingest_data import DataIngestorFactory
+from src.outlier_detection import OutlierHandlerCap
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+COLUMNS = ['LotArea', 'GrLivArea', 'TotalBsmtSF', 'LotFrontage']
+CHUNK_ROWS = 1_000_000
+N_WORKERS = 4
+
+
+def fit_exact(X):
+    return OutlierHandlerCap(method='iqr', threshold=1.5).fit(X)
+
+
+def fit_kll(X):
+    return OutlierHandlerCap(method='iqr', threshold=1.5, quantile_backend='kll').fit(X)
+
+
+def fit_kll_chunked(X):
+    handler = OutlierHandlerCap(method='iqr', threshold=1.5, quantile_backend='kll')
+    for start in range(0, len(X), CHUNK_ROWS):
+        handler.partial_fit(X[start:start + CHUNK_ROWS])
+    return handler
+
+
+def fit_kll_merged(X):
+    handlers = [OutlierHandlerCap(method='iqr', threshold=1.5, quantile_backend='kll', random_state=worker).fit(part)
+                for worker, part in enumerate(np.array_split(X, N_WORKERS))]
+    for handler in handlers[1:]:
+        handlers[0].merge(handler)
+    return handlers[0]
+
+
+def measure(fit, X):
+    """Returns the fitted handler, the fit seconds and the peak MB allocated by the fit."""
+    start = time.perf_counter()
+    handler = fit(X)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    fit(X)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return handler, seconds, peak / 2 ** 20
+
+
+def rank_errors(X_sorted: np.ndarray, handler: OutlierHandlerCap) -> np.ndarray:
+    """The rank errors of the quartiles implied by the handler's bounds, per column."""
+    # Invert lower = Q1 - t * IQR and upper = Q3 + t * IQR
+    t = handler.threshold
+    Q1 = ((1 + t) * handler.lower_bounds_ + t * handler.upper_bounds_) / (1 + 2 * t)
+    Q3 = (t * handler.lower_bounds_ + (1 + t) * handler.upper_bounds_) / (1 + 2 * t)
+    errors = []
+    for j in range(X_sorted.shape[1]):
+        column = X_sorted[:, j]
+        column = column[~np.isnan(column)]
+        for quartile, q in ((Q1[j], 0.25), (Q3[j], 0.75)):
+            # Ties make a value span a range of ranks; the error is the distance from q to that range
+            low = np.searchsorted(column, quartile, side='left') / len(column)
+            high = np.searchsorted(column, quartile, side='right') / len(column)
+            errors.append(max(low - q, q - high, 0.0))
+    return np.array(errors).reshape(-1, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the exact and KLL quantile backends of IQR capping.")
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--tolerance', type=float, default=0.01, help="The largest accepted quartile rank error.")
+    args = parser.parse_args()
+
+    data = DataIngestorFactory().get_data_ingestor('.csv').ingest(DATA_PATH, columns=COLUMNS)
+    rng = np.random.default_rng(42)
+    # Bootstrapped rows with a little jitter, so the quartiles do not all fall on heavily tied values
+    X = data[COLUMNS].to_numpy(dtype=np.float64)[rng.integers(0, len(data), args.rows)]
+    X += rng.normal(0, 0.01, X.shape) * np.nanstd(X, axis=0)
+    print(f"{args.rows} rows x {len(COLUMNS)} columns, {X.nbytes / 2 ** 20:.0f} MB")
+
+    exact, seconds, peak_mb = measure(fit_exact, X)
+    print(f"{'backend':<16} | {'fit (s)':>8} | {'peak (MB)':>9} | {'max bound rel. error':>20} | "
+          f"{'max quartile rank error':>23}")
+    print(f"{'exact':<16} | {seconds:>8.2f} | {peak_mb:>9.1f} | {'-':>20} | {'-':>23}")
+
+    X_sorted = np.sort(X, axis=0)
+    failed = False
+    backends = (("kll", fit_kll), ("kll, chunked", fit_kll_chunked), (f"kll, {N_WORKERS} workers", fit_kll_merged))
+    for name, fit in backends:
+        handler, seconds, peak_mb = measure(fit, X)
+        scale = np.abs(exact.upper_bounds_ - exact.lower_bounds_)
+        bound_error = max(np.max(np.abs(handler.lower_bounds_ - exact.lower_bounds_) / scale),
+                          np.max(np.abs(handler.upper_bounds_ - exact.upper_bounds_) / scale))
+        rank_error = rank_errors(X_sorted, handler).max()
+        failed |= rank_error > args.tolerance
+        print(f"{name:<16} | {seconds:>8.2f} | {peak_mb:>9.1f} | {bound_error:>20.4f} | {rank_error:>23.4f}"
+              f"{'  FAIL' if rank_error > args.tolerance else ''}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
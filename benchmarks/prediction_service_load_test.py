@@ -0,0 +1,75 @@
+"""
+Load test for the prediction service: concurrent clients post single house records and the script reports throughput,
+client-side latency percentiles and the service's own /metrics.
+
+Start the service with `python -m src.prediction_service`, then run
+`python -m benchmarks.prediction_service_load_test --concurrency 32 --requests 5000`.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+
+
+def load_records(n_records: int):
+    data = pd.read_csv(DATA_PATH).drop(columns=['Id', 'SalePrice']).head(n_records)
+    # JSON has no NaN, so missing fields are sent as null
+    return [{key: (None if pd.isna(value) else value) for key, value in record.items()}
+            for record in data.to_dict(orient='records')]
+
+
+def post(url: str, payload) -> dict:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    records = load_records(1000)
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            post(f"{args.url}/predict", records[i % len(records)])
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{len(latencies)} requests from {args.concurrency} clients in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} requests/s)")
+    print(f"client latency: p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+    with urllib.request.urlopen(f"{args.url}/metrics") as response:
+        print(f"service metrics: {json.loads(response.read())}")
+
+
+if __name__ == '__main__':
+    main()
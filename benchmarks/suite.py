@@ -0,0 +1,223 @@
+"""
+Reproducible benchmark suite for preprocessing, training and inference on synthetic house-price datasets of 1x, 10x,
+100x and 1000x the rows of data/train.csv.
+
+Every synthetic row is bootstrapped from a whole real row, so the sale price stays paired with its features and the
+models fit the real signal rather than noise. The nonzero numeric features get a little noise within their real range,
+so larger datasets are not plain copies, while the schema and the missingness rates match the real data.
+
+Benchmarks:
+    preprocess/<scale>x            `preprocessor.fit_transform`
+    train/<strategy>/<scale>x      `build_and_train_model` with a fixed small grid and n_jobs=1
+    predict_batch/<scale>x         `predict` of a fitted pipeline on the whole synthetic dataset
+    predict_single_row             `predict` of one row, median over many calls
+
+Results are written as JSON to benchmarks/results/ and compared with benchmarks/baseline.json when it exists; a
+benchmark more than `--tolerance` slower than its baseline is reported as a regression.
+
+Run from the repository root with `python -m benchmarks.suite [--scales 1,10,100] [--save-baseline]`.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+
+from pipelines.gradient_boosting_regression_pipeline import GradientBoostingRegressionStrategy
+from pipelines.hist_gradient_boosting_regression_pipeline import HistGradientBoostingRegressionStrategy
+from pipelines.linear_regression_pipeline import LinearRegressionStrategy
+from pipelines.random_forest_regression_pipeline import RandomForestRegressionStrategy
+from pipelines.support_vector_regression_pipeline import SupportVectorRegressionStrategy
+from src.data_preprocessing import preprocessor
+from src.ingest_data import DataIngestorFactory
+
+BENCHMARKS_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_PATH = os.path.join(BENCHMARKS_DIR, '../data/train.csv')
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+
+# Fixed small grids, so training benchmarks measure the code rather than the size of the default grids
+SMALL_GRIDS = {
+    "LinearRegression": (LinearRegressionStrategy, {'model__fit_intercept': [True]}),
+    "SupportVectorRegression": (SupportVectorRegressionStrategy,
+                                {'model__C': [1.0], 'model__epsilon': [0.1], 'model__kernel': ['rbf']}),
+    "RandomForest": (RandomForestRegressionStrategy,
+                     {'model__n_estimators': [20, 50], 'model__max_depth': [10], 'model__min_samples_leaf': [2]}),
+    "GradientBoosting": (GradientBoostingRegressionStrategy,
+                         {'model__n_estimators': [20, 50], 'model__max_depth': [3], 'model__learning_rate': [0.1]}),
+    "HistGradientBoosting": (HistGradientBoostingRegressionStrategy,
+                             {'model__max_iter': [20, 50], 'model__max_leaf_nodes': [31],
+                              'model__learning_rate': [0.1]}),
+}
+
+
+def synthesize(data: pd.DataFrame, scale: int, random_state: int = 42, noise: float = 0.05,
+               fixed_columns: Sequence[str] = ('Id', 'SalePrice')) -> pd.DataFrame:
+    """
+    Returns `scale` times as many rows as `data`, bootstrapping whole rows, with noise added to the numeric columns.
+
+    :param:
+        data (pd.DataFrame): The real rows.
+        scale (int): The multiple of the number of rows.
+        random_state (int): Seeds the rows and the noise, together with the scale.
+        noise (float): The standard deviation of the noise as a fraction of each column's standard deviation. Values
+            stay within the column's real range, integer columns stay integers, and zeros, such as the area of a
+            missing pool, and missing values are kept.
+        fixed_columns (Sequence[str]): The columns copied without noise, such as the identifier and the target.
+    :return:
+        pd.DataFrame: The synthetic rows, with the columns and dtypes of `data`.
+    """
+    n_rows = len(data) * scale
+    rng = np.random.default_rng([random_state, scale])
+    synthetic = data.take(rng.integers(0, len(data), n_rows)).reset_index(drop=True)
+    for column in synthetic.columns:
+        dtype = synthetic[column].dtype
+        if column in fixed_columns or not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+            continue
+        values = synthetic[column].to_numpy(dtype=np.float64)
+        noisy = np.clip(values + rng.normal(0, noise * data[column].std(), n_rows), data[column].min(),
+                        data[column].max())
+        if pd.api.types.is_integer_dtype(dtype):
+            noisy = np.round(noisy)
+        synthetic[column] = np.where(values == 0, values, noisy).astype(dtype)
+    return synthetic
+
+
+def measure(function: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    """Runs `function` `repeats` times and returns the min and median wall seconds."""
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return {"min_seconds": round(min(seconds), 6), "median_seconds": round(float(np.median(seconds)), 6),
+            "repeats": repeats}
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=BENCHMARKS_DIR).stdout.strip()
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "scikit-learn": sklearn.__version__, "machine": platform.machine(), "cpu_count": os.cpu_count(),
+            "commit": commit}
+
+
+def run_benchmarks(scales: List[int], train_scales: List[int], repeats: int) -> Dict[str, Dict[str, float]]:
+    data = DataIngestorFactory().get_data_ingestor('.csv').ingest(DATA_PATH)
+    data = data.drop(columns=['Id'])
+    y_mean, y_std = data['SalePrice'].mean(), data['SalePrice'].std()
+
+    results = {}
+    for scale in scales:
+        synthetic = synthesize(data, scale)
+        X, y = synthetic.drop(columns=['SalePrice']), (synthetic['SalePrice'] - y_mean) / y_std
+
+        results[f"preprocess/{scale}x"] = measure(lambda: clone(preprocessor).fit_transform(X), repeats)
+        print(f"preprocess/{scale}x: {results[f'preprocess/{scale}x']}")
+
+        if scale in train_scales:
+            for name, (strategy_class, param_grid) in SMALL_GRIDS.items():
+                strategy = strategy_class(param_grid=param_grid)
+                strategy.set_n_jobs(1)
+                key = f"train/{name}/{scale}x"
+                results[key] = measure(lambda: strategy.build_and_train_model(X, y), repeats)
+                print(f"{key}: {results[key]}")
+
+        if scale == 1:
+            model = Pipeline(steps=[('preprocessor', clone(preprocessor)),
+                                    ('model', GradientBoostingRegressor(n_estimators=100, random_state=42))])
+            model.fit(X, y)
+            single_row = X.iloc[:1]
+            model.predict(single_row)
+            # Single-row latency is too short to time one call at a time reliably
+            calls = 50
+            timing = measure(lambda: [model.predict(single_row) for _ in range(calls)], repeats)
+            results["predict_single_row"] = {**{k: round(v / calls, 6) if k.endswith('seconds') else v
+                                                for k, v in timing.items()}, "calls": calls}
+            print(f"predict_single_row: {results['predict_single_row']}")
+
+        results[f"predict_batch/{scale}x"] = measure(lambda: model.predict(X), repeats)
+        print(f"predict_batch/{scale}x: {results[f'predict_batch/{scale}x']}")
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Compares the min seconds of every benchmark with the baseline.
+
+    :return:
+        Dict[str, Dict[str, Any]]: The baseline seconds, current seconds, ratio and regression flag of every
+            benchmark present in both.
+    """
+    comparison = {}
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["min_seconds"] / baseline[key]["min_seconds"]
+        comparison[key] = {"baseline_seconds": baseline[key]["min_seconds"], "seconds": result["min_seconds"],
+                           "ratio": round(ratio, 3), "regression": ratio > 1 + tolerance}
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, training and inference.")
+    parser.add_argument('--scales', default='1,10,100,1000', help="Comma-separated multiples of the 1460 real rows.")
+    parser.add_argument('--train-scales', default='1,10', help="The scales at which to benchmark training.")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative slowdown against the baseline reported as a regression.")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Save these results as the new baseline.")
+    args = parser.parse_args()
+
+    scales = sorted(int(scale) for scale in args.scales.split(','))
+    if scales[0] != 1:
+        # The batch and single-row predict benchmarks use the model fitted at 1x
+        scales = [1] + scales
+    train_scales = [int(scale) for scale in args.train_scales.split(',') if scale]
+
+    results = run_benchmarks(scales, train_scales, args.repeats)
+    report = {"created_at": time.strftime('%Y-%m-%dT%H:%M:%S'), "environment": environment(), "results": results}
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline["results"], args.tolerance)
+        regressions = [key for key, row in report["comparison"].items() if row["regression"]]
+        for key, row in report["comparison"].items():
+            print(f"{key}: {row['baseline_seconds']:.4f}s -> {row['seconds']:.4f}s ({row['ratio']:.2f}x)"
+                  f"{'  REGRESSION' if row['regression'] else ''}")
+    else:
+        regressions = []
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results_path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Saved results to {results_path}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Saved baseline to {args.baseline}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
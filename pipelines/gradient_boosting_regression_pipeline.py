@@ -1,39 +1,51 @@
 import logging
+from typing import Optional
+
 import pandas as pd
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.metrics import make_scorer
-from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection._search import BaseSearchCV
 from sklearn.pipeline import Pipeline
 
-from src.data_preprocessing import preprocessor
+from src.data_preprocessing import tree_preprocessor
 from src.model_building import ModelBuildingStrategy
 from src.model_evaluation import rmse_scorer
+from src.model_search import EnsemblePrefixSearchEngine, SearchEngine
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
 class GradientBoostingRegressionStrategy(ModelBuildingStrategy):
-    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> GridSearchCV:
+    def __init__(self, search_engine: Optional[SearchEngine] = None, **kwargs):
+        """
+        Initializes the strategy. By default the n_estimators grid is searched by fitting the largest ensemble once
+        per combination of the other parameters and scoring the smaller sizes on its first trees. The trees get
+        the tree profile by default: integer-coded categoricals instead of hundreds of one-hot columns, and unscaled
+        numeric columns. Other keyword arguments are passed to `ModelBuildingStrategy`.
+        """
+        kwargs.setdefault('preprocessor', tree_preprocessor)
+        super().__init__(search_engine=search_engine if search_engine is not None else EnsemblePrefixSearchEngine(),
+                         **kwargs)
+
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> BaseSearchCV:
         logger.info("Initializing Gradient Boosting Regression model")
 
         # Define the parameter grid
-        param_grid = {
+        param_grid = self._resolve_param_grid({
             'model__n_estimators': [50, 100, 200],
             'model__learning_rate': [0.05, 0.1, 0.2],
             'model__max_depth': [3, 5, 7],
             'model__subsample': [0.8, 1.0]
-        }
+        })
 
         pipeline = Pipeline(steps=[
-            ('preprocessor', preprocessor),
+            ('preprocessor', self._preprocessing_step()),
             ('model', GradientBoostingRegressor(random_state=42))
         ])
 
-        grid_search = GridSearchCV(estimator=pipeline, param_grid=param_grid,
-                                   scoring=make_scorer(rmse_scorer, greater_is_better=False), n_jobs=-1, cv=5,
-                                   verbose=3)
         logger.info("Training Gradient Boosting Regression model")
-        grid_search.fit(X_train, y_train)
+        scoring = make_scorer(rmse_scorer, greater_is_better=False)
+        grid_search = self._search_engine.search(pipeline, param_grid, scoring, X_train, y_train, verbose=3)
 
-        return grid_search
+        return self._unwrap_cached_preprocessor(grid_search)
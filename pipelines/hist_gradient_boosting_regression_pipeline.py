@@ -0,0 +1,55 @@
+import logging
+from typing import Optional
+
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.metrics import make_scorer
+from sklearn.model_selection._search import BaseSearchCV
+from sklearn.pipeline import Pipeline
+
+from src.data_preprocessing import categorical_mask, tree_preprocessor
+from src.model_building import ModelBuildingStrategy
+from src.model_evaluation import rmse_scorer
+from src.model_search import EnsemblePrefixSearchEngine, SearchEngine
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class HistGradientBoostingRegressionStrategy(ModelBuildingStrategy):
+    def __init__(self, search_engine: Optional[SearchEngine] = None, **kwargs):
+        """
+        Initializes the strategy. Histogram-based gradient boosting bins every feature once into at most 255 bins and
+        splits the integer-coded categoricals of the tree profile natively, grouping categories instead of scanning
+        one-hot columns. Early stopping is off, so the max_iter grid is searched on the staged predictions of the
+        largest model like the n_estimators grid of the other ensembles. Other keyword arguments are passed to
+        `ModelBuildingStrategy`.
+        """
+        kwargs.setdefault('preprocessor', tree_preprocessor)
+        super().__init__(search_engine=search_engine if search_engine is not None
+                         else EnsemblePrefixSearchEngine(n_estimators_param='model__max_iter'), **kwargs)
+
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> BaseSearchCV:
+        logger.info("Initializing Histogram-based Gradient Boosting Regression model")
+
+        # Define the parameter grid
+        param_grid = self._resolve_param_grid({
+            'model__max_iter': [100, 200, 400],
+            'model__learning_rate': [0.05, 0.1],
+            'model__max_leaf_nodes': [15, 31],
+            'model__l2_regularization': [0.0, 1.0]
+        })
+
+        # Ordinal codes are categories; their negative unknown/missing code is treated as missing
+        model = HistGradientBoostingRegressor(categorical_features=categorical_mask(self.preprocessor),
+                                              early_stopping=False, random_state=42)
+        pipeline = Pipeline(steps=[
+            ('preprocessor', self._preprocessing_step()),
+            ('model', model)
+        ])
+
+        logger.info("Training Histogram-based Gradient Boosting Regression model")
+        scoring = make_scorer(rmse_scorer, greater_is_better=False)
+        grid_search = self._search_engine.search(pipeline, param_grid, scoring, X_train, y_train, verbose=3)
+
+        return self._unwrap_cached_preprocessor(grid_search)
@@ -0,0 +1,290 @@
+import copy
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+
+from src.experiment_logger import model_family
+from src.missing_values_handling import MissingValuesHandler
+from src.model_building import ModelBuilder, ModelBuildingStrategy
+from src.model_evaluation import METRIC_NAMES, MultiMetricEvaluationStrategy
+from src.model_registry import REGISTRY_DIR, ModelRegistry, model_version
+from src.outlier_detection import OutlierHandlerCap
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Ensembles that grow extra trees on the new rows with warm_start. Boosting fits them to the residuals of the existing
+# trees; averaging ensembles such as random forests would give trees fit on the new rows alone the same weight as the
+# trees fit on all the training data, which makes them worse
+WARM_START_ENSEMBLES = (GradientBoostingRegressor,)
+
+
+def next_version(model_name: str) -> str:
+    """Returns the next minor version of a versioned model name, e.g. 'GradientBoosting_v2.1' for '..._v2.0'."""
+    version = model_version(model_name) or (1,)
+    major, minor = version[0], version[1] if len(version) > 1 else 0
+    return f"{model_family(model_name)}_v{major}.{minor + 1}"
+
+
+def update_preprocessor(column_transformer: ColumnTransformer, X: pd.DataFrame) -> Dict[str, int]:
+    """
+    Updates the statistics of a fitted column transformer with new rows only, in place.
+
+    Every branch passes the new rows through its steps in order, and each step first adds them to its mergeable state:
+    the imputers' running statistics, the outlier handlers' sketches and the scalers' running moments, the latter two
+    on the imputed and capped values as in `fit`. Outlier handlers fitted with the 'exact' backend keep no statistics
+    and keep their bounds. Ordinal encoders append new categories after the known ones, so existing codes keep their
+    meaning for the fitted model. One-hot encoders keep their vocabulary, since new columns would not match the model,
+    and ignore new categories as they already do when predicting.
+
+    :param:
+        column_transformer (ColumnTransformer): The fitted preprocessor of a saved pipeline.
+        X (pd.DataFrame): The new rows.
+    :return:
+        Dict[str, int]: The number of categories added to ordinal vocabularies, of new categories ignored by one-hot
+            encoders, and of outlier handlers whose bounds were kept.
+    """
+    stats = {"Added Categories": 0, "Ignored Categories": 0, "Fixed Outlier Handlers": 0}
+    for name, transformer, columns in column_transformer.transformers_:
+        if isinstance(transformer, str):
+            continue
+        steps = transformer.steps if isinstance(transformer, Pipeline) else [(name, transformer)]
+        values = X[columns]
+        for step_name, step in steps:
+            if isinstance(step, MissingValuesHandler):
+                values = step.partial_fit(values).transform(values)
+            elif isinstance(step, OutlierHandlerCap):
+                if step.mergeable:
+                    step.partial_fit(values)
+                else:
+                    stats["Fixed Outlier Handlers"] += 1
+                values = step.transform(values)
+            elif isinstance(step, StandardScaler):
+                values = step.partial_fit(values).transform(values)
+            elif isinstance(step, OrdinalEncoder):
+                stats["Added Categories"] += _extend_categories(step, values)
+            elif isinstance(step, OneHotEncoder):
+                stats["Ignored Categories"] += sum(len(_new_categories(categories, values.iloc[:, j]))
+                                                   for j, categories in enumerate(step.categories_))
+            else:
+                raise ValueError(f"Step '{step_name}' of branch '{name}' ({type(step).__name__}) cannot be updated "
+                                 f"incrementally.")
+
+    if stats["Fixed Outlier Handlers"]:
+        logger.warning(f"{stats['Fixed Outlier Handlers']} outlier handlers were fitted with the 'exact' backend and "
+                       f"keep their bounds; build the preprocessor with quantile_backend='kll' to update them.")
+    return stats
+
+
+def _new_categories(categories: np.ndarray, values: pd.Series) -> np.ndarray:
+    observed = pd.Index(values.dropna().unique())
+    return np.asarray(observed[~observed.isin(categories)], dtype=object)
+
+
+def _extend_categories(encoder: OrdinalEncoder, X: pd.DataFrame) -> int:
+    """
+    Appends the new categories of every column to the end of its vocabulary, after the missing value marker, whose
+    position the encoder recorded when it was fitted. Text vocabularies are looked up by value, so they need not
+    stay sorted; numeric ones are searched by bisection and keep their vocabulary.
+    """
+    n_added = 0
+    for j, categories in enumerate(encoder.categories_):
+        if categories.dtype != object:
+            continue
+        new = _new_categories(categories, X.iloc[:, j])
+        if len(new):
+            encoder.categories_[j] = np.concatenate([categories, new])
+            n_added += len(new)
+    return n_added
+
+
+class IncrementalModelTrainer:
+    def __init__(self, registry_dir: str = REGISTRY_DIR, strategy: Optional[ModelBuildingStrategy] = None,
+                 drift_threshold: float = 0.2, n_new_estimators: int = 50, n_epochs: int = 5, test_size: float = 0.2,
+                 random_state: int = 42):
+        """
+        Updates a registered model with new sales, without refitting it on the full data or searching its
+        hyperparameters again.
+
+        The preprocessor's statistics are updated from the new rows only with `update_preprocessor`. Gradient boosting
+        models then grow `n_new_estimators` more trees on the new rows with warm_start, and models with `partial_fit`,
+        such as the SGD strategy's, take `n_epochs` passes over them. The target scaler is kept, since the fitted model
+        predicts in its units.
+
+        The hyperparameter search only runs when the new rows have drifted: drift is the relative increase of the
+        registered model's RMSE on the new rows over the RMSE stored with it. Above `drift_threshold`, and when a
+        `strategy` is given, the strategy's search is run on the original training data together with the new rows
+        instead of the update. Models that cannot be updated, such as LinearRegression, SVR, RandomForest or
+        HistGradientBoosting, need the full training pipeline.
+
+        :param:
+            registry_dir (str): The registry holding the model to update.
+            strategy (Optional[ModelBuildingStrategy]): The strategy searched when drift exceeds the threshold. Without
+                one, the model is updated whatever the drift, with a warning.
+            drift_threshold (float): The relative RMSE increase above which the search runs, e.g. 0.2 for 20%.
+            n_new_estimators (int): The number of trees added to warm-started ensembles.
+            n_epochs (int): The number of passes of `partial_fit` over the new rows.
+            test_size (float): The fraction of the new rows held out for evaluation.
+            random_state (int): Seeds the split and the shuffling of the rows of every epoch.
+        """
+        # Read fully, since the update modifies the arrays of the loaded model
+        self._registry = ModelRegistry(registry_dir, mmap_mode=None)
+        self._strategy = strategy
+        self._drift_threshold = drift_threshold
+        self._n_new_estimators = n_new_estimators
+        self._n_epochs = n_epochs
+        self._test_size = test_size
+        self._random_state = random_state
+
+    def set_strategy(self, strategy: ModelBuildingStrategy):
+        """
+        Sets the strategy searched when drift exceeds the threshold.
+
+        :param:
+            strategy (ModelBuildingStrategy): The new strategy
+        """
+        self._strategy = strategy
+
+    def update(self, model_name: str, X_new: pd.DataFrame, y_new: pd.Series, X_original: Optional[pd.DataFrame] = None,
+               y_original: Optional[pd.Series] = None) -> Tuple[Pipeline, Any, Dict[str, Any]]:
+        """
+        :param:
+            model_name (str): The registered model, a versioned name or a model family.
+            X_new (pd.DataFrame): The features of the new sales.
+            y_new (pd.Series): Their sale prices.
+            X_original (Optional[pd.DataFrame]): The features the registered model was trained on, which the search
+                runs on together with the new rows when drift exceeds the threshold. Without them, such a drift
+                raises a ValueError, since a search on the new rows alone would replace the model with one trained
+                on a fraction of the data.
+            y_original (Optional[pd.Series]): Their sale prices.
+        :return:
+            Tuple[Pipeline, Any, Dict[str, Any]]: The updated pipeline, its target scaler and the holdout metrics of
+                `MultiMetricEvaluationStrategy`, with an "Update" entry describing what was done.
+        """
+        registered = self._registry.load(model_name)
+        pipeline, scaler = copy.deepcopy(registered.model), registered.scaler
+        y_scaled = scaler.transform(np.asarray(y_new, dtype=np.float64).reshape(-1, 1)).ravel()
+        X_train, X_test, y_train, y_test = train_test_split(X_new, y_scaled, test_size=self._test_size,
+                                                            random_state=self._random_state)
+
+        drift = self._drift(registered.manifest, pipeline, X_new, y_scaled)
+        update = {"Base Model": registered.model_name, "Rows": len(X_new), "Drift": round(drift, 4)}
+        if drift > self._drift_threshold and self._strategy is not None:
+            if X_original is None or y_original is None:
+                raise ValueError(f"Drift {drift:.1%} exceeds {self._drift_threshold:.0%}: pass the original training "
+                                 f"data to search it together with the new rows, or run the full training pipeline.")
+            logger.info(f"Drift {drift:.1%} exceeds {self._drift_threshold:.0%}: searching the hyperparameters again "
+                        f"on {len(X_original)} original and {len(X_train)} new rows")
+            # The new rows held out for evaluation stay out of the search
+            y_original_scaled = scaler.transform(np.asarray(y_original, dtype=np.float64).reshape(-1, 1)).ravel()
+            grid_search = ModelBuilder(self._strategy).build_model(pd.concat([X_original, X_train]),
+                                                                   np.concatenate([y_original_scaled, y_train]))
+            pipeline, best_params = grid_search.best_estimator_, grid_search.best_params_
+            update["Searched"] = True
+            update["Original Rows"] = len(X_original)
+        else:
+            if drift > self._drift_threshold:
+                logger.warning(f"Drift {drift:.1%} exceeds {self._drift_threshold:.0%}, but no strategy is set to "
+                               f"search; updating the model incrementally")
+            best_params = self._update_pipeline(pipeline, X_train, y_train, update)
+            update["Searched"] = False
+
+        metrics = MultiMetricEvaluationStrategy(target_scaler=scaler).compute(y_test, pipeline.predict(X_test))
+        metrics["Best Params"] = best_params
+        metrics["Update"] = update
+        logger.info(f"Updated {registered.model_name} with {len(X_new)} rows: {metrics}")
+        return pipeline, scaler, metrics
+
+    @staticmethod
+    def _drift(manifest: Dict[str, Any], pipeline: Pipeline, X: pd.DataFrame, y: np.ndarray) -> float:
+        """The relative increase of the model's RMSE on the new rows over its registered RMSE, or 0 if unknown."""
+        reference = (manifest.get("metrics") or {}).get(METRIC_NAMES['rmse'])
+        if not reference:
+            logger.warning(f"{manifest['model_name']} has no registered RMSE; drift cannot be measured")
+            return 0.0
+        rmse = float(np.sqrt(np.mean((y - pipeline.predict(X)) ** 2)))
+        return rmse / reference - 1
+
+    def _update_pipeline(self, pipeline: Pipeline, X: pd.DataFrame, y: np.ndarray,
+                         update: Dict[str, Any]) -> Dict[str, Any]:
+        """Updates the preprocessor and the model in place and returns the model's parameters."""
+        preprocessor, model = pipeline.steps[0][1], pipeline.steps[-1][1]
+        if not isinstance(preprocessor, ColumnTransformer) or len(pipeline.steps) != 2:
+            raise ValueError("Only pipelines of a ColumnTransformer and a model can be updated incrementally.")
+        # Check the model before touching the preprocessor, so an unsupported model leaves the pipeline as it was
+        if not isinstance(model, WARM_START_ENSEMBLES) and not hasattr(model, 'partial_fit'):
+            raise ValueError(f"{type(model).__name__} cannot be updated incrementally; run the training pipeline.")
+
+        update.update(update_preprocessor(preprocessor, X))
+        X_matrix = preprocessor.transform(X)
+
+        if isinstance(model, WARM_START_ENSEMBLES):
+            n_estimators = model.n_estimators + self._n_new_estimators
+            model.set_params(warm_start=True, n_estimators=n_estimators).fit(X_matrix, y)
+            # A later fit, e.g. of a clone, starts from scratch again
+            model.set_params(warm_start=False)
+            update["Added Estimators"] = self._n_new_estimators
+        else:
+            rng = np.random.default_rng(self._random_state)
+            for _ in range(self._n_epochs):
+                order = rng.permutation(X_matrix.shape[0])
+                model.partial_fit(X_matrix[order], y[order])
+            update["Epochs"] = self._n_epochs
+
+        return {f"model__{key}": value for key, value in model.get_params().items()}
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+
+    from pipelines.gradient_boosting_regression_pipeline import GradientBoostingRegressionStrategy
+    from pipelines.sgd_regression_pipeline import SGDRegressionStrategy
+    from src.experiment_logger import log_experiment
+    from src.ingest_data import DataIngestorFactory
+
+    # The strategy searched again when the new sales have drifted, per model family
+    strategies = {
+        "GradientBoosting": GradientBoostingRegressionStrategy,
+        "SGDRegression": SGDRegressionStrategy,
+    }
+
+    parser = argparse.ArgumentParser(description="Update a registered model with new sales.")
+    parser.add_argument('file_path', help="The CSV, Parquet or Feather file of new sales, with their SalePrice.")
+    parser.add_argument('--model-name', default='GradientBoosting', help="The registered model name or family.")
+    parser.add_argument('--drift-threshold', type=float, default=0.2)
+    parser.add_argument('--n-new-estimators', type=int, default=50)
+    parser.add_argument('--registry-dir', default=REGISTRY_DIR)
+    parser.add_argument('--training-data', help="The file the registered model was trained on, searched together "
+                                                "with the new sales when they have drifted.")
+    args = parser.parse_args()
+
+    def load_sales(file_path: str) -> Tuple[pd.DataFrame, pd.Series]:
+        data_ingestor = DataIngestorFactory().get_data_ingestor(os.path.splitext(file_path)[1])
+        data = data_ingestor.ingest(file_path)
+        return data.drop(columns=['Id', 'SalePrice'], errors='ignore'), data['SalePrice']
+
+    X, y = load_sales(args.file_path)
+    X_original, y_original = load_sales(args.training_data) if args.training_data else (None, None)
+
+    registry = ModelRegistry(args.registry_dir)
+    base_model_name = registry.resolve(args.model_name)
+    strategy_class = strategies.get(model_family(base_model_name))
+
+    trainer = IncrementalModelTrainer(args.registry_dir, strategy=strategy_class() if strategy_class else None,
+                                      drift_threshold=args.drift_threshold, n_new_estimators=args.n_new_estimators)
+    pipeline, scaler, metrics = trainer.update(base_model_name, X, y, X_original, y_original)
+
+    model_name = next_version(base_model_name)
+    description = f"{base_model_name} updated with {len(X)} new sales"
+    log_experiment(model_name, description, metrics)
+    # The new sales are scored against the same training profile as before the update
+    registry.register(model_name, pipeline, scaler, metrics=metrics, description=description,
+                      profile=registry.manifest(base_model_name).get("profile"))
@@ -3,10 +3,10 @@ import logging
 import pandas as pd
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import make_scorer
-from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection._search import BaseSearchCV
 from sklearn.pipeline import Pipeline
 
-from src.data_preprocessing import preprocessor
+from src.data_preprocessing import dense_preprocessor
 from src.model_building import ModelBuildingStrategy
 from src.model_evaluation import rmse_scorer
 
@@ -15,7 +15,16 @@ logger = logging.getLogger(__name__)
 
 
 class LinearRegressionStrategy(ModelBuildingStrategy):
-    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> GridSearchCV:
+    def __init__(self, **kwargs):
+        """
+        Initializes the strategy. LinearRegression solves the least squares with LAPACK on a dense design matrix,
+        faster than with scipy's iterative lsqr on its CSR form, so the one-hot matrix is dense by default. Keyword
+        arguments are passed to `ModelBuildingStrategy`.
+        """
+        kwargs.setdefault('preprocessor', dense_preprocessor)
+        super().__init__(**kwargs)
+
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> BaseSearchCV:
         """
         Builds and trains a linear regression model with hyperparameter tuning
 
@@ -28,20 +37,18 @@ class LinearRegressionStrategy(ModelBuildingStrategy):
 
         logger.info("Initializing regression model")
 
-        param_grid = {
+        param_grid = self._resolve_param_grid({
             'model__fit_intercept': [True, False],
             'model__n_jobs': [1, -1]
-        }
+        })
 
         pipeline = Pipeline(steps=[
-            ('preprocessor', preprocessor),
+            ('preprocessor', self._preprocessing_step()),
             ('model', LinearRegression())
         ])
 
-        grid_search = GridSearchCV(estimator=pipeline, param_grid=param_grid,
-                                   scoring=make_scorer(rmse_scorer, greater_is_better=False), n_jobs=-1, cv=5)
-
         logger.info("Training Linear Regression model")
-        grid_search.fit(X_train, y_train)
+        scoring = make_scorer(rmse_scorer, greater_is_better=False)
+        grid_search = self._search_engine.search(pipeline, param_grid, scoring, X_train, y_train)
 
-        return grid_search
+        return self._unwrap_cached_preprocessor(grid_search)
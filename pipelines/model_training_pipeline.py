@@ -1,7 +1,8 @@
 from typing import Dict, Tuple, Any
 
 import pandas as pd
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split
+from sklearn.model_selection._search import BaseSearchCV
 
 from pipelines.gradient_boosting_regression_pipeline import GradientBoostingRegressionStrategy
 from pipelines.support_vector_regression_pipeline import SupportVectorRegressionStrategy
@@ -15,57 +16,107 @@ class ModelTrainer:
         self._model_builder = model_builder
         self._model_evaluator = model_evaluator
 
-    def train_and_evaluate_model(self, X: pd.DataFrame, y: pd.Series) -> Tuple[GridSearchCV, Dict[str, Any]]:
-        X = data.drop(columns=['Id', 'SalePrice'])
-        y = data['SalePrice']
-
+    def train_and_evaluate_model(self, X: pd.DataFrame, y: pd.Series) -> Tuple[BaseSearchCV, Dict[str, Any]]:
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-        model = model_builder.build_model(X_train, y_train)
-        metrics = model_evaluator.evaluate(model, X_test, y_test)
+        return self.train_and_evaluate_split(X_train, X_test, y_train, y_test)
+
+    def train_and_evaluate_split(self, X_train, X_test, y_train, y_test) -> Tuple[BaseSearchCV, Dict[str, Any]]:
+        """
+        Builds the model on an existing train/test split, such as preprocessed matrices from the feature store.
+        """
+        model = self._model_builder.build_model(X_train, y_train)
+        metrics = self._model_evaluator.evaluate(model, X_test, y_test)
 
         return model, metrics
 
 
 if __name__ == '__main__':
+    import argparse
     import os
-    import joblib
+    from contextlib import nullcontext
 
+    from sklearn.pipeline import Pipeline
     from sklearn.preprocessing import StandardScaler
 
+    from src.feature_store import FeatureStore, build_train_test_features
     from src.ingest_data import DataIngestorFactory
+    from src.instrumentation import (instrument_column_transformer, instrumentation, profile_run,
+                                     strip_instrumentation)
+    from src.drift_monitor import PREDICTION_COLUMN, ReferenceProfile
+    from src.model_registry import ModelRegistry
     from src.outlier_detection import OutlierHandlerCap
-    from src.model_evaluation import RegressionPipelineEvaluationStrategy
+    from src.model_evaluation import MultiMetricEvaluationStrategy
+
+    parser = argparse.ArgumentParser(description="Train and evaluate the house prices model.")
+    parser.add_argument('--trace-memory', action='store_true', help="Record the peak memory of every stage.")
+    parser.add_argument('--profile', metavar='PATH', help="Dump cProfile stats of the whole run to PATH.")
+    args = parser.parse_args()
+
+    instrumentation.enable(trace_memory=args.trace_memory)
 
     file_path = "/Users/ktxdev/Developer/house-prices/data/train.csv"
     file_extension = os.path.splitext(file_path)[1]
 
-    data_ingestor = DataIngestorFactory().get_data_ingestor(file_extension)
-    data = data_ingestor.ingest(file_path)
+    model_strategy = GradientBoostingRegressionStrategy(preprocessed=True)
+    # The feature set is built with the strategy's own preprocessor
+    preprocessor = model_strategy.preprocessor
 
-    X = data.drop(columns=['Id', 'SalePrice'])
-    y = data['SalePrice']
+    def build_features():
+        data_ingestor = DataIngestorFactory().get_data_ingestor(file_extension)
+        data = data_ingestor.ingest(file_path)
 
-    outlier_handler = OutlierHandlerCap(method='iqr', threshold=1.5)
-    y = outlier_handler.transform(y)
+        X = data.drop(columns=['Id', 'SalePrice'])
+        y = data['SalePrice']
 
-    scaler = StandardScaler()
-    y_scaled = scaler.fit_transform(y.values.reshape(-1, 1))
+        outlier_handler = OutlierHandlerCap(method='iqr', threshold=1.5)
+        y_capped = outlier_handler.fit_transform(y)
 
-    model_builder = ModelBuilder(GradientBoostingRegressionStrategy())
+        scaler = StandardScaler()
+        y_scaled = scaler.fit_transform(y_capped)
 
-    model_evaluator = ModelEvaluator(RegressionPipelineEvaluationStrategy())
+        # Record the fit and transform time of every ColumnTransformer branch
+        arrays, objects = build_train_test_features(X, y_scaled, instrument_column_transformer(preprocessor),
+                                                    test_size=0.2, random_state=42)
+        strip_instrumentation(objects["preprocessor"])
+        # The reference that scored data is compared with for drift
+        return arrays, {**objects, "scaler": scaler, "profile": ReferenceProfile.build(X)}
 
-    model_trainer = ModelTrainer(model_builder, model_evaluator)
+    # Later runs map the preprocessed matrices instead of re-parsing and re-preprocessing the data
+    feature_store = FeatureStore()
+    feature_set_key = feature_store.key_for(file_path, preprocessor, target="iqr-capped standardized",
+                                            test_size=0.2, random_state=42)
+    model_name = "GradientBoosting_v2.0"
 
-    grid_search, metrics = model_trainer.train_and_evaluate_model(X, y_scaled)
+    with profile_run(args.profile) if args.profile else nullcontext():
+        features, objects = feature_store.get_or_build(feature_set_key, build_features)
 
-    model_name = "GradientBoosting_v2.0"
-    log_experiment(model_name, "Model with outliers capped using iqr", metrics)
+        model_builder = ModelBuilder(model_strategy)
+
+        # Metrics of the scaled target and of prices, with bootstrap confidence intervals
+        model_evaluator = ModelEvaluator(MultiMetricEvaluationStrategy(target_scaler=objects["scaler"]))
 
-    models_dir_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), "../models")
-    os.makedirs(models_dir_path, exist_ok=True)
-    # Save the best pipeline to a file
-    joblib.dump(grid_search.best_estimator_, os.path.join(models_dir_path, f"{model_name}.pkl"))
-    # Save the scaler to a file
-    joblib.dump(scaler, os.path.join(models_dir_path, f"scaler.pkl"))
+        model_trainer = ModelTrainer(model_builder, model_evaluator)
+
+        grid_search, metrics = model_trainer.train_and_evaluate_split(features["X_train"], features["X_test"],
+                                                                      features["y_train"], features["y_test"])
+
+    log_experiment(model_name, "Model with outliers capped using iqr", metrics)
+    instrumentation.save_report(model_name, metrics=metrics)
+
+    # Put the fitted preprocessor back in front of the model trained on the preprocessed matrices
+    best_pipeline = Pipeline(steps=[
+        ('preprocessor', objects["preprocessor"]),
+        ('model', grid_search.best_estimator_.named_steps['model'])
+    ])
+
+    # Feature sets cached before profiles were added have none
+    profile = objects.get("profile")
+    if profile is not None:
+        y_pred = grid_search.predict(features["X_test"])
+        profile.add_numeric(PREDICTION_COLUMN, objects["scaler"].inverse_transform(y_pred.reshape(-1, 1)))
+
+    # Save the best pipeline together with its own target scaler and the profile of its training data
+    ModelRegistry().register(model_name, best_pipeline, objects["scaler"], metrics=metrics,
+                             description="Model with outliers capped using iqr", overwrite=True,
+                             profile=None if profile is None else profile.to_dict())
@@ -0,0 +1,56 @@
+import logging
+
+import pandas as pd
+from sklearn.linear_model import SGDRegressor
+from sklearn.metrics import make_scorer
+from sklearn.model_selection._search import BaseSearchCV
+from sklearn.pipeline import Pipeline
+
+from src.model_building import ModelBuildingStrategy
+from src.model_evaluation import rmse_scorer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class SGDRegressionStrategy(ModelBuildingStrategy):
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> BaseSearchCV:
+        """
+        Builds and trains a linear model fitted by stochastic gradient descent with hyperparameter tuning. The same
+        model learns incrementally with `partial_fit`, see `incremental_model` and the streaming training pipeline.
+
+        :param:
+            X_train (pd.DataFrame): The training data features
+            y_train (pd.Series): The training data labels/targets
+        :return:
+            Pipeline: A pipeline with a trained regression model instance
+        """
+        logger.info("Initializing SGD Regression model")
+
+        param_grid = self._resolve_param_grid({
+            'model__alpha': [1e-5, 1e-4, 1e-3],
+            'model__penalty': ['l2', 'elasticnet'],
+            'model__learning_rate': ['invscaling', 'adaptive']
+        })
+
+        pipeline = Pipeline(steps=[
+            ('preprocessor', self._preprocessing_step()),
+            ('model', self.incremental_model())
+        ])
+
+        logger.info("Training SGD Regression model")
+        scoring = make_scorer(rmse_scorer, greater_is_better=False)
+        grid_search = self._search_engine.search(pipeline, param_grid, scoring, X_train, y_train)
+
+        return self._unwrap_cached_preprocessor(grid_search)
+
+    @staticmethod
+    def incremental_model(**params) -> SGDRegressor:
+        """
+        Returns an unfitted SGDRegressor, e.g. to train chunk by chunk with `partial_fit`.
+
+        :param:
+            params: SGDRegressor parameters that replace the defaults.
+        """
+        return SGDRegressor(**{'alpha': 1e-4, 'penalty': 'l2', 'learning_rate': 'invscaling', 'random_state': 42,
+                               **params})
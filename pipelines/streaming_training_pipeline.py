@@ -0,0 +1,161 @@
+import logging
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, clone
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src.data_preprocessing import numeric_steps, preprocessor as default_preprocessor
+from src.ingest_data import DataIngestor
+from src.streaming_preprocessing import StreamingPreprocessor, fit_streaming
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class StreamingModelTrainer:
+    def __init__(self, data_ingestor: DataIngestor, model: BaseEstimator,
+                 preprocessor: Optional[ColumnTransformer] = None, target: str = 'SalePrice',
+                 chunksize: int = 50_000, n_epochs: int = 5, test_size: float = 0.2, random_state: int = 42):
+        """
+        Trains an incremental learner on a file that does not fit in memory, one chunk at a time, so memory use
+        depends on `chunksize` and not on the number of rows.
+
+        Every row is assigned to the train or the holdout split by a hash of its position in the file, which gives the
+        same split for any chunk size. The preprocessing statistics of the features, and the IQR capping and
+        standardization of the target, are learned from the training rows by `StreamingPreprocessor`. Each epoch then
+        reads the file once more and calls `partial_fit` on every preprocessed, shuffled chunk, and a final pass
+        scores the holdout rows.
+
+        :param:
+            data_ingestor (DataIngestor): Reads the file in chunks with `ingest_chunks`.
+            model (BaseEstimator): An unfitted estimator with `partial_fit`, e.g. from
+                `SGDRegressionStrategy.incremental_model`.
+            preprocessor (Optional[ColumnTransformer]): The unfitted feature preprocessor, the one-hot `preprocessor`
+                by default.
+            target (str): The target column.
+            chunksize (int): The number of rows read at a time.
+            n_epochs (int): The number of passes of `partial_fit` over the training rows.
+            test_size (float): The fraction of rows held out for evaluation.
+            random_state (int): Seeds the split and the shuffling of the rows within each chunk.
+        """
+        if not hasattr(model, 'partial_fit'):
+            raise ValueError(f"{type(model).__name__} cannot be trained incrementally: it has no partial_fit.")
+        self._data_ingestor = data_ingestor
+        self._model = model
+        self._preprocessor = preprocessor if preprocessor is not None else default_preprocessor
+        self._target = target
+        self._chunksize = chunksize
+        self._n_epochs = n_epochs
+        self._test_size = test_size
+        self._random_state = random_state
+
+    def train(self, file_path: str) -> Tuple[Pipeline, StandardScaler, Dict[str, Any]]:
+        """
+        :param:
+            file_path (str): The data file, with the feature and target columns.
+        :return:
+            Tuple[Pipeline, StandardScaler, Dict[str, Any]]: The fitted preprocessing and model pipeline, the scaler
+                of the capped target, and the holdout metrics in the layout of `RegressionPipelineEvaluationStrategy`.
+        """
+        feature_preprocessor = StreamingPreprocessor(clone(self._preprocessor), random_state=self._random_state)
+        target_preprocessor = StreamingPreprocessor(
+            ColumnTransformer([('target', Pipeline(steps=numeric_steps()), [self._target])]),
+            random_state=self._random_state)
+        columns = feature_preprocessor.input_columns + [self._target]
+
+        fit_streaming([feature_preprocessor, target_preprocessor], lambda: self._split_chunks(file_path, columns))
+        features, target = feature_preprocessor.fused_preprocessor, target_preprocessor.fused_preprocessor
+
+        model = clone(self._model)
+        rng = np.random.default_rng(self._random_state)
+        for epoch in range(self._n_epochs):
+            n_rows = 0
+            for chunk in self._split_chunks(file_path, columns):
+                order = rng.permutation(len(chunk))
+                X, y = features.transform(chunk)[order], target.transform(chunk).ravel()[order]
+                model.partial_fit(X, y)
+                n_rows += len(chunk)
+            logger.info(f"Epoch {epoch + 1}/{self._n_epochs}: trained on {n_rows} rows")
+
+        metrics = self._evaluate(file_path, columns, features, target, model)
+        pipeline = Pipeline(steps=[('preprocessor', features), ('model', model)])
+        return pipeline, self._target_scaler(target), metrics
+
+    def _split_chunks(self, file_path: str, columns, holdout: bool = False) -> Iterator[pd.DataFrame]:
+        """Yields the train, or with `holdout` the holdout, rows of every chunk."""
+        start = 0
+        for chunk in self._data_ingestor.ingest_chunks(file_path, self._chunksize, columns):
+            positions = np.arange(start, start + len(chunk), dtype=np.uint64)
+            start += len(chunk)
+            # Multiplicative hashing spreads consecutive positions uniformly over [0, 1)
+            hashed = ((positions + np.uint64(self._random_state)) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+            in_holdout = hashed / 2 ** 32 < self._test_size
+            rows = chunk[in_holdout if holdout else ~in_holdout]
+            if len(rows):
+                yield rows
+
+    def _evaluate(self, file_path, columns, features, target, model) -> Dict[str, Any]:
+        n, squared_error, y_sum, y_squared_sum = 0, 0.0, 0.0, 0.0
+        for chunk in self._split_chunks(file_path, columns, holdout=True):
+            y = target.transform(chunk).ravel()
+            y_pred = model.predict(features.transform(chunk))
+            n += len(y)
+            squared_error += float(np.sum((y - y_pred) ** 2))
+            y_sum += float(y.sum())
+            y_squared_sum += float(np.sum(y ** 2))
+        if n == 0:
+            raise ValueError("The holdout split is empty; increase test_size or use a larger file.")
+
+        mse = squared_error / n
+        total_sum_of_squares = y_squared_sum - y_sum ** 2 / n
+        metrics = {
+            "Mean Squared Error": round(mse, 4),
+            "Root Mean Squared Error": round(float(np.sqrt(mse)), 4),
+            "R-squared": round(1 - squared_error / total_sum_of_squares, 4),
+            "Best Params": {**{f"model__{key}": value for key, value in model.get_params().items()},
+                            "n_epochs": self._n_epochs, "chunksize": self._chunksize},
+        }
+        logger.info(f"Holdout metrics on {n} rows: {metrics}")
+        return metrics
+
+    @staticmethod
+    def _target_scaler(target) -> StandardScaler:
+        """Returns a fitted StandardScaler with the streamed target moments, for `PredictionService`."""
+        block = target._blocks[0]
+        scaler = StandardScaler()
+        scaler.mean_, scaler.scale_ = block.mean.copy(), block.scale.copy()
+        scaler.var_ = scaler.scale_ ** 2
+        scaler.n_features_in_ = 1
+        scaler.n_samples_seen_ = 0
+        return scaler
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+
+    from pipelines.sgd_regression_pipeline import SGDRegressionStrategy
+    from src.experiment_logger import log_experiment
+    from src.ingest_data import DataIngestorFactory
+    from src.model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Train an incremental model on a file chunk by chunk.")
+    parser.add_argument('--data', default=os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv'))
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--epochs', type=int, default=5)
+    args = parser.parse_args()
+
+    model_name = "SGDRegression_v1.0"
+    data_ingestor = DataIngestorFactory().get_data_ingestor(os.path.splitext(args.data)[1])
+    trainer = StreamingModelTrainer(data_ingestor, SGDRegressionStrategy.incremental_model(),
+                                    chunksize=args.chunksize, n_epochs=args.epochs)
+    pipeline, scaler, metrics = trainer.train(args.data)
+
+    log_experiment(model_name, "SGD model trained out of core on streamed chunks", metrics)
+
+    ModelRegistry().register(model_name, pipeline, scaler, metrics=metrics,
+                             description="SGD model trained out of core on streamed chunks", overwrite=True)
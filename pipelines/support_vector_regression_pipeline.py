@@ -1,11 +1,11 @@
 import logging
 import pandas as pd
 from sklearn.metrics import make_scorer
-from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection._search import BaseSearchCV
 from sklearn.pipeline import Pipeline
 from sklearn.svm import SVR
 
-from src.data_preprocessing import preprocessor
+from src.data_preprocessing import dense_preprocessor
 from src.model_building import ModelBuildingStrategy
 from src.model_evaluation import rmse_scorer
 
@@ -14,25 +14,31 @@ logger = logging.getLogger(__name__)
 
 
 class SupportVectorRegressionStrategy(ModelBuildingStrategy):
-    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> GridSearchCV:
+    def __init__(self, **kwargs):
+        """
+        Initializes the strategy. libsvm evaluates its kernels faster on dense rows than on sparse ones, so the
+        one-hot matrix is dense by default. Keyword arguments are passed to `ModelBuildingStrategy`.
+        """
+        kwargs.setdefault('preprocessor', dense_preprocessor)
+        super().__init__(**kwargs)
+
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> BaseSearchCV:
         logger.info("Initializing Gradient Boosting Regression model")
 
         # Define the parameter grid
-        param_grid = {
+        param_grid = self._resolve_param_grid({
             'model__C': [900, 1000, 1200],
             'model__epsilon': [0.1, 1, 2, 3],
             'model__kernel': ['linear', 'rbf']
-        }
+        })
 
         pipeline = Pipeline(steps=[
-            ('preprocessor', preprocessor),
+            ('preprocessor', self._preprocessing_step()),
             ('model', SVR())
         ])
 
-        grid_search = GridSearchCV(estimator=pipeline, param_grid=param_grid,
-                                   scoring=make_scorer(rmse_scorer, greater_is_better=False), n_jobs=-1, cv=5,
-                                   verbose=3)
         logger.info("Training Gradient Boosting Regression model")
-        grid_search.fit(X_train, y_train)
+        scoring = make_scorer(rmse_scorer, greater_is_better=False)
+        grid_search = self._search_engine.search(pipeline, param_grid, scoring, X_train, y_train, verbose=3)
 
-        return grid_search
+        return self._unwrap_cached_preprocessor(grid_search)
@@ -0,0 +1,137 @@
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+from joblib import Parallel, delayed, parallel_config
+from sklearn.model_selection._search import BaseSearchCV
+
+from pipelines.model_training_pipeline import ModelTrainer
+from src.experiment_logger import log_experiment
+from src.model_building import ModelBuilder, ModelBuildingStrategy
+from src.model_evaluation import ModelEvaluator
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _train_strategy(model_name: str, strategy: ModelBuildingStrategy, model_evaluator: ModelEvaluator,
+                    split) -> Tuple[str, BaseSearchCV, Dict[str, Any], float]:
+    """Trains and evaluates one strategy on the shared split. Runs inside a worker process."""
+    start = time.perf_counter()
+    model_trainer = ModelTrainer(ModelBuilder(strategy), model_evaluator)
+    grid_search, metrics = model_trainer.train_and_evaluate_split(*split)
+    return model_name, grid_search, metrics, time.perf_counter() - start
+
+
+class TrainingOrchestrator:
+    def __init__(self, model_evaluator: ModelEvaluator, n_cores: int = -1, log_results: bool = True):
+        """
+        Trains several model building strategies in parallel on one shared train/test split.
+
+        The strategies run in a pool of worker processes and split a global core budget: with `n_cores` cores and
+        `k` strategies, min(k, n_cores) run at once and each search gets n_cores // min(k, n_cores) jobs. The BLAS
+        threads of every worker are capped to the same share, so nested parallelism never oversubscribes the machine.
+
+        :param:
+            model_evaluator (ModelEvaluator): Evaluates every trained model on the test split.
+            n_cores (int): The total number of cores to use, or -1 for all of them.
+            log_results (bool): Whether to log each result with `log_experiment` as soon as it finishes.
+        """
+        self._model_evaluator = model_evaluator
+        self._n_cores = joblib.cpu_count() if n_cores == -1 else n_cores
+        self._log_results = log_results
+
+    def train(self, strategies: Dict[str, ModelBuildingStrategy], X_train, X_test, y_train, y_test,
+              description: Optional[str] = None) -> Dict[str, Tuple[BaseSearchCV, Dict[str, Any]]]:
+        """
+        Trains and evaluates every strategy on the same split.
+
+        The split is ingested and split once by the caller. Numpy arrays and memory-mapped matrices larger than 1 MB,
+        such as a feature set loaded from the feature store, are passed to the workers by file reference instead of
+        being pickled once per strategy.
+
+        :param:
+            strategies (Dict[str, ModelBuildingStrategy]): The strategies to train, keyed by versioned model name,
+                e.g. 'GradientBoosting_v3.0'.
+            X_train, X_test, y_train, y_test: The shared split, raw or preprocessed to match the strategies.
+            description (Optional[str]): The description logged with every run.
+        :return:
+            Dict[str, Tuple[BaseSearchCV, Dict[str, Any]]]: The fitted search and the metrics of each strategy.
+        """
+        n_workers = max(1, min(len(strategies), self._n_cores))
+        inner_n_jobs = max(1, self._n_cores // n_workers)
+        for strategy in strategies.values():
+            strategy.set_n_jobs(inner_n_jobs)
+
+        logger.info(f"Training {len(strategies)} strategies on {n_workers} workers with {inner_n_jobs} jobs each")
+
+        split = (X_train, X_test, y_train, y_test)
+        results = {}
+        with parallel_config(backend='loky', inner_max_num_threads=inner_n_jobs):
+            tasks = Parallel(n_jobs=n_workers, return_as='generator_unordered')(
+                delayed(_train_strategy)(model_name, strategy, self._model_evaluator, split)
+                for model_name, strategy in strategies.items())
+
+            for model_name, grid_search, metrics, elapsed in tasks:
+                logger.info(f"{model_name} trained in {elapsed:.2f}s: {metrics}")
+                if self._log_results:
+                    log_experiment(model_name, description, metrics)
+                results[model_name] = (grid_search, metrics)
+
+        return {model_name: results[model_name] for model_name in strategies}
+
+
+if __name__ == '__main__':
+    import os
+
+    from sklearn.preprocessing import StandardScaler
+
+    from pipelines.gradient_boosting_regression_pipeline import GradientBoostingRegressionStrategy
+    from pipelines.hist_gradient_boosting_regression_pipeline import HistGradientBoostingRegressionStrategy
+    from pipelines.linear_regression_pipeline import LinearRegressionStrategy
+    from pipelines.random_forest_regression_pipeline import RandomForestRegressionStrategy
+    from pipelines.support_vector_regression_pipeline import SupportVectorRegressionStrategy
+    from src.feature_store import FeatureStore, build_train_test_features
+    from src.ingest_data import DataIngestorFactory
+    from src.model_evaluation import MultiMetricEvaluationStrategy
+    from src.outlier_detection import OutlierHandlerCap
+
+    file_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+
+    def build_features(preprocessor):
+        data = DataIngestorFactory().get_data_ingestor(os.path.splitext(file_path)[1]).ingest(file_path)
+
+        y_capped = OutlierHandlerCap(method='iqr', threshold=1.5).fit_transform(data['SalePrice'])
+        scaler = StandardScaler()
+        y_scaled = scaler.fit_transform(y_capped)
+
+        arrays, objects = build_train_test_features(data.drop(columns=['Id', 'SalePrice']), y_scaled, preprocessor,
+                                                    test_size=0.2, random_state=42)
+        return arrays, {**objects, "scaler": scaler}
+
+    strategies = {
+        "LinearRegression_v5.0": LinearRegressionStrategy(preprocessed=True),
+        "SupportVectorRegression_v3.0": SupportVectorRegressionStrategy(preprocessed=True),
+        "RandomForest_v3.0": RandomForestRegressionStrategy(preprocessed=True),
+        "GradientBoosting_v3.0": GradientBoostingRegressionStrategy(preprocessed=True),
+        "HistGradientBoosting_v1.0": HistGradientBoostingRegressionStrategy(preprocessed=True),
+    }
+
+    # Ingest, split and preprocess once per distinct preprocessor: one-hot for linear models, the tree profile for trees
+    groups = {}
+    for model_name, strategy in strategies.items():
+        groups.setdefault(id(strategy.preprocessor), (strategy.preprocessor, {}))[1][model_name] = strategy
+
+    feature_store = FeatureStore()
+    for preprocessor, group in groups.values():
+        feature_set_key = feature_store.key_for(file_path, preprocessor, target="iqr-capped standardized",
+                                                test_size=0.2, random_state=42)
+        features, objects = feature_store.get_or_build(feature_set_key, lambda: build_features(preprocessor))
+
+        # Metrics of the scaled target and of prices, with bootstrap confidence intervals
+        orchestrator = TrainingOrchestrator(ModelEvaluator(MultiMetricEvaluationStrategy(
+            target_scaler=objects["scaler"])))
+
+        orchestrator.train(group, features["X_train"], features["X_test"], features["y_train"], features["y_test"],
+                           description="Strategies trained together on the shared feature store split")
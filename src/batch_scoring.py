@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.ingest_data import DataIngestorFactory
+from src.model_registry import REGISTRY_DIR, ModelRegistry
+from src.prediction_service import PredictionService
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# The service of a worker process, loaded once by `_init_worker`
+_worker_service = None
+
+
+def _init_worker(model_name: str, registry_dir: str, monitor_drift: bool):
+    global _worker_service
+    _worker_service = PredictionService.from_registry(model_name, ModelRegistry(registry_dir), monitor_drift)
+
+
+def _predict_chunk(chunk: pd.DataFrame) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """The predicted prices of a chunk and the drift counts of its houses, which the main process adds up."""
+    prices = _worker_service.predict_frame(chunk[_worker_service.columns])
+    monitor = _worker_service.drift_monitor
+    return prices, None if monitor is None else monitor.drain()
+
+
+class BatchScorer:
+    def __init__(self, model_name: str, registry_dir: str = REGISTRY_DIR, n_workers: Optional[int] = None,
+                 chunksize: int = 50_000, id_column: str = 'Id', prediction_column: str = 'SalePrice',
+                 monitor_drift: bool = True, drift_report_path: Optional[str] = None):
+        """
+        Scores a file of houses with a registered model, chunk by chunk, and writes the predicted prices to Parquet.
+
+        The input is read `chunksize` rows at a time, and each chunk goes through the saved pipeline and the inverse
+        of its target scaler in a pool of worker processes. Every worker loads the model from the registry once, with
+        its arrays memory-mapped, so all workers share one copy of them in the page cache instead of each holding its
+        own. At most two chunks per worker are in flight and the predictions are appended to the output as one row
+        group per chunk, in input order, so memory depends on `chunksize` and `n_workers` and not on the file size.
+
+        When the model was registered with a reference profile, every worker also counts its chunks into a
+        `DriftMonitor` and sends the counts back with the predictions, and the columns that drifted are reported.
+
+        :param:
+            model_name (str): A versioned model name, or a model family, resolved once so every worker scores with the
+                same version.
+            registry_dir (str): The registry directory.
+            n_workers (Optional[int]): The number of worker processes, the number of CPUs if None. With 0, chunks are
+                scored in the current process.
+            chunksize (int): The number of rows read and scored at a time.
+            id_column (str): The column copied from the input next to the predictions, when the input has it.
+            prediction_column (str): The column of the predicted prices in the output.
+            monitor_drift (bool): Whether to monitor drift, for models registered with a reference profile.
+            drift_report_path (Optional[str]): A JSON file to write the drift scores of every column to.
+        """
+        self._registry_dir = registry_dir
+        self.model_name = ModelRegistry(registry_dir).resolve(model_name)
+        self._n_workers = os.cpu_count() if n_workers is None else n_workers
+        self._chunksize = chunksize
+        self._id_column = id_column
+        self._prediction_column = prediction_column
+        self._monitor_drift = monitor_drift
+        self._drift_report_path = drift_report_path
+
+    def score(self, input_path: str, output_path: str) -> Dict[str, Any]:
+        """
+        :param:
+            input_path (str): The file of houses, in any format of `DataIngestorFactory`, e.g. CSV or Parquet.
+            output_path (str): The Parquet file to write. It is written to a temporary file and moved into place,
+                so it is never left partially written.
+        :return:
+            Dict[str, Any]: The number of rows, the seconds, the rows per second and, when drift is monitored, the
+                drifted columns.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        start = time.perf_counter()
+        service = PredictionService.from_registry(self.model_name, ModelRegistry(self._registry_dir),
+                                                  self._monitor_drift)
+        columns = service.columns + ([self._id_column] if self._id_column not in service.columns else [])
+        data_ingestor = DataIngestorFactory().get_data_ingestor(os.path.splitext(input_path)[1])
+        chunks = data_ingestor.ingest_chunks(input_path, self._chunksize, columns)
+
+        tmp_path = f"{output_path}.tmp"
+        n_rows, writer = 0, None
+        try:
+            for chunk, prices in self._predictions(service, chunks):
+                output = pd.DataFrame({self._prediction_column: prices})
+                if self._id_column in chunk.columns:
+                    output.insert(0, self._id_column, chunk[self._id_column].to_numpy())
+                table = pa.Table.from_pandas(output, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+                n_rows += len(output)
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if writer is None:
+            raise ValueError(f"{input_path} has no rows to score.")
+        writer.close()
+        os.replace(tmp_path, output_path)
+
+        seconds = time.perf_counter() - start
+        stats = {"rows": n_rows, "seconds": round(seconds, 3), "rows_per_second": round(n_rows / seconds, 1)}
+        logger.info(f"Scored {n_rows} rows with {self.model_name} into {output_path} using {self._n_workers} workers: "
+                    f"{stats['rows_per_second']:.0f} rows/s")
+        if service.drift_monitor is not None:
+            stats["drifted_columns"] = self._report_drift(service.drift_monitor.report())
+        return stats
+
+    def _report_drift(self, report: Dict[str, Any]) -> List[str]:
+        if report["drifted"]:
+            logger.warning(f"Columns drifted from the training data of {self.model_name}: "
+                           f"{', '.join(report['drifted'])}")
+        if self._drift_report_path is not None:
+            with open(self._drift_report_path, "w") as f:
+                json.dump({"model_name": self.model_name, **report}, f, indent=4)
+        return report["drifted"]
+
+    def _predictions(self, service: PredictionService, chunks: Iterator[pd.DataFrame]):
+        """Yields every chunk with its predicted prices, in input order."""
+        if self._n_workers == 0:
+            for chunk in chunks:
+                yield chunk, service.predict_frame(chunk[service.columns])
+            return
+
+        with ProcessPoolExecutor(max_workers=self._n_workers, initializer=_init_worker,
+                                 initargs=(self.model_name, self._registry_dir, self._monitor_drift)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(_predict_chunk, chunk)))
+                # Bounds the chunks held in memory while keeping every worker busy
+                if len(pending) >= 2 * self._n_workers:
+                    yield self._result(service, pending.popleft())
+            while pending:
+                yield self._result(service, pending.popleft())
+
+    @staticmethod
+    def _result(service: PredictionService, item: Tuple[pd.DataFrame, Future]) -> Tuple[pd.DataFrame, np.ndarray]:
+        chunk, future = item
+        prices, drift_counts = future.result()
+        if drift_counts is not None:
+            service.drift_monitor.add(drift_counts)
+        return chunk, prices
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score a file of houses with a registered model.")
+    parser.add_argument('input_path', help="The CSV, Parquet or Feather file of houses to score.")
+    parser.add_argument('output_path', help="The Parquet file to write the predicted prices to.")
+    parser.add_argument('--model-name', default='GradientBoosting', help="The registered model name or family.")
+    parser.add_argument('--workers', type=int, default=None, help="The number of worker processes, 0 for none.")
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--registry-dir', default=REGISTRY_DIR)
+    parser.add_argument('--no-drift-monitor', action='store_true', help="Do not count the scored data for drift.")
+    parser.add_argument('--drift-report', help="A JSON file to write the drift scores of every column to.")
+    args = parser.parse_args()
+
+    scorer = BatchScorer(args.model_name, registry_dir=args.registry_dir, n_workers=args.workers,
+                         chunksize=args.chunksize, monitor_drift=not args.no_drift_monitor,
+                         drift_report_path=args.drift_report)
+    print(scorer.score(args.input_path, args.output_path))
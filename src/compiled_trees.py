@@ -0,0 +1,249 @@
+import copy
+import logging
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.tree import DecisionTreeRegressor
+
+from src.fused_preprocessing import FusedPreprocessor
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class CompiledTreeEnsemble:
+    def __init__(self, trees: List[Any], weights: Union[float, np.ndarray], baseline: float, n_features: int,
+                 complete_depth: int = 10):
+        """
+        Flattens fitted sklearn regression trees into one set of contiguous node arrays: split feature, threshold,
+        left and right child and leaf value, with every tree's nodes offset to global indices. The prediction is
+        `baseline + sum(weight * leaf value)` over the trees.
+
+        The top `complete_depth` levels of the trees are also laid out as complete binary trees, one row per tree in
+        heap order, with leaves above the last level padded by always-left nodes. Every (row, tree) pair descends
+        them with the same index arithmetic, `2 * node + 1 + (x > threshold)`, so that part of prediction is a fixed
+        number of vectorized gathers over a block of rows and all trees. Boosted trees usually fit entirely; pairs
+        of deeper trees, as grown by forests, continue from there over the node arrays, dropping the pairs that
+        reached a leaf. Rows are compared as float32, like sklearn's trees do, and missing values follow each node's
+        learned direction, so predictions match sklearn to float rounding.
+
+        :param:
+            trees (List[Any]): The fitted sklearn `Tree` objects (`estimator.tree_`).
+            weights (Union[float, np.ndarray]): The weight of each tree's values, e.g. the learning rate.
+            baseline (float): The constant added to every prediction, e.g. the initial estimate of boosting.
+            n_features (int): The number of input features.
+            complete_depth (int): The largest number of levels laid out as complete trees, which take 2 ** depth
+                entries per tree.
+        """
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), (len(trees),))
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+        feature, threshold, left, right, value, missing_go_to_left = [], [], [], [], [], []
+        for tree, offset, weight in zip(trees, offsets, weights):
+            if tree.n_outputs != 1:
+                raise ValueError("Only single-output regression trees can be compiled.")
+            is_leaf = tree.children_left < 0
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            # Leaves keep -1; internal nodes point to global child indices
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            value.append(tree.value[:, 0, 0] * weight)
+            missing_go_to_left.append(tree.missing_go_to_left.astype(bool) if hasattr(tree, 'missing_go_to_left')
+                                      else np.zeros(tree.node_count, dtype=bool))
+
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.int64)
+        self.threshold = np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64)
+        self.left = np.ascontiguousarray(np.concatenate(left), dtype=np.int64)
+        self.right = np.ascontiguousarray(np.concatenate(right), dtype=np.int64)
+        self.value = np.ascontiguousarray(np.concatenate(value), dtype=np.float64)
+        self.missing_go_to_left = np.ascontiguousarray(np.concatenate(missing_go_to_left))
+        self.roots = offsets.astype(np.int64)
+        self.baseline = float(baseline)
+        self.n_features_in_ = n_features
+        self.max_depth = max(tree.max_depth for tree in trees)
+        self.complete_depth = min(self.max_depth, complete_depth)
+        self.complete = self._complete_layout()
+
+    @classmethod
+    def from_estimator(cls, estimator: Any) -> "CompiledTreeEnsemble":
+        """
+        Compiles a fitted GradientBoostingRegressor, RandomForestRegressor, ExtraTreesRegressor or
+        DecisionTreeRegressor.
+        """
+        if isinstance(estimator, GradientBoostingRegressor):
+            if estimator.init_ == 'zero':
+                baseline = 0.0
+            elif isinstance(estimator.init_, DummyRegressor):
+                baseline = float(np.ravel(estimator.init_.constant_)[0])
+            else:
+                raise ValueError(f"Cannot compile the init estimator {type(estimator.init_).__name__}.")
+            trees = [tree.tree_ for tree in estimator.estimators_[:, 0]]
+            return cls(trees, estimator.learning_rate, baseline, estimator.n_features_in_)
+        if isinstance(estimator, (RandomForestRegressor, ExtraTreesRegressor)):
+            trees = [tree.tree_ for tree in estimator.estimators_]
+            return cls(trees, 1.0 / len(trees), 0.0, estimator.n_features_in_)
+        if isinstance(estimator, DecisionTreeRegressor):
+            return cls([estimator.tree_], 1.0, 0.0, estimator.n_features_in_)
+        raise ValueError(f"Cannot compile a {type(estimator).__name__}; only sklearn regression tree ensembles are "
+                         f"supported.")
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.feature, self.threshold, self.left, self.right, self.value, self.missing_go_to_left, self.roots]
+        return sum(array.nbytes for array in arrays + list(self.complete.values()))
+
+    def predict(self, X: np.ndarray, block_size: int = 1024) -> np.ndarray:
+        """
+        Predicts a dense 2D array, `block_size` rows at a time so the (row, tree) state stays in cache.
+        """
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X must have shape (n_rows, {self.n_features_in_}), got {X.shape}.")
+        # sklearn's trees compare float32 features with float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+        predictions = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), block_size):
+            block = X[start:start + block_size]
+            predictions[start:start + len(block)] = self.baseline + self._leaf_values(block).sum(axis=1)
+        return predictions
+
+    def _complete_layout(self) -> Dict[str, np.ndarray]:
+        """
+        Lays the top `complete_depth` levels of the trees out as complete binary trees: per tree, the internal nodes
+        in heap order, where node i has the children 2i + 1 and 2i + 2, and the global indices of the nodes reached
+        on the last level. A leaf above the last level becomes a chain of nodes that always go left, to itself.
+        """
+        n_internal = 2 ** self.complete_depth - 1
+        feature = np.zeros((self.n_trees, n_internal), dtype=np.int64)
+        threshold = np.full((self.n_trees, n_internal), np.inf)
+        missing_go_to_left = np.ones((self.n_trees, n_internal), dtype=bool)
+
+        nodes = self.roots[:, None]
+        for level in range(self.complete_depth):
+            level_slice = slice(2 ** level - 1, 2 ** (level + 1) - 1)
+            internal = self.left[nodes] >= 0
+            feature[:, level_slice] = np.where(internal, self.feature[nodes], 0)
+            threshold[:, level_slice] = np.where(internal, self.threshold[nodes], np.inf)
+            missing_go_to_left[:, level_slice] = np.where(internal, self.missing_go_to_left[nodes], True)
+            # A padded node sends both children to the same node
+            children = np.stack([np.where(internal, self.left[nodes], nodes),
+                                 np.where(internal, self.right[nodes], nodes)], axis=2)
+            nodes = children.reshape(self.n_trees, -1)
+
+        return {"feature": feature.ravel(), "threshold": threshold.ravel(),
+                "missing_go_to_left": missing_go_to_left.ravel(), "node": nodes.ravel()}
+
+    def _leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """Returns the weighted leaf value that every row reaches in every tree, shaped (n_rows, n_trees)."""
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        has_missing = np.isnan(flat_X).any()
+
+        # The complete top levels: every pair takes the same number of steps
+        n_internal = 2 ** self.complete_depth - 1
+        tree_offsets = (np.arange(self.n_trees, dtype=np.int64) * n_internal)[None, :]
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        position = np.zeros((n_rows, self.n_trees), dtype=np.int64)
+        for _ in range(self.complete_depth):
+            index = tree_offsets + position
+            x = flat_X[row_offsets + self.complete["feature"][index]]
+            go_right = x > self.complete["threshold"][index]
+            if has_missing:
+                go_right |= np.isnan(x) & ~self.complete["missing_go_to_left"][index]
+            position = 2 * position + 1 + go_right
+        leaf_offsets = (np.arange(self.n_trees, dtype=np.int64) * (n_internal + 1))[None, :]
+        node = self.complete["node"][leaf_offsets + position - n_internal].ravel()
+
+        # The levels below: only the pairs that have not reached a leaf yet
+        row_offsets = np.repeat(row_offsets.ravel(), self.n_trees)
+        active = np.flatnonzero(self.left[node] >= 0)
+        while active.size:
+            current = node[active]
+            x = flat_X[row_offsets[active] + self.feature[current]]
+            go_left = x <= self.threshold[current]
+            if has_missing:
+                missing = np.isnan(x)
+                go_left[missing] = self.missing_go_to_left[current[missing]]
+            current = np.where(go_left, self.left[current], self.right[current])
+            node[active] = current
+            active = active[self.left[current] >= 0]
+
+        return self.value[node].reshape(n_rows, self.n_trees)
+
+
+class CompiledPipeline:
+    def __init__(self, preprocessor: FusedPreprocessor, ensemble: CompiledTreeEnsemble):
+        """
+        A saved preprocessing and tree model pipeline with both steps compiled: the fitted ColumnTransformer as a
+        `FusedPreprocessor` writing one dense matrix, and the ensemble as a `CompiledTreeEnsemble`. It predicts raw
+        dataframes like the sklearn pipeline and can replace it wherever a pipeline is loaded, e.g. in the registry
+        or in `PredictionService`.
+        """
+        self.preprocessor = preprocessor
+        self.ensemble = ensemble
+
+    @property
+    def feature_names_in_(self) -> np.ndarray:
+        return self.preprocessor.feature_names_in_
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self.ensemble.predict(self.preprocessor.transform(X))
+
+
+def compile_pipeline(pipeline: Pipeline) -> CompiledPipeline:
+    """
+    Compiles a fitted Pipeline of a preprocessing step and a tree ensemble, e.g. a saved GradientBoosting or
+    RandomForest pipeline.
+
+    :param:
+        pipeline (Pipeline): The fitted pipeline; its first step is a ColumnTransformer or a FusedPreprocessor and its
+            last step a tree ensemble supported by `CompiledTreeEnsemble.from_estimator`.
+    :return:
+        CompiledPipeline: The compiled pipeline.
+    """
+    if len(pipeline.steps) != 2:
+        raise ValueError("Only pipelines of one preprocessing step and one model can be compiled.")
+    preprocessing_step, model = pipeline.steps[0][1], pipeline.steps[1][1]
+
+    if isinstance(preprocessing_step, ColumnTransformer):
+        preprocessor = FusedPreprocessor.from_fitted(preprocessing_step, sparse_output=False)
+    elif isinstance(preprocessing_step, FusedPreprocessor):
+        # A shallow copy shares the fitted blocks without changing the output format of the original
+        preprocessor = copy.copy(preprocessing_step)
+        preprocessor.sparse_output = False
+    else:
+        raise ValueError(f"Cannot compile the preprocessing step {type(preprocessing_step).__name__}.")
+
+    ensemble = CompiledTreeEnsemble.from_estimator(model)
+    logger.info(f"Compiled {type(model).__name__} into {ensemble.n_trees} trees, {len(ensemble.value)} nodes, "
+                f"{ensemble.nbytes / 2 ** 20:.2f} MB")
+    return CompiledPipeline(preprocessor, ensemble)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from src.model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Compile a registered tree model pipeline.")
+    parser.add_argument('model_name', help="The registered model name or family to compile.")
+    parser.add_argument('compiled_name', help="The model name to register the compiled pipeline under.")
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    registered = registry.load(args.model_name)
+    registry.register(args.compiled_name, compile_pipeline(registered.model), registered.scaler,
+                      metrics=registered.manifest.get("metrics"), profile=registered.profile,
+                      description=f"{registered.model_name} compiled to flat node arrays")
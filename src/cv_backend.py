@@ -0,0 +1,122 @@
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class CVBackend(ABC):
+    @abstractmethod
+    def share(self, X_train: Any, y_train: Any) -> ContextManager[Tuple[Any, Any]]:
+        """
+        Abstract method that prepares the training data for the workers of a hyperparameter search.
+
+        :param:
+            X_train (Any): The training data features, a DataFrame or a dense or sparse matrix.
+            y_train (Any): The training data labels/targets
+        :return:
+            ContextManager[Tuple[Any, Any]]: Yields the features and targets to search on; the data stays valid
+                after the context exits.
+        """
+        pass
+
+
+class InMemoryCVBackend(CVBackend):
+    @contextmanager
+    def share(self, X_train: Any, y_train: Any) -> Iterator[Tuple[Any, Any]]:
+        """Searches on the data as it is, which joblib pickles to every worker that needs it."""
+        yield X_train, y_train
+
+
+class MemmapCVBackend(CVBackend):
+    def __init__(self, temp_folder: Optional[str] = None):
+        """
+        Writes the training data once to memory-mapped files and searches on views of them.
+
+        joblib sends a memory-mapped array to its workers as a file reference, so every worker of a search maps the
+        same pages from the page cache instead of unpickling its own copy for each task. DataFrames are stored one
+        file per column type: every numeric column is a column of a Fortran-ordered matrix and every text column is
+        category-coded into a matrix of integer codes, with only the small category indexes pickled. Columns of any
+        other type stay in memory. Without this, numeric columns below joblib's 1 MB memmapping threshold, and all
+        object or string columns, are pickled and copied into every worker.
+
+        :param:
+            temp_folder (Optional[str]): Where to create the files, the system temporary directory if None. A RAM
+                backed folder such as /dev/shm keeps the data out of the disk.
+        """
+        self._temp_folder = temp_folder
+
+    @contextmanager
+    def share(self, X_train: Any, y_train: Any) -> Iterator[Tuple[Any, Any]]:
+        folder = tempfile.mkdtemp(prefix='cv-backend-', dir=self._temp_folder)
+        try:
+            X_shared, y_shared = self._share(X_train, folder, 'X'), self._share(y_train, folder, 'y')
+            size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+            logger.info(f"Memory-mapped the training data into {size / 2 ** 20:.1f} MB in {folder}")
+            yield X_shared, y_shared
+        finally:
+            # Mapped pages outlive their unlinked files, so arrays still referenced, e.g. by a fitted model, stay valid
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def _share(self, data: Any, folder: str, name: str) -> Any:
+        if isinstance(data, pd.DataFrame):
+            return self._share_frame(data, folder, name)
+        if isinstance(data, pd.Series):
+            return self._share_frame(data.to_frame(), folder, name).iloc[:, 0].rename(data.name)
+        if sparse.issparse(data):
+            data = data.tocsr()
+            return sparse.csr_matrix((self._memmap(data.data, folder, f'{name}.data'),
+                                      self._memmap(data.indices, folder, f'{name}.indices'),
+                                      self._memmap(data.indptr, folder, f'{name}.indptr')), shape=data.shape)
+        if isinstance(data, np.ndarray) and data.dtype != object:
+            return self._memmap(data, folder, name)
+        return data
+
+    def _share_frame(self, df: pd.DataFrame, folder: str, name: str) -> pd.DataFrame:
+        columns: Dict[Any, Any] = {}
+        groups: Dict[str, List[Any]] = {}
+        categorical = {}
+        for column in df.columns:
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                categorical[column] = values.dtype
+            elif pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype):
+                categorical[column] = values.astype('category').dtype
+            elif pd.api.types.is_numeric_dtype(values.dtype) and isinstance(values.dtype, np.dtype):
+                groups.setdefault(str(values.dtype), []).append(column)
+            else:
+                columns[column] = values
+
+        for dtype, group in groups.items():
+            matrix = self._memmap(df[group].to_numpy(dtype=dtype), folder, f'{name}.{dtype}', fortran_order=True)
+            columns.update({column: matrix[:, j] for j, column in enumerate(group)})
+
+        if categorical:
+            codes = [pd.Categorical(df[column], dtype=dtype).codes for column, dtype in categorical.items()]
+            codes_dtype = np.result_type(*[code.dtype for code in codes])
+            matrix = self._memmap(np.column_stack(codes).astype(codes_dtype), folder, f'{name}.codes',
+                                  fortran_order=True)
+            columns.update({column: pd.Categorical.from_codes(matrix[:, j], dtype=dtype, validate=False)
+                            for j, (column, dtype) in enumerate(categorical.items())})
+
+        # copy=False keeps every column a view of its file
+        return pd.DataFrame({column: columns[column] for column in df.columns}, index=df.index, copy=False)
+
+    @staticmethod
+    def _memmap(array: np.ndarray, folder: str, name: str, fortran_order: bool = False) -> np.memmap:
+        path = os.path.join(folder, f'{name}.npy')
+        memmap = np.lib.format.open_memmap(path, mode='w+', dtype=array.dtype, shape=array.shape,
+                                           fortran_order=fortran_order)
+        memmap[...] = array
+        memmap.flush()
+        del memmap
+        return np.load(path, mmap_mode='r')
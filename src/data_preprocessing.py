@@ -1,7 +1,12 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder
 
+from src.fused_preprocessing import FusedPreprocessor
 from src.missing_values_handling import MissingValuesHandler, FillMissingValuesStrategy
 from src.outlier_detection import OutlierHandlerCap
 
@@ -16,51 +21,86 @@ most_frequent_columns = ['Electrical', 'MSZoning', 'Utilities', 'Exterior1st', '
 constant_no_fireplace = ['FireplaceQu']
 constant_no_garage = ['GarageType', 'GarageFinish', 'GarageQual', 'GarageCond']
 
-# Create handlers for each group of columns
-missing_value_transformers = [
-    ('median_imputer', Pipeline(steps=[
-        ('imputer', MissingValuesHandler(FillMissingValuesStrategy(median_columns, method="median"))),
-        ('outlier_handler', OutlierHandlerCap(method='iqr', threshold=1.5)),
-        ('scaler', StandardScaler())
-    ]),
-     median_columns),
-    ('constant_none',
-     Pipeline(steps=[
-         ('imputer',
-          MissingValuesHandler(FillMissingValuesStrategy(constant_none, method="constant", fill_value='None'))),
-         ('encoder', OneHotEncoder(handle_unknown='ignore'))
-     ]),
-     constant_none),
-    ('constant_zero', Pipeline(steps=[
-        ('imputer', MissingValuesHandler(FillMissingValuesStrategy(constant_zero, method="constant", fill_value=0))),
-        ('outlier_handler', OutlierHandlerCap(method='iqr', threshold=1.5)),
-        ('scaler', StandardScaler())
-    ]),
-     constant_zero),
-    ('constant_no_basement', Pipeline(steps=[
-        ('imputer', MissingValuesHandler(
-            FillMissingValuesStrategy(constant_no_basement, method="constant", fill_value="No Basement"))),
-        ('encoder', OneHotEncoder(handle_unknown='ignore'))
-    ]),
-     constant_no_basement),
-    ('most_frequent', Pipeline(steps=[
-        ('imputer', MissingValuesHandler(FillMissingValuesStrategy(most_frequent_columns, method="most_frequent"))),
-        ('encoder', OneHotEncoder(handle_unknown='ignore'))
-    ]),
-     most_frequent_columns),
-    ('constant_no_fireplace', Pipeline(steps=[
-        ('imputer', MissingValuesHandler(
-            FillMissingValuesStrategy(constant_no_fireplace, method="constant", fill_value='No Fireplace'))),
-        ('encoder', OneHotEncoder(handle_unknown='ignore'))
-    ]),
-     constant_no_fireplace),
-    ('constant_no_garage', Pipeline(steps=[
-        ('imputer', MissingValuesHandler(
-            FillMissingValuesStrategy(constant_no_garage, method="constant", fill_value='No Garage'))),
-        ('encoder', OneHotEncoder(handle_unknown='ignore'))
-    ]),
-     constant_no_garage),
-]
+
+def categorical_encoder(encoding: str = 'onehot'):
+    """
+    Returns a new encoder for categorical columns.
+
+    :param:
+        encoding (str): 'onehot' for sparse one-hot columns, or 'ordinal' for one integer code per column, with -1
+            for unknown and missing values, which keeps the matrix compact for tree models.
+    :return:
+        The unfitted OneHotEncoder or OrdinalEncoder.
+    """
+    if encoding == 'onehot':
+        return OneHotEncoder(handle_unknown='ignore')
+    elif encoding == 'ordinal':
+        return OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1, encoded_missing_value=-1)
+    else:
+        raise ValueError(f"Unknown categorical encoding '{encoding}'")
+
+
+def numeric_steps(scale: bool = True, quantile_backend: str = 'exact') -> List[Tuple[str, Any]]:
+    """
+    Returns new outlier capping and, unless `scale` is False, standardization steps for numeric columns. With
+    quantile_backend='kll' the capping quartiles come from sketches, which incremental updates can extend.
+    """
+    steps = [('outlier_handler', OutlierHandlerCap(method='iqr', threshold=1.5, quantile_backend=quantile_backend))]
+    if scale:
+        steps.append(('scaler', StandardScaler()))
+    return steps
+
+
+def build_missing_value_transformers(encoding: str = 'onehot', scale: bool = True,
+                                     quantile_backend: str = 'exact') -> List[Tuple[str, Pipeline, List[str]]]:
+    """Creates handlers for each group of columns with missing values."""
+    return [
+        ('median_imputer', Pipeline(steps=[
+            ('imputer', MissingValuesHandler(FillMissingValuesStrategy(median_columns, method="median"))),
+            *numeric_steps(scale, quantile_backend)
+        ]),
+         median_columns),
+        ('constant_none',
+         Pipeline(steps=[
+             ('imputer',
+              MissingValuesHandler(FillMissingValuesStrategy(constant_none, method="constant", fill_value='None'))),
+             ('encoder', categorical_encoder(encoding))
+         ]),
+         constant_none),
+        ('constant_zero', Pipeline(steps=[
+            ('imputer',
+             MissingValuesHandler(FillMissingValuesStrategy(constant_zero, method="constant", fill_value=0))),
+            *numeric_steps(scale, quantile_backend)
+        ]),
+         constant_zero),
+        ('constant_no_basement', Pipeline(steps=[
+            ('imputer', MissingValuesHandler(
+                FillMissingValuesStrategy(constant_no_basement, method="constant", fill_value="No Basement"))),
+            ('encoder', categorical_encoder(encoding))
+        ]),
+         constant_no_basement),
+        ('most_frequent', Pipeline(steps=[
+            ('imputer',
+             MissingValuesHandler(FillMissingValuesStrategy(most_frequent_columns, method="most_frequent"))),
+            ('encoder', categorical_encoder(encoding))
+        ]),
+         most_frequent_columns),
+        ('constant_no_fireplace', Pipeline(steps=[
+            ('imputer', MissingValuesHandler(
+                FillMissingValuesStrategy(constant_no_fireplace, method="constant", fill_value='No Fireplace'))),
+            ('encoder', categorical_encoder(encoding))
+        ]),
+         constant_no_fireplace),
+        ('constant_no_garage', Pipeline(steps=[
+            ('imputer', MissingValuesHandler(
+                FillMissingValuesStrategy(constant_no_garage, method="constant", fill_value='No Garage'))),
+            ('encoder', categorical_encoder(encoding))
+        ]),
+         constant_no_garage),
+    ]
+
+
+missing_value_transformers = build_missing_value_transformers()
 
 numerical_features = ['MSSubClass', 'LotArea', 'OverallQual',
                       'OverallCond', 'YearBuilt', 'YearRemodAdd', 'BsmtFinSF1',
@@ -77,18 +117,92 @@ categorical_features = ['MSZoning', 'Street', 'LotShape', 'LandContour', 'Utilit
                         'Heating', 'HeatingQC', 'CentralAir', 'KitchenQual',
                         'Functional', 'PavedDrive', 'SaleType', 'SaleCondition']
 
-# Combine missing value handling, scaling, and encoding
-preprocessor = ColumnTransformer(
-    transformers=[
-        *missing_value_transformers,  # Missing value handling
-        ('scaler', Pipeline(steps=[
-            ('outlier_handler', OutlierHandlerCap(method='iqr', threshold=1.5)),
-            ('scaler', StandardScaler())
-        ]), numerical_features),  # Scaling for numerical columns
-        ('encoder', OneHotEncoder(handle_unknown='ignore'), categorical_features),  # One-hot encoding
-    ],
-    remainder='drop'  # Retain remaining columns
-)
+
+def build_preprocessor(encoding: str = 'onehot', scale: bool = True, quantile_backend: str = 'exact',
+                       sparse_output: bool = True) -> ColumnTransformer:
+    """
+    Combines missing value handling, scaling and encoding.
+
+    With one-hot encoding and `sparse_output` the output is always a CSR matrix: `sparse_threshold=1.0` keeps the
+    ColumnTransformer from densifying the mostly-zero one-hot columns, whatever the overall density, so memory grows
+    with the stored values rather than with rows x columns. Without `sparse_output` it is always dense. With ordinal
+    encoding the output is a dense matrix with one column per categorical feature.
+
+    :param:
+        encoding (str): The categorical encoding, 'onehot' or 'ordinal'.
+        scale (bool): Whether to standardize the numeric columns. Tree models split on thresholds and do not need it.
+        quantile_backend (str): How the outlier capping quartiles are computed, 'exact' or 'kll'. Use 'kll' for a
+            model that will be updated with `IncrementalModelTrainer`, whose capping bounds can then follow new rows.
+        sparse_output (bool): Whether the one-hot output is a CSR matrix rather than a dense one.
+    :return:
+        ColumnTransformer: The unfitted preprocessor.
+    """
+    return ColumnTransformer(
+        transformers=[
+            *build_missing_value_transformers(encoding, scale, quantile_backend),  # Missing value handling
+            # Scaling for numerical columns
+            ('scaler', Pipeline(steps=numeric_steps(scale, quantile_backend)), numerical_features),
+            ('encoder', categorical_encoder(encoding), categorical_features),  # Categorical encoding
+        ],
+        remainder='drop',  # Retain remaining columns
+        sparse_threshold=1.0 if sparse_output else 0.0
+    )
+
+
+def design_matrix_density(X) -> Dict[str, Any]:
+    """
+    Reports the shape, stored values, density and memory of a design matrix, and the memory it would take dense.
+    """
+    n_rows, n_columns = X.shape
+    if sparse.issparse(X):
+        X = X.tocsr()
+        nnz, nbytes, matrix_format = int(X.nnz), int(X.data.nbytes + X.indices.nbytes + X.indptr.nbytes), "csr"
+    else:
+        nnz, nbytes, matrix_format = int(np.count_nonzero(X)), int(X.nbytes), "dense"
+    return {"shape": [n_rows, n_columns], "format": matrix_format, "nnz": nnz,
+            "density": round(nnz / max(n_rows * n_columns, 1), 4), "bytes": nbytes,
+            "dense_bytes": n_rows * n_columns * X.dtype.itemsize}
+
+
+preprocessor = build_preprocessor()
+
+# The one-hot profile as a dense matrix, for the least-squares and libsvm solvers, which fit a dense matrix of this
+# width faster than its CSR form
+dense_preprocessor = build_preprocessor(sparse_output=False)
+
+# The tree profile: integer-coded categoricals, which trees split on instead of scanning hundreds of one-hot columns,
+# and unscaled numeric columns
+tree_preprocessor = build_preprocessor(encoding='ordinal', scale=False)
+
+
+def categorical_mask(column_transformer: ColumnTransformer = tree_preprocessor) -> np.ndarray:
+    """
+    Returns which output columns of an ordinal-encoded column transformer hold category codes, e.g. for the
+    `categorical_features` of HistGradientBoostingRegressor.
+    """
+    mask = []
+    for _, transformer, columns in column_transformer.transformers:
+        if transformer == 'drop':
+            continue
+        encoder = transformer.steps[-1][1] if isinstance(transformer, Pipeline) else transformer
+        if isinstance(encoder, OneHotEncoder):
+            raise ValueError("The category codes of one-hot encoded columns are not known before fitting.")
+        mask.extend([isinstance(encoder, OrdinalEncoder)] * len(columns))
+    return np.array(mask)
+
+
+def get_required_columns(column_transformer: ColumnTransformer = preprocessor) -> List[str]:
+    """
+    Returns the input columns a column transformer reads, in first-use order, so ingestion can skip the others.
+    """
+    columns = []
+    for _, _, transformer_columns in column_transformer.transformers:
+        columns.extend(column for column in transformer_columns if column not in columns)
+    return columns
+
+
+# Single-pass kernel compiled from the same column groups, numerically equivalent to `preprocessor`
+fused_preprocessor = FusedPreprocessor(preprocessor)
 
 if __name__ == '__main__':
     import os
@@ -0,0 +1,48 @@
+from typing import Dict, List, Optional
+
+# Explicit column types of the house prices data. Every numeric column holds integer-valued data well below 2**24, so
+# float32 stores it exactly while leaving room for missing values; text columns are loaded as categoricals.
+ID_COLUMN = 'Id'
+TARGET_COLUMN = 'SalePrice'
+
+NUMERIC_COLUMNS = [
+    'MSSubClass', 'LotFrontage', 'LotArea', 'OverallQual', 'OverallCond', 'YearBuilt',
+    'YearRemodAdd', 'MasVnrArea', 'BsmtFinSF1', 'BsmtFinSF2', 'BsmtUnfSF', 'TotalBsmtSF',
+    '1stFlrSF', '2ndFlrSF', 'LowQualFinSF', 'GrLivArea', 'BsmtFullBath', 'BsmtHalfBath',
+    'FullBath', 'HalfBath', 'BedroomAbvGr', 'KitchenAbvGr', 'TotRmsAbvGrd', 'Fireplaces',
+    'GarageYrBlt', 'GarageCars', 'GarageArea', 'WoodDeckSF', 'OpenPorchSF', 'EnclosedPorch',
+    '3SsnPorch', 'ScreenPorch', 'PoolArea', 'MiscVal', 'MoSold', 'YrSold',
+]
+
+CATEGORICAL_COLUMNS = [
+    'MSZoning', 'Street', 'Alley', 'LotShape', 'LandContour', 'Utilities',
+    'LotConfig', 'LandSlope', 'Neighborhood', 'Condition1', 'Condition2', 'BldgType',
+    'HouseStyle', 'RoofStyle', 'RoofMatl', 'Exterior1st', 'Exterior2nd', 'MasVnrType',
+    'ExterQual', 'ExterCond', 'Foundation', 'BsmtQual', 'BsmtCond', 'BsmtExposure',
+    'BsmtFinType1', 'BsmtFinType2', 'Heating', 'HeatingQC', 'CentralAir', 'Electrical',
+    'KitchenQual', 'Functional', 'FireplaceQu', 'GarageType', 'GarageFinish', 'GarageQual',
+    'GarageCond', 'PavedDrive', 'PoolQC', 'Fence', 'MiscFeature', 'SaleType',
+    'SaleCondition',
+]
+
+HOUSE_PRICES_SCHEMA: Dict[str, str] = {
+    ID_COLUMN: 'int32',
+    **{column: 'float32' for column in NUMERIC_COLUMNS},
+    **{column: 'category' for column in CATEGORICAL_COLUMNS},
+    TARGET_COLUMN: 'float32',
+}
+
+
+def project_schema(schema: Dict[str, str], columns: Optional[List[str]]) -> Dict[str, str]:
+    """
+    Restricts a schema to the given columns.
+
+    :param:
+        schema (Dict[str, str]): The column types.
+        columns (Optional[List[str]]): The columns to keep, or None to keep all of them.
+    :return:
+        Dict[str, str]: The column types of the kept columns.
+    """
+    if columns is None:
+        return dict(schema)
+    return {column: schema[column] for column in columns if column in schema}
@@ -0,0 +1,305 @@
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.data_preprocessing import get_required_columns
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# The profile entry of the predicted prices
+PREDICTION_COLUMN = 'prediction'
+
+# Smooths empty bins, whose log ratio would be infinite
+PSI_EPSILON = 1e-4
+
+# Batches up to this size, such as single requests, are converted as a whole rather than column by column
+SMALL_BATCH_ROWS = 64
+
+
+class ReferenceProfile:
+    def __init__(self, columns: Dict[str, Dict[str, Any]]):
+        """
+        A compact summary of the training data that incoming data is compared with, saved as JSON next to the model.
+
+        Every column is a histogram whose last bin counts the missing values. Numeric columns have equal-frequency
+        bins: their interior edges are the training deciles, merged where they coincide, e.g. for mostly-zero areas.
+        Categorical columns have one bin per training category and an empty bin for categories never seen in
+        training. The size of a profile depends on the number of columns and bins, not on the number of rows.
+
+        :param:
+            columns (Dict[str, Dict[str, Any]]): Per column, its "type", 'numeric' or 'categorical', its "edges" or
+                "categories", and the "proportions" of its bins in the training data.
+        """
+        self.columns = columns
+
+    @classmethod
+    def build(cls, X: pd.DataFrame, predictions: Optional[np.ndarray] = None, columns: Optional[List[str]] = None,
+              n_bins: int = 10) -> "ReferenceProfile":
+        """
+        :param:
+            X (pd.DataFrame): The raw training features.
+            predictions (Optional[np.ndarray]): The model's predicted prices of held-out rows, to monitor the
+                predictions as well; they can also be added later with `add_numeric`.
+            columns (Optional[List[str]]): The columns to profile, by default those the preprocessor reads.
+            n_bins (int): The number of equal-frequency bins of the numeric columns.
+        :return:
+            ReferenceProfile: The profile.
+        """
+        if columns is None:
+            columns = [column for column in get_required_columns() if column in X.columns]
+        profile = cls({})
+        for column in columns:
+            values = X[column]
+            if pd.api.types.is_numeric_dtype(values.dtype):
+                profile.add_numeric(column, values.to_numpy(dtype=np.float64, na_value=np.nan), n_bins)
+            else:
+                profile.add_categorical(column, values)
+        if predictions is not None:
+            profile.add_numeric(PREDICTION_COLUMN, predictions, n_bins)
+        return profile
+
+    def add_numeric(self, column: str, values: np.ndarray, n_bins: int = 10) -> "ReferenceProfile":
+        values = np.asarray(values, dtype=np.float64).ravel()
+        present = values[~np.isnan(values)]
+        edges = np.unique(np.quantile(present, np.linspace(0, 1, n_bins + 1)[1:-1])) if len(present) else np.empty(0)
+        counts = np.bincount(np.searchsorted(edges, present, side='right'), minlength=len(edges) + 1)
+        self.columns[column] = {"type": "numeric", "edges": edges.tolist(),
+                                "proportions": _proportions(np.append(counts, len(values) - len(present)))}
+        return self
+
+    def add_categorical(self, column: str, values: pd.Series) -> "ReferenceProfile":
+        counts = values.value_counts(dropna=True)
+        counts = counts[counts > 0].sort_index()
+        n_missing = int(values.isna().sum())
+        self.columns[column] = {"type": "categorical", "categories": counts.index.tolist(),
+                                "proportions": _proportions(np.concatenate([counts.to_numpy(), [0, n_missing]]))}
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"columns": self.columns}
+
+    @classmethod
+    def from_dict(cls, profile: Dict[str, Any]) -> "ReferenceProfile":
+        return cls(profile["columns"])
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "ReferenceProfile":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _proportions(counts: np.ndarray) -> List[float]:
+    total = counts.sum()
+    return (counts / total).tolist() if total else [0.0] * len(counts)
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """The population stability index of two histograms of proportions: below 0.1 is stable, above 0.25 has moved."""
+    expected = np.maximum(expected, PSI_EPSILON)
+    actual = np.maximum(actual, PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class DriftMonitor:
+    def __init__(self, profile: ReferenceProfile, psi_threshold: float = 0.25, min_rows: int = 100):
+        """
+        Compares the data scored by a model with its reference profile.
+
+        `update` only counts every value into the bins of its column's reference histogram, so the state is one
+        integer array of the profile's size whatever the number of rows scored, and its cost is a few vectorized
+        passes over the batch: a binary search of the edges per numeric column and a hash lookup per categorical
+        value. Batches of a few rows, such as single requests, are converted to one array as a whole and binned
+        against a padded matrix of all the edges at once, since per-column calls would cost more than the counting.
+        The counts of monitors over the same profile add up, so scoring workers can each count their chunks and `add`
+        them to one monitor.
+
+        Scores are computed from the counts on demand: the population stability index (PSI) of every column's
+        histogram, missing bin included, and for numeric columns a Kolmogorov-Smirnov style distance, the largest
+        gap between the reference and the observed cumulative proportions of the present values at the bin edges,
+        which is a lower bound of the KS statistic of the raw values.
+
+        :param:
+            profile (ReferenceProfile): The reference profile of the training data.
+            psi_threshold (float): The PSI above which a column is reported as drifted.
+            min_rows (int): The number of values a column needs before it can be reported as drifted.
+        """
+        self.profile = profile
+        self._psi_threshold = psi_threshold
+        self._min_rows = min_rows
+
+        numeric = [(column, spec) for column, spec in profile.columns.items() if spec["type"] == "numeric"]
+        categorical = [(column, spec) for column, spec in profile.columns.items() if spec["type"] == "categorical"]
+        self._numeric_columns = [column for column, _ in numeric]
+        self._categorical_columns = [column for column, _ in categorical]
+
+        # Edges padded with +inf to a common width; bins are clipped to each column's own edges
+        n_edges = np.array([len(spec["edges"]) for _, spec in numeric], dtype=np.int64)
+        self._edges = np.full((len(numeric), max(n_edges, default=0)), np.inf)
+        for j, (_, spec) in enumerate(numeric):
+            self._edges[j, :n_edges[j]] = spec["edges"]
+        self._n_edges = n_edges
+
+        # Every column's bins are a slice of one flat counts array: values, then missing
+        sizes = [len(spec["proportions"]) for _, spec in numeric + categorical]
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self._categories = [pd.Index(spec["categories"]) for _, spec in categorical]
+        self._lookups = [{category: code for code, category in enumerate(spec["categories"])}
+                         for _, spec in categorical]
+        self._cached_positions = None
+        self._counts = np.zeros(self._offsets[-1], dtype=np.int64)
+        self._lock = threading.Lock()
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._counts.copy()
+
+    def histogram(self, X: pd.DataFrame, predictions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Counts one batch into the bins of the profile without changing the monitor, e.g. in a worker process.
+
+        :param:
+            X (pd.DataFrame): The raw features of the batch. Profiled columns it lacks are not counted.
+            predictions (Optional[np.ndarray]): The predicted prices of the batch.
+        :return:
+            np.ndarray: The flat bin counts, to pass to `add`.
+        """
+        counts = np.zeros_like(self._counts)
+        numeric_positions, categorical_positions = self._positions(X)
+        numeric = np.flatnonzero(numeric_positions >= 0)
+        categorical = np.flatnonzero(categorical_positions >= 0)
+
+        if len(X) <= SMALL_BATCH_ROWS:
+            # One conversion of the whole frame; a pandas call per column would cost more than the counting
+            block = X.to_numpy(dtype=object)
+            values = block[:, numeric_positions[numeric]].astype(np.float64)
+            self._count_values(block[:, categorical_positions[categorical]], categorical, counts)
+        else:
+            values = X.iloc[:, numeric_positions[numeric]].to_numpy(dtype=np.float64, na_value=np.nan)
+            for j, position in zip(categorical, categorical_positions[categorical]):
+                self._count_series(X.iloc[:, position], j, counts)
+
+        if predictions is not None and PREDICTION_COLUMN in self.profile.columns:
+            numeric = np.append(numeric, self._numeric_columns.index(PREDICTION_COLUMN))
+            values = np.column_stack([values, np.asarray(predictions, dtype=np.float64).ravel()])
+        if len(numeric):
+            self._count_numeric(values, numeric, counts)
+        return counts
+
+    def _positions(self, X: pd.DataFrame):
+        """The positions in X of the numeric and the categorical columns, -1 when absent, cached for the last layout."""
+        key = tuple(X.columns)
+        if self._cached_positions is None or self._cached_positions[0] != key:
+            self._cached_positions = (key, X.columns.get_indexer(self._numeric_columns),
+                                      X.columns.get_indexer(self._categorical_columns))
+        return self._cached_positions[1:]
+
+    def _count_values(self, block: np.ndarray, columns: np.ndarray, counts: np.ndarray):
+        """Counts the categorical values of a few rows with one dict lookup each."""
+        # Unseen categories go to the bin after the known ones, missing values to the last bin
+        offsets = self._offsets[len(self._numeric_columns):]
+        missing = pd.isna(block)
+        bins = [offsets[j] + (len(self._lookups[j]) + 1 if is_missing else
+                              self._lookups[j].get(value, len(self._lookups[j])))
+                for k, j in enumerate(columns) for value, is_missing in zip(block[:, k], missing[:, k])]
+        counts += np.bincount(bins, minlength=len(counts))
+
+    def _count_series(self, values: pd.Series, j: int, counts: np.ndarray):
+        """Counts the values of one categorical column with a vectorized lookup."""
+        offset, n_categories = self._offsets[len(self._numeric_columns) + j], len(self._categories[j])
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Maps the column's own categories once, and its missing code -1 to the last entry
+            mapping = self._categories[j].get_indexer(values.cat.categories)
+            mapping[mapping < 0] = n_categories
+            codes = np.append(mapping, n_categories + 1)[values.cat.codes.to_numpy()]
+        else:
+            codes = self._categories[j].get_indexer(values)
+            codes[codes < 0] = n_categories
+            codes[values.isna().to_numpy()] = n_categories + 1
+        counts[offset:offset + n_categories + 2] += np.bincount(codes, minlength=n_categories + 2)
+
+    def _count_numeric(self, values: np.ndarray, columns: np.ndarray, counts: np.ndarray):
+        n_edges, offsets = self._n_edges[columns], self._offsets[columns]
+        if len(values) <= SMALL_BATCH_ROWS:
+            # The number of edges at or below a value is its bin, for all columns in one comparison
+            bins = np.minimum((values[:, :, None] >= self._edges[columns][None, :, :]).sum(axis=2), n_edges)
+            bins = np.where(np.isnan(values), n_edges + 1, bins)
+            n_bins = self._offsets[len(self._numeric_columns)]
+            counts[:n_bins] += np.bincount((bins + offsets).ravel(), minlength=n_bins)
+            return
+
+        for k, j in enumerate(columns):
+            bins = np.searchsorted(self._edges[j, :n_edges[k]], values[:, k], side='right')
+            bins[np.isnan(values[:, k])] = n_edges[k] + 1
+            counts[offsets[k]:offsets[k] + n_edges[k] + 2] += np.bincount(bins, minlength=n_edges[k] + 2)
+
+    def add(self, counts: np.ndarray) -> "DriftMonitor":
+        """Adds the counts of `histogram`, or of another monitor over the same profile."""
+        with self._lock:
+            self._counts += counts
+        return self
+
+    def update(self, X: pd.DataFrame, predictions: Optional[np.ndarray] = None) -> "DriftMonitor":
+        """Counts one scored batch."""
+        return self.add(self.histogram(X, predictions))
+
+    def drain(self) -> np.ndarray:
+        """Returns the counts and resets them, e.g. to send a worker's counts to the monitor of the main process."""
+        with self._lock:
+            counts, self._counts = self._counts, np.zeros_like(self._counts)
+        return counts
+
+    def merge(self, other: "DriftMonitor") -> "DriftMonitor":
+        return self.add(other.counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts[:] = 0
+
+    def scores(self) -> Dict[str, Dict[str, Any]]:
+        """
+        :return:
+            Dict[str, Dict[str, Any]]: Per profiled column, the number of values counted, the PSI, the KS distance
+                of numeric columns, and the reference and observed missing rates.
+        """
+        counts = self.counts
+        columns = self._numeric_columns + self._categorical_columns
+        scores = {}
+        for j, column in enumerate(columns):
+            observed = counts[self._offsets[j]:self._offsets[j + 1]]
+            expected = np.asarray(self.profile.columns[column]["proportions"])
+            n = int(observed.sum())
+            if n == 0:
+                scores[column] = {"rows": 0}
+                continue
+            actual = observed / n
+            score = {"rows": n, "psi": round(psi(expected, actual), 4), "missing_rate": round(float(actual[-1]), 4),
+                     "reference_missing_rate": round(float(expected[-1]), 4)}
+            if j < len(self._numeric_columns):
+                score["ks"] = round(_binned_ks(expected[:-1], actual[:-1]), 4)
+            scores[column] = score
+        return scores
+
+    def report(self) -> Dict[str, Any]:
+        """The scores of every column and the columns whose PSI exceeds the threshold, worst first."""
+        scores = self.scores()
+        drifted = sorted((column for column, score in scores.items()
+                          if score["rows"] >= self._min_rows and score["psi"] > self._psi_threshold),
+                         key=lambda column: -scores[column]["psi"])
+        return {"psi_threshold": self._psi_threshold, "drifted": drifted, "columns": scores}
+
+
+def _binned_ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    """The largest gap of the cumulative proportions of two histograms of present values, each normalized."""
+    expected_total, actual_total = expected.sum(), actual.sum()
+    if expected_total == 0 or actual_total == 0:
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(expected) / expected_total - np.cumsum(actual) / actual_total)))
@@ -1,36 +1,188 @@
 import os
 import json
-from typing import Dict, Optional
+import math
+import sqlite3
+import time
+from contextlib import closing
+from numbers import Real
+from typing import Any, Dict, List, Optional
 
-LOG_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/metrics.json')
+LOG_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/experiments.db')
+LEGACY_LOG_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/metrics.json')
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_name TEXT NOT NULL,
+    model_family TEXT NOT NULL,
+    description TEXT,
+    logged_at REAL NOT NULL,
+    details TEXT NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS runs_model_name_logged_at ON runs (model_name, logged_at);
+CREATE INDEX IF NOT EXISTS runs_model_family_logged_at ON runs (model_family, logged_at);
+CREATE INDEX IF NOT EXISTS metrics_name_value ON metrics (name, value);
+"""
 
-def load_logs():
-    try:
-        with open(LOG_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
 
+def model_family(model_name: str) -> str:
+    """Returns the family of a versioned model name, e.g. 'GradientBoosting' for 'GradientBoosting_v2.0'."""
+    return model_name.rsplit('_v', 1)[0]
 
-def save_logs(logs):
-    exp_dir = os.path.dirname(LOG_FILE)
 
-    if not os.path.exists(exp_dir):
-        os.makedirs(exp_dir)
+def connect(log_file: str = LOG_FILE) -> sqlite3.Connection:
+    """
+    Opens the experiment log, creating it if needed. The log is a SQLite database in WAL mode, so concurrent training
+    jobs append in their own transactions without blocking readers, and writers wait for each other instead of
+    overwriting each other's runs.
+    """
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    conn = sqlite3.connect(log_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
 
-    with open(LOG_FILE, "w") as f:
-        json.dump(logs, f, indent=4)
+
+def _insert_run(conn: sqlite3.Connection, model_name: str, description: Optional[str], eval_metrics: Dict[str, Any],
+                logged_at: float, source: Optional[str] = None) -> int:
+    # Finite numeric metrics are indexed for queries; everything else, such as the best params or a NaN score that
+    # no ranking can use, is kept as JSON
+    numeric = {name: float(value) for name, value in eval_metrics.items()
+               if isinstance(value, Real) and not isinstance(value, bool) and math.isfinite(value)}
+    details = {name: value for name, value in eval_metrics.items() if name not in numeric}
+
+    cursor = conn.execute(
+        "INSERT INTO runs (model_name, model_family, description, logged_at, details, source) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (model_name, model_family(model_name), description, logged_at, json.dumps(details, default=str), source))
+    conn.executemany("INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                     [(cursor.lastrowid, name, value) for name, value in numeric.items()])
+    return cursor.lastrowid
 
 
 def log_experiment(model_name: str,
                    description: Optional[str],
-                   eval_metrics: Dict[str, any]):
-    logs = load_logs()
+                   eval_metrics: Dict[str, any],
+                   log_file: str = LOG_FILE) -> int:
+    """
+    Appends a run to the experiment log in a single transaction. Earlier runs, including runs of the same model
+    name, are never rewritten.
+
+    :param:
+        model_name (str): The versioned model name, e.g. 'GradientBoosting_v2.0'.
+        description (Optional[str]): What distinguishes this run.
+        eval_metrics (Dict[str, any]): The evaluation metrics and any other run details such as the best params.
+        log_file (str): The experiment log database.
+    :return:
+        int: The id of the logged run.
+    """
+    with closing(connect(log_file)) as conn, conn:
+        return _insert_run(conn, model_name, description, eval_metrics, time.time())
 
-    logs[model_name] = {
-        "description": description,
-        **eval_metrics
+
+def _run_to_dict(conn: sqlite3.Connection, row: sqlite3.Row) -> Dict[str, Any]:
+    metrics = {metric["name"]: metric["value"]
+               for metric in conn.execute("SELECT name, value FROM metrics WHERE run_id = ?", (row["id"],))}
+    return {
+        "run_id": row["id"],
+        "model_name": row["model_name"],
+        "model_family": row["model_family"],
+        "description": row["description"],
+        "logged_at": row["logged_at"],
+        **metrics,
+        **json.loads(row["details"]),
     }
 
-    save_logs(logs)
+
+def best_run_per_model_family(metric: str = "Root Mean Squared Error", higher_is_better: bool = False,
+                              log_file: str = LOG_FILE) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the best run of every model family by one metric. The ranking runs inside SQLite on the metrics index,
+    so only the winning runs are loaded.
+
+    :param:
+        metric (str): The metric used to rank runs.
+        higher_is_better (bool): Whether larger metric values are better, as for R-squared.
+        log_file (str): The experiment log database.
+    :return:
+        Dict[str, Dict[str, Any]]: The best run of each model family, keyed by family.
+    """
+    order = "DESC" if higher_is_better else "ASC"
+    query = f"""
+        SELECT * FROM (
+            SELECT runs.*, ROW_NUMBER() OVER (
+                PARTITION BY runs.model_family ORDER BY metrics.value {order}, runs.logged_at DESC
+            ) AS rank
+            FROM metrics JOIN runs ON runs.id = metrics.run_id
+            WHERE metrics.name = ?
+        ) WHERE rank = 1 ORDER BY model_family
+    """
+    with closing(connect(log_file)) as conn:
+        return {row["model_family"]: _run_to_dict(conn, row) for row in conn.execute(query, (metric,))}
+
+
+def model_history(model_name: str, log_file: str = LOG_FILE) -> List[Dict[str, Any]]:
+    """Returns every run of a model name, oldest first."""
+    with closing(connect(log_file)) as conn:
+        rows = conn.execute("SELECT * FROM runs WHERE model_name = ? ORDER BY logged_at", (model_name,)).fetchall()
+        return [_run_to_dict(conn, row) for row in rows]
+
+
+def load_logs(log_file: str = LOG_FILE) -> Dict[str, Dict[str, Any]]:
+    """Returns the latest run of every model name in the former metrics.json layout."""
+    query = """
+        SELECT * FROM runs WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY model_name ORDER BY logged_at DESC, id DESC) AS rank
+                FROM runs
+            ) WHERE rank = 1
+        ) ORDER BY id
+    """
+    with closing(connect(log_file)) as conn:
+        logs = {}
+        for row in conn.execute(query).fetchall():
+            run = _run_to_dict(conn, row)
+            logs[row["model_name"]] = {"description": run["description"],
+                                       **{name: value for name, value in run.items()
+                                          if name not in ("run_id", "model_name", "model_family", "description",
+                                                          "logged_at")}}
+        return logs
+
+
+def import_metrics_json(json_path: str = LEGACY_LOG_FILE, log_file: str = LOG_FILE) -> int:
+    """
+    Imports the runs of a legacy metrics.json into the experiment log. A file is imported only once; importing it
+    again is a no-op.
+
+    :return:
+        int: The number of imported runs.
+    """
+    source = os.path.abspath(json_path)
+    with open(json_path, "r") as f:
+        logs = json.load(f)
+
+    with closing(connect(log_file)) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM runs WHERE source = ? LIMIT 1", (source,)).fetchone():
+            return 0
+
+        logged_at = os.path.getmtime(json_path)
+        for model_name, run in logs.items():
+            run = dict(run)
+            description = run.pop("description", None)
+            _insert_run(conn, model_name, description, run, logged_at, source)
+        return len(logs)
+
+
+if __name__ == '__main__':
+    print(f"Imported {import_metrics_json()} runs from {LEGACY_LOG_FILE}")
+    for family, run in best_run_per_model_family().items():
+        print(f"{family}: {run['model_name']} RMSE={run['Root Mean Squared Error']}")
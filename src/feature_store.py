@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, clone
+from sklearn.model_selection import train_test_split
+
+from src.data_preprocessing import design_matrix_density
+from src.preprocessing_cache import fingerprint_estimator
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FEATURE_STORE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/feature_store')
+
+
+def file_digest(file_path: str, block_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    def __init__(self, root_dir: str = FEATURE_STORE_DIR):
+        """
+        Stores preprocessed design matrices as raw .npy files that later runs load memory-mapped instead of re-parsing
+        and re-preprocessing the source data. Dense matrices are saved as one array and CSR matrices as their data,
+        indices and indptr arrays. Memory-mapped arrays are passed to joblib workers by file reference, so parallel
+        GridSearchCV workers map the same pages instead of receiving a pickled copy.
+
+        :param:
+            root_dir (str): The directory holding one subdirectory per feature set.
+        """
+        self._root_dir = root_dir
+
+    def key_for(self, file_path: str, preprocessor: BaseEstimator, **config: Any) -> str:
+        """
+        Returns the key of the feature set built from a source file with a preprocessor configuration.
+
+        :param:
+            file_path (str): The source data file, hashed by content.
+            preprocessor (BaseEstimator): The unfitted preprocessor, hashed by its parameters.
+            config (Any): Any other settings the feature set depends on, such as the split seed.
+        :return:
+            str: The feature set key.
+        """
+        digest = hashlib.sha256()
+        digest.update(file_digest(file_path).encode())
+        digest.update(fingerprint_estimator(preprocessor).encode())
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return digest.hexdigest()[:32]
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self._path(key), 'manifest.json'))
+
+    def save(self, key: str, arrays: Dict[str, Any], objects: Optional[Dict[str, Any]] = None):
+        """
+        Saves a feature set. It is written to a temporary directory and moved into place, so concurrent readers never
+        see a partial feature set.
+
+        :param:
+            key (str): The feature set key.
+            arrays (Dict[str, Any]): Dense arrays or sparse matrices, stored for memory-mapped loading.
+            objects (Optional[Dict[str, Any]]): Small objects such as the fitted preprocessor, stored with joblib.
+        """
+        tmp_path = f"{self._path(key)}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_path)
+
+        manifest = {"arrays": {}}
+        for name, array in arrays.items():
+            if sparse.issparse(array):
+                array = array.tocsr()
+                for part in ('data', 'indices', 'indptr'):
+                    np.save(os.path.join(tmp_path, f"{name}.{part}.npy"), getattr(array, part))
+                manifest["arrays"][name] = {"format": "csr", "shape": list(array.shape),
+                                            "density": design_matrix_density(array)["density"]}
+            else:
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(array))
+                manifest["arrays"][name] = {"format": "dense"}
+
+        if objects:
+            joblib.dump(objects, os.path.join(tmp_path, 'objects.joblib'))
+
+        with open(os.path.join(tmp_path, 'manifest.json'), "w") as f:
+            json.dump(manifest, f, indent=4)
+
+        try:
+            os.rename(tmp_path, self._path(key))
+        except OSError:
+            # Another process stored the same feature set first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def load(self, key: str, mmap_mode: Optional[str] = 'r') -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Loads a feature set.
+
+        :param:
+            key (str): The feature set key.
+            mmap_mode (Optional[str]): The numpy memory-map mode, or None to read the arrays into memory.
+        :return:
+            Tuple[Dict[str, Any], Dict[str, Any]]: The arrays and the objects of the feature set.
+        """
+        path = self._path(key)
+        with open(os.path.join(path, 'manifest.json'), "r") as f:
+            manifest = json.load(f)
+
+        arrays = {}
+        for name, spec in manifest["arrays"].items():
+            if spec["format"] == "csr":
+                data, indices, indptr = (np.load(os.path.join(path, f"{name}.{part}.npy"), mmap_mode=mmap_mode)
+                                         for part in ('data', 'indices', 'indptr'))
+                arrays[name] = sparse.csr_matrix((data, indices, indptr), shape=tuple(spec["shape"]), copy=False)
+            else:
+                arrays[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        objects_path = os.path.join(path, 'objects.joblib')
+        objects = joblib.load(objects_path) if os.path.exists(objects_path) else {}
+        return arrays, objects
+
+    def get_or_build(self, key: str, builder: Callable[[], Tuple[Dict[str, Any], Dict[str, Any]]],
+                     mmap_mode: Optional[str] = 'r') -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Loads a feature set, building and saving it first if the store does not contain it yet.
+
+        :param:
+            key (str): The feature set key.
+            builder (Callable): Returns the arrays and objects of the feature set.
+            mmap_mode (Optional[str]): The numpy memory-map mode used to load the arrays.
+        :return:
+            Tuple[Dict[str, Any], Dict[str, Any]]: The arrays and the objects of the feature set.
+        """
+        if self.contains(key):
+            logger.info(f"Loading feature set {key} from the feature store")
+        else:
+            logger.info(f"Building feature set {key}")
+            self.save(key, *builder())
+        return self.load(key, mmap_mode)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._root_dir, key)
+
+
+def build_train_test_features(X, y, preprocessor: BaseEstimator, test_size: float = 0.2,
+                              random_state: int = 42) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Splits the data, fits a clone of the preprocessor on the training split and transforms both splits.
+
+    :return:
+        Tuple[Dict[str, Any], Dict[str, Any]]: The X_train, X_test, y_train and y_test arrays, and the fitted
+            preprocessor under 'preprocessor'.
+    """
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+    fitted_preprocessor = clone(preprocessor)
+    arrays = {
+        "X_train": fitted_preprocessor.fit_transform(X_train),
+        "X_test": fitted_preprocessor.transform(X_test),
+        "y_train": np.asarray(y_train),
+        "y_test": np.asarray(y_test),
+    }
+    logger.info(f"Training design matrix: {design_matrix_density(arrays['X_train'])}")
+    return arrays, {"preprocessor": fitted_preprocessor}
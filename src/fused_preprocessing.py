@@ -0,0 +1,391 @@
+import copy
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+
+from src.missing_values_handling import MissingValuesHandler, FillMissingValuesStrategy
+from src.outlier_detection import OutlierHandlerCap
+
+
+class _NumericBlock:
+    def __init__(self, name: str, columns: List[str], imputer: Optional[FillMissingValuesStrategy],
+                 outlier_handler: Optional[OutlierHandlerCap], scaler: Optional[StandardScaler]):
+        """
+        A numeric branch of the column transformer: optional imputation, optional capping and optional
+        standardization of `columns`, written into `n_outputs` consecutive output columns.
+        """
+        self.name = name
+        self.columns = columns
+        self.imputer = imputer
+        self.outlier_handler = outlier_handler
+        self.scaler = scaler
+        self.n_outputs = len(columns)
+
+        # Fitted state
+        self.fill_values = None
+        self.lower_bounds = None
+        self.upper_bounds = None
+        self.mean = None
+        self.scale = None
+
+    def fit_transform(self, X: pd.DataFrame, out: np.ndarray):
+        self._load(X, out)
+
+        if self.imputer is not None:
+            fill_values = self.imputer.fit(X[self.columns]).fill_values
+            self.fill_values = np.array([fill_values[column] for column in self.columns], dtype=np.float64)
+            self._impute(out)
+
+        if self.outlier_handler is not None:
+            outlier_handler = clone(self.outlier_handler).fit(out)
+            self.lower_bounds, self.upper_bounds = outlier_handler.lower_bounds_, outlier_handler.upper_bounds_
+            np.clip(out, self.lower_bounds, self.upper_bounds, out=out)
+
+        if self.scaler is not None:
+            scaler = clone(self.scaler).fit(out)
+            self.mean = scaler.mean_ if self.scaler.with_mean else None
+            self.scale = scaler.scale_ if self.scaler.with_std else None
+            self._scale(out)
+
+    def transform(self, X: pd.DataFrame, out: np.ndarray):
+        self._load(X, out)
+
+        if self.fill_values is not None:
+            self._impute(out)
+        if self.lower_bounds is not None:
+            np.clip(out, self.lower_bounds, self.upper_bounds, out=out)
+        self._scale(out)
+
+    def feature_names(self) -> List[str]:
+        return list(self.columns)
+
+    def _load(self, X: pd.DataFrame, out: np.ndarray):
+        for j, column in enumerate(self.columns):
+            out[:, j] = X[column].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def _impute(self, out: np.ndarray):
+        for j in range(self.n_outputs):
+            column = out[:, j]
+            np.copyto(column, self.fill_values[j], where=np.isnan(column))
+
+    def _scale(self, out: np.ndarray):
+        if self.mean is not None:
+            out -= self.mean
+        if self.scale is not None:
+            out /= self.scale
+
+
+class _CategoricalBlock:
+    def __init__(self, name: str, columns: List[str], imputer: Optional[FillMissingValuesStrategy],
+                 encoder: Union[OneHotEncoder, OrdinalEncoder]):
+        """
+        A categorical branch of the column transformer: optional imputation followed by one-hot or ordinal encoding
+        of `columns`. Category codes are looked up with a hash index and written straight into the output; missing
+        values are mapped to the imputed category's code rather than filled row by row.
+        """
+        self.name = name
+        self.columns = columns
+        self.imputer = imputer
+        self.handle_unknown = encoder.handle_unknown
+        self.encoding = 'ordinal' if isinstance(encoder, OrdinalEncoder) else 'onehot'
+        self.unknown_value = getattr(encoder, 'unknown_value', None)
+        self.encoded_missing_value = getattr(encoder, 'encoded_missing_value', np.nan)
+
+        # Fitted state
+        self.fill_values = None
+        self.categories = None
+        self.n_outputs = None
+        self._indexes = None
+        self._missing_codes = None
+        self._nan_codes = None
+        self._offsets = None
+
+    def fit(self, X: pd.DataFrame) -> List[np.ndarray]:
+        """
+        Learns the fill values and sorted vocabularies, and returns the output codes of X so that the fitting pass
+        does not have to factorize every column a second time.
+        """
+        if self.imputer is not None:
+            self.fill_values = self.imputer.fit(X[self.columns]).fill_values
+
+        factorized = [pd.factorize(X[column]) for column in self.columns]
+
+        self.categories = []
+        for column, (codes, uniques) in zip(self.columns, factorized):
+            categories = set(uniques.tolist())
+            if (codes < 0).any():
+                if self.fill_values is not None:
+                    categories.add(self.fill_values[column])
+                else:
+                    categories.add(np.nan)
+
+            missing = [category for category in categories if pd.isna(category)]
+            categories = sorted(category for category in categories if not pd.isna(category)) + missing[:1]
+            self.categories.append(np.array(categories, dtype=object))
+
+        self._compile()
+        return [self._output_codes(j, codes, uniques) for j, (codes, uniques) in enumerate(factorized)]
+
+    def output_codes(self, X: pd.DataFrame) -> List[np.ndarray]:
+        """Returns the code of every row within the categories of each column, or -1 for no category."""
+        return [self._output_codes(j, *pd.factorize(X[column])) for j, column in enumerate(self.columns)]
+
+    def transform(self, X: pd.DataFrame, out: np.ndarray, output_codes: Optional[List[np.ndarray]] = None):
+        if output_codes is None:
+            output_codes = self.output_codes(X)
+
+        if self.encoding == 'ordinal':
+            for j, codes in enumerate(output_codes):
+                values = codes.astype(np.float64)
+                values[codes < 0] = self.unknown_value if self.unknown_value is not None else np.nan
+                if self._nan_codes[j] >= 0:
+                    values[codes == self._nan_codes[j]] = self.encoded_missing_value
+                out[:, j] = values
+            return
+
+        # The block is a column-major slice of the output, so (row, column) cells can be addressed in a flat view
+        n_rows = len(X)
+        flat_out = out.reshape(-1, order='F')
+        rows = np.arange(n_rows)
+        for j, codes in enumerate(output_codes):
+            known = codes >= 0
+            if known.all():
+                flat_out[(codes + self._offsets[j]) * n_rows + rows] = 1.0
+            else:
+                flat_out[(codes[known] + self._offsets[j]) * n_rows + rows[known]] = 1.0
+
+    def to_csr(self, n_rows: int, output_codes: List[np.ndarray]) -> sparse.csr_matrix:
+        """Builds the one-hot block as a CSR matrix straight from the codes, without a dense intermediate."""
+        rows, columns = [], []
+        for j, codes in enumerate(output_codes):
+            known = np.flatnonzero(codes >= 0)
+            rows.append(known)
+            columns.append(codes[known] + self._offsets[j])
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(n_rows, self.n_outputs))
+
+    def _output_codes(self, j: int, codes: np.ndarray, uniques) -> np.ndarray:
+        """
+        Maps the factorized codes of column j to output column offsets within the column's categories, or -1.
+        Factorizing keeps the per-row work vectorized; only the few distinct values are looked up in the index.
+        """
+        lookup = np.append(self._indexes[j].get_indexer(uniques), self._missing_codes[j])
+        output_codes = lookup[codes]
+
+        if self.handle_unknown == 'error' and (lookup[:-1] < 0).any():
+            unknown = np.unique(np.asarray(uniques[np.flatnonzero(lookup[:-1] < 0)], dtype=str)).tolist()
+            raise ValueError(f"Found unknown categories {unknown} in column {self.columns[j]} during transform")
+
+        return output_codes
+
+    def feature_names(self) -> List[str]:
+        if self.encoding == 'ordinal':
+            return list(self.columns)
+        return [f"{column}_{category}" for column, categories in zip(self.columns, self.categories)
+                for category in categories]
+
+    def _compile(self):
+        self._indexes = [pd.Index([category for category in categories if not pd.isna(category)], dtype=object)
+                         for categories in self.categories]
+        # Missing values map to the imputed category, to the NaN category, or to no category at all
+        self._missing_codes = []
+        for column, categories, index in zip(self.columns, self.categories, self._indexes):
+            if self.fill_values is not None:
+                self._missing_codes.append(int(index.get_indexer([self.fill_values[column]])[0]))
+            elif len(categories) and pd.isna(categories[-1]):
+                self._missing_codes.append(len(categories) - 1)
+            else:
+                self._missing_codes.append(-1)
+        self._nan_codes = [len(categories) - 1 if len(categories) and pd.isna(categories[-1]) else -1
+                           for categories in self.categories]
+        sizes = [len(categories) for categories in self.categories]
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        self.n_outputs = len(self.columns) if self.encoding == 'ordinal' else int(sum(sizes))
+
+
+class FusedPreprocessor(BaseEstimator, TransformerMixin):
+    def __init__(self, column_transformer: ColumnTransformer, sparse_output: Optional[bool] = None):
+        """
+        Compiles a ColumnTransformer built from MissingValuesHandler, OutlierHandlerCap, StandardScaler,
+        OneHotEncoder and OrdinalEncoder branches into a single columnar kernel. Every branch reads its columns
+        straight from the input dataframe and writes into one preallocated, column-major output matrix, so no branch
+        slices or copies its own dataframe. The output is numerically equivalent to
+        `column_transformer.fit_transform(X)`.
+
+        :param:
+            column_transformer (ColumnTransformer): The unfitted column transformer to compile.
+            sparse_output (Optional[bool]): Whether to return a CSR matrix, with the one-hot blocks built straight
+                from the category codes. None follows the column transformer: CSR when it has one-hot branches and a
+                `sparse_threshold` of 1.0, dense otherwise.
+        """
+        self.column_transformer = column_transformer
+        self.sparse_output = sparse_output
+
+    @classmethod
+    def from_fitted(cls, column_transformer: ColumnTransformer,
+                    sparse_output: Optional[bool] = None) -> "FusedPreprocessor":
+        """
+        Compiles an already fitted ColumnTransformer, e.g. the preprocessing step of a saved pipeline, taking the
+        fill values, capping bounds, scaler moments and category vocabularies from its fitted branches instead of
+        refitting them. The result transforms like `column_transformer.transform`.
+
+        :param:
+            column_transformer (ColumnTransformer): The fitted column transformer.
+            sparse_output (Optional[bool]): As in `FusedPreprocessor`.
+        :return:
+            FusedPreprocessor: The fitted FusedPreprocessor.
+        """
+        if not hasattr(column_transformer, 'transformers_'):
+            raise ValueError("The column transformer is not fitted yet.")
+
+        fused = cls(column_transformer, sparse_output=sparse_output)
+        fused._blocks = cls._compile(column_transformer, fitted=True)
+        fused.feature_names_in_ = np.asarray(column_transformer.feature_names_in_, dtype=object)
+        fused.n_features_in_ = len(fused.feature_names_in_)
+        return fused
+
+    def fit(self, X: pd.DataFrame, y=None):
+        self.fit_transform(X, y)
+        return self
+
+    def fit_transform(self, X: pd.DataFrame, y=None) -> Union[np.ndarray, sparse.csr_matrix]:
+        self._check_input(X)
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self._blocks = self._compile(self.column_transformer)
+
+        return self._run(X, fit=True)
+
+    def transform(self, X: pd.DataFrame) -> Union[np.ndarray, sparse.csr_matrix]:
+        if not hasattr(self, '_blocks'):
+            raise ValueError("FusedPreprocessor is not fitted yet. Call 'fit' before 'transform'.")
+        self._check_input(X)
+        return self._run(X, fit=False)
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.asarray([f"{block.name}__{feature}" for block in self._blocks for feature in block.feature_names()],
+                          dtype=object)
+
+    def _run(self, X: pd.DataFrame, fit: bool) -> Union[np.ndarray, sparse.csr_matrix]:
+        # Categorical blocks learn their vocabularies first, since they determine the output width
+        fitted_codes = {}
+        if fit:
+            for i, block in enumerate(self._blocks):
+                if isinstance(block, _CategoricalBlock):
+                    fitted_codes[i] = block.fit(X)
+
+        if self._sparse_output():
+            return self._run_sparse(X, fit, fitted_codes)
+
+        n_outputs = sum(block.n_outputs for block in self._blocks)
+        output = np.zeros((len(X), n_outputs), dtype=np.float64, order='F')
+
+        offset = 0
+        for i, block in enumerate(self._blocks):
+            block_out = output[:, offset:offset + block.n_outputs]
+            if isinstance(block, _CategoricalBlock):
+                block.transform(X, block_out, fitted_codes.get(i))
+            elif fit:
+                block.fit_transform(X, block_out)
+            else:
+                block.transform(X, block_out)
+            offset += block.n_outputs
+
+        return output
+
+    def _run_sparse(self, X: pd.DataFrame, fit: bool, fitted_codes: Dict[int, List[np.ndarray]]) -> sparse.csr_matrix:
+        """Builds every block as its own CSR matrix; only the narrow numeric and ordinal blocks pass through dense."""
+        parts = []
+        for i, block in enumerate(self._blocks):
+            if isinstance(block, _CategoricalBlock) and block.encoding == 'onehot':
+                codes = fitted_codes[i] if i in fitted_codes else block.output_codes(X)
+                parts.append(block.to_csr(len(X), codes))
+                continue
+
+            block_out = np.zeros((len(X), block.n_outputs), dtype=np.float64, order='F')
+            if isinstance(block, _CategoricalBlock):
+                block.transform(X, block_out, fitted_codes.get(i))
+            elif fit:
+                block.fit_transform(X, block_out)
+            else:
+                block.transform(X, block_out)
+            parts.append(sparse.csr_matrix(block_out))
+
+        return sparse.hstack(parts, format='csr')
+
+    def _sparse_output(self) -> bool:
+        if self.sparse_output is not None:
+            return self.sparse_output
+        has_onehot = any(isinstance(block, _CategoricalBlock) and block.encoding == 'onehot' for block in self._blocks)
+        return has_onehot and self.column_transformer.sparse_threshold >= 1.0
+
+    @staticmethod
+    def _check_input(X):
+        if not isinstance(X, pd.DataFrame):
+            raise ValueError("FusedPreprocessor expects a pandas DataFrame with named columns.")
+
+    @staticmethod
+    def _compile(column_transformer: ColumnTransformer, fitted: bool = False) -> List[Any]:
+        """
+        Translates every branch of the column transformer into a numeric or categorical block. With `fitted`, the
+        blocks are built from the fitted branches and take over their fitted state.
+        """
+        if column_transformer.remainder != 'drop':
+            raise ValueError("FusedPreprocessor only supports remainder='drop'.")
+
+        blocks = []
+        for name, transformer, columns in (column_transformer.transformers_ if fitted
+                                           else column_transformer.transformers):
+            if isinstance(transformer, str) and transformer == 'drop':
+                continue
+            steps = [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+
+            imputer = None
+            if steps and isinstance(steps[0], MissingValuesHandler):
+                strategy = steps.pop(0).get_params()['strategy']
+                if not isinstance(strategy, FillMissingValuesStrategy):
+                    raise ValueError(f"Unsupported missing values strategy in branch '{name}': {strategy}")
+                imputer = copy.deepcopy(strategy)
+
+            if len(steps) == 1 and isinstance(steps[0], (OneHotEncoder, OrdinalEncoder)):
+                encoder = steps[0]
+                if (encoder.categories != 'auto' or getattr(encoder, 'drop', None) is not None
+                        or encoder.min_frequency is not None or encoder.max_categories is not None):
+                    raise ValueError(f"Unsupported {type(encoder).__name__} configuration in branch '{name}'.")
+                block = _CategoricalBlock(name, list(columns), imputer, encoder)
+                if fitted:
+                    block.fill_values = imputer.fill_values if imputer is not None else None
+                    block.categories = [np.asarray(categories, dtype=object) for categories in encoder.categories_]
+                    block._compile()
+                blocks.append(block)
+                continue
+
+            outlier_handler = None
+            if steps and isinstance(steps[0], OutlierHandlerCap):
+                outlier_handler = steps.pop(0)
+                if outlier_handler.per_batch:
+                    raise ValueError(f"Per-batch outlier capping in branch '{name}' cannot be compiled.")
+            scaler = steps.pop(0) if steps and isinstance(steps[0], StandardScaler) else None
+            if steps:
+                raise ValueError(f"Unsupported steps in branch '{name}': {steps}")
+
+            block = _NumericBlock(name, list(columns), imputer, outlier_handler, scaler)
+            if fitted:
+                if imputer is not None:
+                    block.fill_values = np.array([imputer.fill_values[column] for column in block.columns],
+                                                 dtype=np.float64)
+                if outlier_handler is not None:
+                    block.lower_bounds = outlier_handler.lower_bounds_
+                    block.upper_bounds = outlier_handler.upper_bounds_
+                if scaler is not None:
+                    block.mean = scaler.mean_ if scaler.with_mean else None
+                    block.scale = scaler.scale_ if scaler.with_std else None
+            blocks.append(block)
+
+        return blocks
@@ -1,29 +1,153 @@
 from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
 
 import pandas as pd
 
+from src.data_schema import HOUSE_PRICES_SCHEMA, project_schema
+from src.instrumentation import timed_method
+
 
 class DataIngestor(ABC):
+    def __init__(self, schema: Optional[Dict[str, str]] = None):
+        """
+        Initializes the data ingestor.
+
+        :param:
+            schema (Optional[Dict[str, str]]): The dtype of each column. Columns missing from the schema keep their
+                inferred or stored type. Defaults to the house prices schema.
+        """
+        self._schema = HOUSE_PRICES_SCHEMA if schema is None else schema
+
+    @abstractmethod
+    def ingest(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Abstract method to ingest data into a pandas dataframe
+
+        :param:
+            file_path (str): The path of the file to ingest.
+            columns (Optional[List[str]]): The columns to load; columns absent from the file are skipped. All columns
+                are loaded if None.
+        :return:
+            pd.DataFrame: The typed dataframe.
+        """
+        pass
+
     @abstractmethod
-    def ingest(self, file_path: str) -> pd.DataFrame:
-        """Abstract method to ingest data into a pandas dataframe"""
+    def ingest_chunks(self, file_path: str, chunksize: int,
+                      columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Abstract method to ingest data as an iterator of dataframes of at most `chunksize` rows, for files that do not
+        fit in memory.
+
+        :param:
+            file_path (str): The path of the file to ingest.
+            chunksize (int): The maximum number of rows per chunk.
+            columns (Optional[List[str]]): The columns to load, as in `ingest`.
+        :return:
+            Iterator[pd.DataFrame]: The typed chunks.
+        """
         pass
 
+    def _apply_schema(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Casts the columns whose type differs from the schema."""
+        dtypes = {column: dtype for column, dtype in project_schema(self._schema, list(df.columns)).items()
+                  if str(df[column].dtype) != dtype}
+        return df.astype(dtypes) if dtypes else df
+
 
 class CSVDataIngestor(DataIngestor):
-    def ingest(self, file_path: str) -> pd.DataFrame:
+    @timed_method("ingestion")
+    def ingest(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """Ingest data from .csv file into a pandas dataframe"""
-        df = pd.read_csv(file_path)
+        columns = self._available_columns(file_path, columns)
+        df = pd.read_csv(file_path, usecols=columns, dtype=project_schema(self._schema, columns))
         return df
 
+    def ingest_chunks(self, file_path: str, chunksize: int,
+                      columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Ingest data from .csv file as an iterator of pandas dataframes"""
+        columns = self._available_columns(file_path, columns)
+        with pd.read_csv(file_path, usecols=columns, dtype=project_schema(self._schema, columns),
+                         chunksize=chunksize) as reader:
+            yield from reader
+
+    @staticmethod
+    def _available_columns(file_path: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+        if columns is None:
+            return None
+        header = pd.read_csv(file_path, nrows=0).columns
+        return [column for column in columns if column in header]
+
+
+class ParquetDataIngestor(DataIngestor):
+    @timed_method("ingestion")
+    def ingest(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Ingest data from .parquet file into a pandas dataframe, reading only the requested columns"""
+        columns = self._available_columns(file_path, columns)
+        return self._apply_schema(pd.read_parquet(file_path, columns=columns))
+
+    def ingest_chunks(self, file_path: str, chunksize: int,
+                      columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Ingest data from .parquet file as an iterator of pandas dataframes, one record batch at a time"""
+        import pyarrow.parquet as pq
+
+        columns = self._available_columns(file_path, columns)
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield self._apply_schema(batch.to_pandas())
+
+    @staticmethod
+    def _available_columns(file_path: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+        if columns is None:
+            return None
+        import pyarrow.parquet as pq
+
+        schema_names = set(pq.read_schema(file_path).names)
+        return [column for column in columns if column in schema_names]
+
+
+class FeatherDataIngestor(DataIngestor):
+    @timed_method("ingestion")
+    def ingest(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Ingest data from .feather file into a pandas dataframe, reading only the requested columns"""
+        columns = self._available_columns(file_path, columns)
+        return self._apply_schema(pd.read_feather(file_path, columns=columns))
+
+    def ingest_chunks(self, file_path: str, chunksize: int,
+                      columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Ingest data from .feather file as an iterator of pandas dataframes sliced from memory-mapped batches"""
+        import pyarrow as pa
+
+        columns = self._available_columns(file_path, columns)
+        with pa.memory_map(file_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, chunksize):
+                    yield self._apply_schema(batch.slice(offset, chunksize).to_pandas())
+
+    @staticmethod
+    def _available_columns(file_path: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+        if columns is None:
+            return None
+        import pyarrow as pa
+
+        with pa.memory_map(file_path, 'r') as source:
+            schema_names = set(pa.ipc.open_file(source).schema.names)
+        return [column for column in columns if column in schema_names]
+
 
 class DataIngestorFactory:
     @staticmethod
-    def get_data_ingestor(file_extension: str) -> DataIngestor:
+    def get_data_ingestor(file_extension: str, schema: Optional[Dict[str, str]] = None) -> DataIngestor:
         """Get data ingestor based on file extension"""
         if file_extension == '.csv':
-            return CSVDataIngestor()
+            return CSVDataIngestor(schema)
+        elif file_extension == '.parquet':
+            return ParquetDataIngestor(schema)
+        elif file_extension in ('.feather', '.arrow'):
+            return FeatherDataIngestor(schema)
         else:
             raise ValueError(f'No data ingestor available for file extension {file_extension}')
-
-
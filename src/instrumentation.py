@@ -0,0 +1,247 @@
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.compose import ColumnTransformer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REPORTS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/instrumentation')
+
+
+class _Frame:
+    def __init__(self, path: str, trace_memory: bool):
+        self.path = path
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.child_peak = 0
+        self.memory_start = 0
+        self.outer_peak = 0
+        if trace_memory:
+            self.memory_start, self.outer_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+
+class Instrumentation:
+    def __init__(self):
+        """
+        Records the wall time, CPU time and, optionally, the peak traced memory of named pipeline stages. Stages
+        nest: a stage opened inside another is recorded under the path 'outer/inner'. Recording is off until
+        `enable` is called, and a disabled `timed` block costs a single attribute check.
+
+        Only stages run in the current process are recorded, so searches should use n_jobs=1 when the per-branch
+        preprocessing timings of every fold are wanted.
+        """
+        self._enabled = False
+        self._trace_memory = False
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self, trace_memory: bool = False):
+        """
+        Starts recording stages.
+
+        :param:
+            trace_memory (bool): Whether to record the peak memory of each stage with tracemalloc, which slows
+                allocation-heavy code down noticeably.
+        """
+        self._enabled = True
+        self._trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self._enabled = False
+        if self._trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._trace_memory = False
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    @contextmanager
+    def timed(self, stage: str):
+        """
+        Records one call of a stage.
+
+        :param:
+            stage (str): The stage name, e.g. 'ingestion' or 'OutlierHandlerCap.transform'.
+        """
+        if not self._enabled:
+            yield
+            return
+
+        stack = self._stack()
+        path = f"{stack[-1].path}/{stage}" if stack else stage
+        frame = _Frame(path, self._trace_memory)
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            self._record(frame, stack[-1] if stack else None)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return:
+            Dict[str, Dict[str, float]]: The calls, total wall seconds, total CPU seconds and largest peak memory in
+                MB of every stage path, in the order the stages first finished.
+        """
+        with self._lock:
+            return {path: {**stats, "peak_memory_mb": round(stats["peak_memory_mb"], 3),
+                           "wall_seconds": round(stats["wall_seconds"], 6),
+                           "cpu_seconds": round(stats["cpu_seconds"], 6)}
+                    for path, stats in self._stages.items()}
+
+    def save_report(self, name: str, reports_dir: str = REPORTS_DIR, **metadata: Any) -> str:
+        """
+        Saves the report as JSON next to the experiment log.
+
+        :param:
+            name (str): The run name, e.g. the versioned model name.
+            reports_dir (str): The directory of the reports.
+            metadata (Any): Any other run details stored with the report.
+        :return:
+            str: The path of the saved report.
+        """
+        os.makedirs(reports_dir, exist_ok=True)
+        path = os.path.join(reports_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump({"name": name, "created_at": time.time(), "metadata": metadata, "stages": self.report()}, f,
+                      indent=4, default=str)
+
+        logger.info(f"Saved instrumentation report to {path}")
+        return path
+
+    def _stack(self) -> List[_Frame]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _record(self, frame: _Frame, parent: Optional[_Frame]):
+        wall = time.perf_counter() - frame.wall_start
+        cpu = time.process_time() - frame.cpu_start
+
+        peak_mb = 0.0
+        if self._trace_memory and tracemalloc.is_tracing():
+            # reset_peak() on entry cleared the enclosing stage's peak, so it is handed back through the parent frame
+            peak = max(tracemalloc.get_traced_memory()[1], frame.child_peak)
+            peak_mb = max(peak - frame.memory_start, 0) / 2 ** 20
+            if parent is not None:
+                parent.child_peak = max(parent.child_peak, peak, frame.outer_peak)
+
+        with self._lock:
+            stats = self._stages.setdefault(frame.path, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                         "peak_memory_mb": 0.0})
+            stats["calls"] += 1
+            stats["wall_seconds"] += wall
+            stats["cpu_seconds"] += cpu
+            stats["peak_memory_mb"] = max(stats["peak_memory_mb"], peak_mb)
+
+
+instrumentation = Instrumentation()
+timed = instrumentation.timed
+
+
+def timed_method(stage: str):
+    """Decorates a method so each call is recorded as `stage` while instrumentation is enabled."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return method(*args, **kwargs)
+            with instrumentation.timed(stage):
+                return method(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_run(output_path: str):
+    """
+    Runs a block under cProfile and dumps the stats to `output_path`. The dump opens in pstats, snakeviz or, as a
+    flamegraph, in flameprof.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+        logger.info(f"Saved cProfile stats to {output_path}")
+
+
+class TimedTransformer(BaseEstimator, TransformerMixin):
+    def __init__(self, name: str, transformer: Any):
+        """
+        Wraps a transformer so its fit, fit_transform and transform calls are recorded as stages named after it.
+
+        :param:
+            name (str): The stage name, e.g. the ColumnTransformer branch name.
+            transformer (Any): The transformer to wrap.
+        """
+        self.name = name
+        self.transformer = transformer
+
+    def fit(self, X, y=None):
+        with timed(f"{self.name}.fit"):
+            self.transformer_ = clone(self.transformer).fit(X, y)
+        return self
+
+    def fit_transform(self, X, y=None):
+        with timed(f"{self.name}.fit_transform"):
+            self.transformer_ = clone(self.transformer)
+            return self.transformer_.fit_transform(X, y)
+
+    def transform(self, X):
+        with timed(f"{self.name}.transform"):
+            return self.transformer_.transform(X)
+
+    def get_feature_names_out(self, input_features=None):
+        return self.transformer_.get_feature_names_out(input_features)
+
+
+def instrument_column_transformer(column_transformer: ColumnTransformer) -> ColumnTransformer:
+    """
+    Returns an unfitted copy of a ColumnTransformer whose branches are wrapped in `TimedTransformer`, so each branch
+    is recorded as '<branch>.fit_transform' and '<branch>.transform'.
+    """
+    instrumented = clone(column_transformer)
+    instrumented.transformers = [
+        (name, transformer if transformer in ('drop', 'passthrough') else TimedTransformer(name, transformer), columns)
+        for name, transformer, columns in instrumented.transformers
+    ]
+    return instrumented
+
+
+def strip_instrumentation(column_transformer: ColumnTransformer) -> ColumnTransformer:
+    """
+    Replaces the `TimedTransformer` branches of a fitted ColumnTransformer with the fitted transformers they wrap, so
+    a saved model carries no instrumentation.
+    """
+    column_transformer.transformers = [
+        (name, transformer.transformer if isinstance(transformer, TimedTransformer) else transformer, columns)
+        for name, transformer, columns in column_transformer.transformers
+    ]
+    column_transformer.transformers_ = [
+        (name, transformer.transformer_ if isinstance(transformer, TimedTransformer) else transformer, columns)
+        for name, transformer, columns in column_transformer.transformers_
+    ]
+    return column_transformer
@@ -1,10 +1,33 @@
 from abc import ABC, abstractmethod
-from typing import List, Any
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
+from src.instrumentation import timed_method
+from src.quantile_sketch import KLLSketch, RunningMoments
+
+
+def _mode(counts: Counter) -> Any:
+    """The most frequent value, the smallest one on ties, as `DataFrame.mode().iloc[0]` picks it."""
+    if not counts:
+        return np.nan
+    top = max(counts.values())
+    return min(value for value, count in counts.items() if count == top)
+
 
 class MissingValuesHandlingStrategy(ABC):
+    def fit(self, df: pd.DataFrame) -> "MissingValuesHandlingStrategy":
+        """
+        Learns any statistics needed to handle missing values. Strategies without statistics need no fitting.
+        :param:
+            df (pd.DataFrame): The dataframe to learn from.
+        :return:
+            MissingValuesHandlingStrategy: The fitted strategy.
+        """
+        return self
+
     @abstractmethod
     def handle_missing_values(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -39,27 +62,180 @@ class DropMissingValuesStrategy(MissingValuesHandlingStrategy):
 
 
 class FillMissingValuesStrategy(MissingValuesHandlingStrategy):
-    def __init__(self, features: List[str], method: str = "median", fill_value: Any = None):
+    def __init__(self, features: List[str], method: str = "median", fill_value: Any = None, inplace: bool = False,
+                 sketch_k: int = 400, random_state: int = 42):
+        """
+        Initializes a new instance of `FillMissingValuesStrategy`.
+
+        Besides the fill values, fitting keeps mergeable statistics of the rows seen: a KLL sketch per feature for
+        'median', running moments for 'mean' and value counts for 'most_frequent'. `partial_fit` adds new rows to them
+        and `merge` adds those of another strategy, so the fill values can be updated without the earlier rows.
+
+        :param:
+            features (List[str]): The features to fill missing values for in the dataframe.
+            method (str): One of 'median', 'mean', 'most_frequent' or 'constant'.
+            fill_value (Any): The value to fill with when method is 'constant'.
+            inplace (bool): If True, write the filled columns into the given dataframe instead of a new one.
+            sketch_k (int): The accuracy parameter of the KLL sketches of method 'median'.
+            random_state (int): The seed of the KLL sketches.
+        """
         self._features = features
         self._method = method
         self._fill_value = fill_value
+        self._inplace = inplace
+        self._sketch_k = sketch_k
+        self._random_state = random_state
+        self._fill_values = None
+        self._statistics = None
 
-    def handle_missing_values(self, df: pd.DataFrame) -> pd.DataFrame:
-        df_clean = df.copy()
+    @property
+    def features(self) -> List[str]:
+        return self._features
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    @property
+    def fill_value(self) -> Any:
+        """The constant fill value of method 'constant'."""
+        return self._fill_value
 
+    @property
+    def fill_values(self) -> Optional[Dict[str, Any]]:
+        """The per-feature fill values learned in `fit`, or None if the strategy has not been fitted."""
+        return self._fill_values
+
+    def fit(self, df: pd.DataFrame) -> "FillMissingValuesStrategy":
+        """
+        Computes the fill value of every feature once, so that transforming new data never rescans it.
+        :param:
+            df (pd.DataFrame): The dataframe to compute the fill statistics from.
+        :return:
+            FillMissingValuesStrategy: The fitted strategy.
+        """
         if self._method == "median":
-            df_clean[self._features] = df_clean[self._features].fillna(df_clean[self._features].median())
+            fill_values = df[self._features].median()
         elif self._method == "mean":
-            df_clean[self._features] = df_clean[self._features].fillna(df_clean[self._features].mean())
+            fill_values = df[self._features].mean()
         elif self._method == "most_frequent":
-            df_clean[self._features] = df_clean[self._features].fillna(df_clean[self._features].mode().iloc[0])
+            fill_values = df[self._features].mode().iloc[0]
         elif self._method == "constant":
             if self._fill_value is None:
                 raise ValueError("The fill_value must be provided when method 'constant' is used.")
-            df_clean[self._features] = df_clean[self._features].fillna(self._fill_value)
+            fill_values = pd.Series(self._fill_value, index=self._features, dtype=object)
         else:
             raise ValueError(f"Unsupported method: {self._method}.")
 
+        self._statistics = self._new_statistics()
+        self._update_statistics(df)
+        # The exact statistics of the full data; partial_fit switches to those of the running statistics
+        self._fill_values = fill_values.to_dict()
+        return self
+
+    def partial_fit(self, df: pd.DataFrame) -> "FillMissingValuesStrategy":
+        """
+        Adds the rows of `df` to the running statistics and recomputes the fill values, as if the strategy had been
+        fitted on all the rows seen so far. Medians come from the sketches and are approximate once a feature has more
+        values than the sketch retains.
+        :param:
+            df (pd.DataFrame): The new rows.
+        :return:
+            FillMissingValuesStrategy: The updated strategy.
+        """
+        if getattr(self, '_statistics', None) is None:
+            if self._fill_values is not None:
+                raise ValueError("The strategy was fitted without running statistics; fit it again to update it.")
+            self._statistics = self._new_statistics()
+        self._update_statistics(df)
+        self._fill_values = self._fill_values_from_statistics()
+        return self
+
+    def merge(self, other: "FillMissingValuesStrategy") -> "FillMissingValuesStrategy":
+        """
+        Merges the running statistics of a strategy fitted on other rows, e.g. by another worker, and recomputes the
+        fill values as if one strategy had seen all the rows.
+        """
+        if getattr(other, '_statistics', None) is None:
+            return self
+        if getattr(self, '_statistics', None) is None:
+            raise ValueError("Only strategies with running statistics, fitted with fit or partial_fit, can be merged.")
+        if other.method != self._method or list(other.features) != list(self._features):
+            raise ValueError("Cannot merge strategies of different methods or features.")
+
+        if self._method == "median":
+            for feature in self._features:
+                self._statistics[feature].merge(other._statistics[feature])
+        elif self._method == "mean":
+            self._statistics.merge(other._statistics)
+        elif self._method == "most_frequent":
+            for feature in self._features:
+                self._statistics[feature].update(other._statistics[feature])
+
+        self._fill_values = self._fill_values_from_statistics()
+        return self
+
+    def _new_statistics(self):
+        if self._method == "median":
+            return {feature: KLLSketch(k=self._sketch_k, random_state=self._random_state + j)
+                    for j, feature in enumerate(self._features)}
+        if self._method == "mean":
+            return RunningMoments(len(self._features))
+        if self._method == "most_frequent":
+            return {feature: Counter() for feature in self._features}
+        if self._method == "constant":
+            return {}
+        raise ValueError(f"Unsupported method: {self._method}.")
+
+    def _update_statistics(self, df: pd.DataFrame):
+        if self._method == "median":
+            for feature in self._features:
+                self._statistics[feature].update(df[feature].to_numpy(dtype=np.float64, na_value=np.nan))
+        elif self._method == "mean":
+            self._statistics.update(df[self._features].to_numpy(dtype=np.float64, na_value=np.nan))
+        elif self._method == "most_frequent":
+            for feature in self._features:
+                counts = df[feature].value_counts(dropna=True)
+                # Categorical columns also count their unused categories
+                self._statistics[feature].update(counts[counts > 0].to_dict())
+
+    def _fill_values_from_statistics(self) -> Dict[str, Any]:
+        if self._method == "median":
+            return {feature: sketch.quantile(0.5) if sketch.count else np.nan
+                    for feature, sketch in self._statistics.items()}
+        if self._method == "mean":
+            return {feature: mean if count else np.nan for feature, mean, count
+                    in zip(self._features, self._statistics.mean, self._statistics.count)}
+        if self._method == "most_frequent":
+            return {feature: _mode(counts) for feature, counts in self._statistics.items()}
+        if self._fill_value is None:
+            raise ValueError("The fill_value must be provided when method 'constant' is used.")
+        return {feature: self._fill_value for feature in self._features}
+
+    def handle_missing_values(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Fills missing values of the features with the fitted fill values. Only columns that actually contain missing
+        values are rewritten; the others are shared with the input dataframe.
+        :param:
+            df (pd.DataFrame): The dataframe with missing values.
+        :return:
+            pd.DataFrame: The dataframe with missing values handled for the provided features.
+        """
+        if self._fill_values is None:
+            raise ValueError("FillMissingValuesStrategy is not fitted yet. Call 'fit' before 'handle_missing_values'.")
+
+        df_clean = df if self._inplace else df.copy(deep=False)
+
+        for feature in self._features:
+            column = df_clean[feature]
+            if not column.hasnans:
+                continue
+
+            fill_value = self._fill_values[feature]
+            if isinstance(column.dtype, pd.CategoricalDtype) and fill_value not in column.cat.categories:
+                column = column.cat.add_categories([fill_value])
+            df_clean[feature] = column.fillna(fill_value)
+
         return df_clean
 
 
@@ -67,13 +243,36 @@ class MissingValuesHandler:
     def __init__(self, strategy: MissingValuesHandlingStrategy):
         self._strategy = strategy
 
+    @timed_method("MissingValuesHandler.fit")
     def fit(self, X, y=None):
-        return self  # No fitting required for missing value handling
+        self._feature_names = X.columns
+        self._strategy.fit(X)
+        return self
+
+    @timed_method("MissingValuesHandler.partial_fit")
+    def partial_fit(self, X, y=None):
+        """Updates the strategy's statistics with new rows, for strategies with `partial_fit`."""
+        if not hasattr(self._strategy, 'partial_fit'):
+            raise ValueError(f"{type(self._strategy).__name__} cannot be updated incrementally.")
+        if not hasattr(self, '_feature_names'):
+            self._feature_names = X.columns
+        self._strategy.partial_fit(X)
+        return self
 
+    def merge(self, other: "MissingValuesHandler") -> "MissingValuesHandler":
+        """Merges the statistics of a handler fitted on other rows, for strategies with `merge`."""
+        if not hasattr(self._strategy, 'merge'):
+            raise ValueError(f"{type(self._strategy).__name__} cannot be merged.")
+        self._strategy.merge(other._strategy)
+        return self
+
+    @timed_method("MissingValuesHandler.transform")
     def transform(self, X):
-        self._feature_names = X.columns
         return self._strategy.handle_missing_values(X)
 
+    def fit_transform(self, X, y=None):
+        return self.fit(X, y).transform(X)
+
     def set_strategy(self, strategy: MissingValuesHandlingStrategy):
         self._strategy = strategy
 
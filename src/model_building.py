@@ -1,16 +1,121 @@
 import logging
+import time
 from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
-from sklearn.model_selection import GridSearchCV
+from sklearn.compose import ColumnTransformer
+from sklearn.model_selection._search import BaseSearchCV
+
+from src.cv_backend import CVBackend, InMemoryCVBackend
+from src.data_preprocessing import preprocessor as default_preprocessor
+from src.instrumentation import timed_method
+from src.model_search import SearchEngine, GridSearchEngine
+from src.preprocessing_cache import CachedPreprocessor, PreprocessingCache
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
 class ModelBuildingStrategy(ABC):
+    def __init__(self, preprocessing_cache: Optional[PreprocessingCache] = None,
+                 search_engine: Optional[SearchEngine] = None, preprocessed: bool = False,
+                 param_grid: Optional[Dict[str, List[Any]]] = None,
+                 preprocessor: Optional[ColumnTransformer] = None, cv_backend: Optional[CVBackend] = None):
+        """
+        Initializes the strategy.
+
+        :param:
+            preprocessing_cache (PreprocessingCache): Optional cache that lets every parameter combination of the
+                search reuse the preprocessing of each CV fold. Use a `DiskPreprocessingCache` when the search runs
+                in worker processes.
+            search_engine (SearchEngine): The hyperparameter search to run, an exhaustive grid search by default.
+            preprocessed (bool): Whether the training data is already preprocessed, e.g. loaded from the feature
+                store, in which case the pipeline's preprocessing step is a passthrough.
+            param_grid (Optional[Dict[str, List[Any]]]): Replaces the strategy's own parameter grid, e.g. with a
+                fixed small grid for benchmarks.
+            preprocessor (Optional[ColumnTransformer]): The unfitted preprocessor of the pipeline, the one-hot
+                `preprocessor` with its CSR output by default.
+            cv_backend (Optional[CVBackend]): How the training data reaches the workers of the search. Use a
+                `MemmapCVBackend` when the search runs in many worker processes, so they share one memory-mapped
+                copy of it; by default joblib pickles it to them.
+        """
+        self._preprocessing_cache = preprocessing_cache
+        self._search_engine = search_engine if search_engine is not None else GridSearchEngine()
+        self._preprocessed = preprocessed
+        self._param_grid = param_grid
+        self._preprocessor = preprocessor if preprocessor is not None else default_preprocessor
+        self._cv_backend = cv_backend if cv_backend is not None else InMemoryCVBackend()
+
+    @property
+    def preprocessor(self) -> ColumnTransformer:
+        """The unfitted preprocessor, e.g. to build a matching feature set for a `preprocessed` strategy."""
+        return self._preprocessor
+
+    @property
+    def cv_backend(self) -> CVBackend:
+        return self._cv_backend
+
+    @property
+    def preprocessing_cache(self) -> Optional[PreprocessingCache]:
+        return self._preprocessing_cache
+
+    def _preprocessing_step(self):
+        """
+        Returns the preprocessing step of the model pipeline, wrapped in the preprocessing cache if one is set.
+        """
+        if self._preprocessed:
+            return 'passthrough'
+        if self._preprocessing_cache is None:
+            return self._preprocessor
+        return CachedPreprocessor(self._preprocessor, self._preprocessing_cache)
+
+    def _resolve_param_grid(self, default: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        """
+        Returns the parameter grid set on the strategy, or the strategy's default grid if none was set.
+        """
+        return default if self._param_grid is None else self._param_grid
+
+    def set_search_engine(self, search_engine: SearchEngine):
+        """
+        Sets the hyperparameter search used by the strategy.
+
+        :param:
+            search_engine (SearchEngine): The new search engine
+        """
+        self._search_engine = search_engine
+
+    def set_cv_backend(self, cv_backend: CVBackend):
+        """
+        Sets how the training data reaches the workers of the strategy's hyperparameter search.
+
+        :param:
+            cv_backend (CVBackend): The new CV backend
+        """
+        self._cv_backend = cv_backend
+
+    def set_n_jobs(self, n_jobs: int):
+        """
+        Sets the number of parallel jobs of the strategy's hyperparameter search.
+
+        :param:
+            n_jobs (int): The new number of parallel jobs
+        """
+        self._search_engine.set_n_jobs(n_jobs)
+
+    @staticmethod
+    def _unwrap_cached_preprocessor(grid_search: BaseSearchCV) -> BaseSearchCV:
+        """
+        Replaces the cached preprocessing step of the best estimator with the fitted preprocessor it wraps, so the
+        saved model does not hash and cache every batch it predicts on.
+        """
+        name, step = grid_search.best_estimator_.steps[0]
+        if isinstance(step, CachedPreprocessor):
+            grid_search.best_estimator_.steps[0] = (name, step.preprocessor_)
+        return grid_search
+
     @abstractmethod
-    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> GridSearchCV:
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> BaseSearchCV:
         """
         Abstract method for building and training a model.
 
@@ -18,7 +123,7 @@ class ModelBuildingStrategy(ABC):
             X_train (pd.DataFrame): The training data features
             y_train (pd.Series): The training data labels/targets
         :return:
-            RegressorMixin: The trained model instance
+            BaseSearchCV: The fitted hyperparameter search, exposing `best_params_` and `best_estimator_`
         """
         pass
 
@@ -42,7 +147,8 @@ class ModelBuilder:
         """
         self._strategy = strategy
 
-    def build_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> GridSearchCV:
+    @timed_method("model fit")
+    def build_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> BaseSearchCV:
         """
         Executes the model building and training using the current strategy.
 
@@ -53,4 +159,23 @@ class ModelBuilder:
             Pipeline: A pipeline with a trained regression model instance
         """
         logger.info("Building and training model using the set strategy")
-        return self._strategy.build_and_train_model(X_train, y_train)
+
+        cache = self._strategy.preprocessing_cache
+        stats_before = cache.stats() if cache is not None else None
+
+        start = time.perf_counter()
+        with self._strategy.cv_backend.share(X_train, y_train) as (X_shared, y_shared):
+            grid_search = self._strategy.build_and_train_model(X_shared, y_shared)
+        elapsed = time.perf_counter() - start
+
+        if cache is not None:
+            stats_after = cache.stats()
+            hits = stats_after["hits"] - stats_before["hits"]
+            misses = stats_after["misses"] - stats_before["misses"]
+            saved_seconds = stats_after["saved_seconds"] - stats_before["saved_seconds"]
+            logger.info(f"Model built in {elapsed:.2f}s. Preprocessing cache: {hits} hits, {misses} misses, "
+                        f"{saved_seconds:.2f}s of preprocessing saved")
+        else:
+            logger.info(f"Model built in {elapsed:.2f}s")
+
+        return grid_search
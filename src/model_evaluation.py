@@ -1,12 +1,14 @@
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict
+from typing import Any, Dict, Optional, Sequence
 
 import numpy as np
 import pandas as pd
 from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.model_selection import GridSearchCV
 
+from src.instrumentation import timed_method
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,50 @@ def rmse_scorer(y_true, y_pred):
     return np.sqrt(mean_squared_error(y_true, y_pred))
 
 
+METRIC_NAMES = {
+    'mse': "Mean Squared Error",
+    'rmse': "Root Mean Squared Error",
+    'mae': "Mean Absolute Error",
+    'rmsle': "Root Mean Squared Log Error",
+    'mape': "Mean Absolute Percentage Error",
+    'r2': "R-squared",
+}
+
+# The per-row terms whose sums every metric is computed from
+_TERMS = ('squared_error', 'absolute_error', 'y', 'y_squared', 'squared_log_error', 'absolute_percentage_error')
+
+
+def _row_terms(y_true: np.ndarray, y_pred: np.ndarray) -> np.ndarray:
+    """Returns the `_TERMS` of every row, shaped (n_rows, len(_TERMS))."""
+    error = y_pred - y_true
+    # As in sklearn, percentages are relative to |y| floored at machine epsilon; logs need non-negative values
+    log_error = np.log1p(np.maximum(y_pred, 0)) - np.log1p(np.maximum(y_true, 0))
+    return np.column_stack([error ** 2, np.abs(error), y_true, y_true ** 2, log_error ** 2,
+                            np.abs(error) / np.maximum(np.abs(y_true), np.finfo(np.float64).eps)])
+
+
+def _metrics_from_sums(sums: np.ndarray, n: int) -> Dict[str, np.ndarray]:
+    """
+    Computes every metric from the sums of the `_TERMS` over n rows, vectorized over the leading axis of `sums`, e.g.
+    one row per bootstrap sample.
+    """
+    squared_error, absolute_error, y, y_squared, squared_log_error, absolute_percentage_error = np.moveaxis(sums, -1, 0)
+    mse = squared_error / n
+    total_squares = y_squared - y ** 2 / n
+    # A constant target has no variance to explain; within rounding of the sums, R-squared is 1 for a perfect fit and
+    # 0 otherwise, as with sklearn's force_finite
+    constant = total_squares <= n * np.finfo(np.float64).eps * y_squared
+    r2 = 1 - np.divide(squared_error, total_squares, out=np.zeros_like(total_squares), where=~constant)
+    return {
+        'mse': mse,
+        'rmse': np.sqrt(mse),
+        'mae': absolute_error / n,
+        'rmsle': np.sqrt(squared_log_error / n),
+        'mape': absolute_percentage_error / n,
+        'r2': np.where(constant, np.where(squared_error == 0, 1.0, 0.0), r2),
+    }
+
+
 class ModelEvaluationStrategy(ABC):
     @abstractmethod
     def evaluate_pipeline(self, grid_search: GridSearchCV, X_test: pd.DataFrame, y_test: pd.Series) -> Dict[str, float]:
@@ -59,6 +105,112 @@ class RegressionPipelineEvaluationStrategy(ModelEvaluationStrategy):
         return metrics
 
 
+class MultiMetricEvaluationStrategy(ModelEvaluationStrategy):
+    def __init__(self, metrics: Sequence[str] = ('mse', 'rmse', 'mae', 'r2'),
+                 price_metrics: Sequence[str] = ('rmse', 'mae', 'rmsle', 'mape', 'r2'), target_scaler: Any = None,
+                 n_bootstrap: int = 1000, confidence: float = 0.95, random_state: Optional[int] = 42,
+                 max_batch_elements: int = 2 ** 22):
+        """
+        Evaluates a regression pipeline on several metrics with bootstrap confidence intervals.
+
+        The prediction is turned once into a matrix of per-row terms, squared, absolute, log and percentage errors
+        and the target moments, and every metric is computed from the column sums of that matrix. The bootstrap
+        draws matrices of row indices, a batch of samples at a time, and sums the gathered terms of all samples at
+        once as the product of their row counts with the term matrix, so the point estimates and every resample of
+        every metric come from the same vectorized pass.
+
+        With a `target_scaler`, the metrics in `price_metrics` are also computed on prices, the inverse-scaled target
+        and predictions, and reported with a "Price" prefix. RMSLE and MAPE are only meaningful there, since the
+        scaled target is centered on zero.
+
+        :param:
+            metrics (Sequence[str]): The metrics of the model's target, among the keys of `METRIC_NAMES`.
+            price_metrics (Sequence[str]): The metrics of the prices, used when `target_scaler` is set.
+            target_scaler (Any): The scaler fitted on the target, whose `inverse_transform` turns it into prices.
+            n_bootstrap (int): The number of bootstrap samples, or 0 to report point estimates only.
+            confidence (float): The coverage of the percentile confidence intervals.
+            random_state (Optional[int]): The seed of the bootstrap samples.
+            max_batch_elements (int): The number of sampled row indices held at once, which bounds the memory of the
+                bootstrap.
+        """
+        unknown = (set(metrics) | set(price_metrics)) - set(METRIC_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown metrics {sorted(unknown)}; choose among {list(METRIC_NAMES)}.")
+        self._metrics = list(metrics)
+        self._price_metrics = list(price_metrics) if target_scaler is not None else []
+        self._target_scaler = target_scaler
+        self._n_bootstrap = n_bootstrap
+        self._confidence = confidence
+        self._random_state = random_state
+        self._max_batch_elements = max_batch_elements
+
+    def evaluate_pipeline(self, grid_search: GridSearchCV, X_test: pd.DataFrame, y_test: pd.Series) -> Dict[str, Any]:
+        """
+        :param:
+            grid_search (GridSearchCV): The fitted search, or any model with `predict` and `best_params_`.
+            X_test (pd.DataFrame): The testing data features.
+            y_test (pd.Series): The testing data labels/targets.
+        :return:
+            Dict[str, Any]: Every metric under its name in `METRIC_NAMES`, its interval bounds under the same name
+                with " CI Lower" and " CI Upper", the best params and the bootstrap settings.
+        """
+        y_true = np.asarray(y_test, dtype=np.float64).ravel()
+        y_pred = np.asarray(grid_search.predict(X_test), dtype=np.float64).ravel()
+        metrics = self.compute(y_true, y_pred)
+        metrics["Best Params"] = grid_search.best_params_
+        logger.info(f"Model Evaluation Metrics: {metrics}")
+        return metrics
+
+    def compute(self, y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, Any]:
+        """Computes the metrics and their confidence intervals of one prediction."""
+        n = len(y_true)
+        terms = _row_terms(y_true, y_pred)
+        if self._price_metrics:
+            prices_true = self._target_scaler.inverse_transform(y_true.reshape(-1, 1)).ravel()
+            prices_pred = self._target_scaler.inverse_transform(y_pred.reshape(-1, 1)).ravel()
+            terms = np.hstack([terms, _row_terms(prices_true, prices_pred)])
+        spaces = [("", self._metrics)] + ([("Price ", self._price_metrics)] if self._price_metrics else [])
+
+        estimates = self._metrics_per_space(terms.sum(axis=0), n)
+        metrics = {}
+        for space, (prefix, names) in enumerate(spaces):
+            for name in names:
+                metrics[f"{prefix}{METRIC_NAMES[name]}"] = round(float(estimates[space][name]), 4)
+
+        if self._n_bootstrap > 0:
+            samples = self._metrics_per_space(self._bootstrap_sums(terms), n)
+            alpha = (1 - self._confidence) / 2
+            for space, (prefix, names) in enumerate(spaces):
+                for name in names:
+                    lower, upper = np.nanpercentile(samples[space][name], [100 * alpha, 100 * (1 - alpha)])
+                    metrics[f"{prefix}{METRIC_NAMES[name]} CI Lower"] = round(float(lower), 4)
+                    metrics[f"{prefix}{METRIC_NAMES[name]} CI Upper"] = round(float(upper), 4)
+            metrics["Bootstrap"] = {"samples": self._n_bootstrap, "confidence": self._confidence,
+                                    "random_state": self._random_state}
+        return metrics
+
+    @staticmethod
+    def _metrics_per_space(sums: np.ndarray, n: int):
+        """Splits the sums of the concatenated term matrices into the metrics of each space."""
+        return [_metrics_from_sums(sums[..., start:start + len(_TERMS)], n)
+                for start in range(0, sums.shape[-1], len(_TERMS))]
+
+    def _bootstrap_sums(self, terms: np.ndarray) -> np.ndarray:
+        """Returns the column sums of `terms` over each bootstrap sample, shaped (n_bootstrap, n_columns)."""
+        n = len(terms)
+        rng = np.random.default_rng(self._random_state)
+        batch_size = max(1, self._max_batch_elements // n)
+        sums = np.empty((self._n_bootstrap, terms.shape[1]))
+        for start in range(0, self._n_bootstrap, batch_size):
+            stop = min(start + batch_size, self._n_bootstrap)
+            indices = rng.integers(0, n, size=(stop - start, n))
+            # How often each sample drew each row, so the sums of all samples are one matrix product
+            counts = np.bincount((indices + n * np.arange(stop - start)[:, None]).ravel(),
+                                 minlength=(stop - start) * n).reshape(stop - start, n)
+            sums[start:stop] = counts @ terms
+        return sums
+
+
 class ModelEvaluator:
     def __init__(self, strategy: ModelEvaluationStrategy):
         """
@@ -77,6 +229,7 @@ class ModelEvaluator:
         """
         self._strategy = strategy
 
+    @timed_method("evaluation")
     def evaluate(self, grid_search: GridSearchCV, X_test: pd.DataFrame, y_test: pd.Series) -> Dict[str, float]:
         """
         Evaluates the pipeline using the current model evaluation strategy.
@@ -0,0 +1,290 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import sklearn
+
+from src.experiment_logger import model_family
+from src.feature_store import file_digest
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../models/registry')
+
+ARTIFACTS = ('model', 'scaler')
+
+# Directories of entries being written or replaced, which are never registered models
+STAGING_SUFFIXES = ('.tmp', '.old')
+
+
+def model_version(model_name: str) -> Tuple[int, ...]:
+    """
+    Returns the version of a versioned model name as a tuple, e.g. (2, 0) for 'GradientBoosting_v2.0', or () when the
+    name does not end in a version.
+    """
+    match = re.search(r'_v(\d+(?:\.\d+)*)$', model_name)
+    if match is None:
+        return ()
+    return tuple(int(part) for part in match.group(1).split('.'))
+
+
+class RegisteredModel:
+    def __init__(self, model_name: str, model: Any, scaler: Any, manifest: Dict[str, Any]):
+        """A loaded registry entry: the fitted pipeline, its target scaler and the manifest they were saved with."""
+        self.model_name = model_name
+        self.model = model
+        self.scaler = scaler
+        self.manifest = manifest
+
+    @property
+    def artifact_id(self) -> str:
+        return self.manifest["artifact_id"]
+
+    @property
+    def profile(self) -> Optional[Dict[str, Any]]:
+        """The reference profile of the training data saved with the model, if any, see `ReferenceProfile`."""
+        return self.manifest.get("profile")
+
+
+class ModelRegistry:
+    def __init__(self, registry_dir: str = REGISTRY_DIR, cache_size: int = 4, mmap_mode: Optional[str] = 'r'):
+        """
+        Stores every trained model together with its target scaler, keyed by the versioned model name used in
+        `log_experiment`, e.g. 'GradientBoosting_v3.0'. Each entry is a directory holding the uncompressed joblib
+        files and a manifest with their SHA-256 hashes, so entries are immutable and a new training run never
+        overwrites the scaler of an older model.
+
+        Loading maps the numpy arrays of a pickle, such as the node arrays of forests and boosted trees, read-only
+        from the page cache instead of copying them, and the most recently used models stay loaded in an in-process
+        LRU. Serving code can therefore switch between cached versions without unpickling anything.
+
+        A model family, e.g. 'GradientBoosting', can be pinned to one version; otherwise it resolves to its highest
+        version.
+
+        :param:
+            registry_dir (str): The directory holding one subdirectory per model name.
+            cache_size (int): The number of loaded models kept in memory.
+            mmap_mode (Optional[str]): The joblib mmap mode used to load the artifacts, or None to read them fully.
+        """
+        self._registry_dir = registry_dir
+        self._cache_size = cache_size
+        self._mmap_mode = mmap_mode
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, model_name: str, model: Any, scaler: Any, metrics: Optional[Dict[str, Any]] = None,
+                 description: Optional[str] = None, overwrite: bool = False,
+                 profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Saves a model and its target scaler. The artifacts are written to a temporary directory, which is moved into
+        place before its manifest is written, last and atomically. An entry without a manifest, e.g. left by a
+        crashed run, is incomplete: it is not registered and the next registration of its name replaces it.
+
+        :param:
+            model_name (str): The versioned model name, as logged with `log_experiment`.
+            model (Any): The fitted pipeline.
+            scaler (Any): The scaler fitted on the target, whose `inverse_transform` turns predictions into prices.
+            metrics (Optional[Dict[str, Any]]): The evaluation metrics stored in the manifest.
+            description (Optional[str]): The description stored in the manifest.
+            overwrite (bool): Whether to replace an existing entry of the same name.
+            profile (Optional[Dict[str, Any]]): The reference profile of the training data, from
+                `ReferenceProfile.to_dict`, stored in the manifest for drift monitoring.
+        :return:
+            Dict[str, Any]: The manifest of the entry.
+        """
+        path = self._path(model_name)
+        if os.path.exists(self._manifest_path(model_name)) and not overwrite:
+            raise FileExistsError(f"Model {model_name} is already registered; pass overwrite=True to replace it.")
+
+        os.makedirs(self._registry_dir, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_path)
+        try:
+            files = {}
+            for artifact, value in zip(ARTIFACTS, (model, scaler)):
+                # Uncompressed, so that the arrays can be memory-mapped when loading
+                file_name = f"{artifact}.joblib"
+                joblib.dump(value, os.path.join(tmp_path, file_name))
+                files[artifact] = {"file": file_name, "sha256": file_digest(os.path.join(tmp_path, file_name)),
+                                   "bytes": os.path.getsize(os.path.join(tmp_path, file_name))}
+
+            manifest = {
+                "model_name": model_name,
+                "model_family": model_family(model_name),
+                "artifact_id": hashlib.sha256("".join(files[a]["sha256"] for a in ARTIFACTS).encode()).hexdigest(),
+                "registered_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "description": description,
+                "metrics": metrics,
+                "profile": profile,
+                "files": files,
+                "versions": {"scikit-learn": sklearn.__version__, "joblib": joblib.__version__},
+            }
+
+            if os.path.exists(path):
+                old_path = f"{path}.{uuid.uuid4().hex}.old"
+                os.rename(path, old_path)
+                os.rename(tmp_path, path)
+                shutil.rmtree(old_path, ignore_errors=True)
+            else:
+                os.rename(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        self._write_json(self._manifest_path(model_name), manifest, default=str)
+
+        logger.info(f"Registered {model_name} ({manifest['artifact_id'][:12]}) in {path}")
+        return manifest
+
+    def load(self, name: str) -> RegisteredModel:
+        """
+        Loads a model and its scaler, from the in-process cache when the same artifacts were loaded recently.
+
+        :param:
+            name (str): A versioned model name, or a model family resolved with `resolve`.
+        :return:
+            RegisteredModel: The loaded entry.
+        """
+        model_name = self.resolve(name)
+        manifest = self.manifest(model_name)
+        key = (model_name, manifest["artifact_id"])
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        start = time.perf_counter()
+        path = self._path(model_name)
+        model, scaler = (joblib.load(os.path.join(path, manifest["files"][artifact]["file"]), mmap_mode=self._mmap_mode)
+                         for artifact in ARTIFACTS)
+        registered = RegisteredModel(model_name, model, scaler, manifest)
+        logger.info(f"Loaded {model_name} from the registry in {time.perf_counter() - start:.3f}s")
+
+        with self._lock:
+            self._cache[key] = registered
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return registered
+
+    def manifest(self, model_name: str) -> Dict[str, Any]:
+        manifest_path = self._manifest_path(model_name)
+        if not os.path.exists(manifest_path):
+            raise KeyError(f"Model {model_name} is not registered in {self._registry_dir}")
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+
+    def verify(self, model_name: str) -> bool:
+        """Recomputes the hashes of a registered model's files and compares them with its manifest."""
+        manifest = self.manifest(model_name)
+        return all(file_digest(os.path.join(self._path(model_name), entry["file"])) == entry["sha256"]
+                   for entry in manifest["files"].values())
+
+    def model_names(self, family: Optional[str] = None) -> List[str]:
+        """
+        Returns the registered model names, of one family if given, from the lowest to the highest version. Only the
+        versioned names of a family are its versions.
+        """
+        if not os.path.isdir(self._registry_dir):
+            return []
+        names = [name for name in os.listdir(self._registry_dir)
+                 if not name.endswith(STAGING_SUFFIXES)
+                 and os.path.exists(os.path.join(self._registry_dir, name, 'manifest.json'))]
+        if family is not None:
+            names = [name for name in names if model_family(name) == family and model_version(name)]
+        return sorted(names, key=lambda name: (model_family(name), model_version(name)))
+
+    def resolve(self, name: str) -> str:
+        """
+        Returns the model name that `name` refers to: itself when it is registered, otherwise the pinned or the
+        highest version of the model family `name`.
+        """
+        if os.path.exists(self._manifest_path(name)):
+            return name
+        pinned = self.pins().get(name)
+        if pinned is not None:
+            return pinned
+        versions = self.model_names(family=name)
+        if not versions:
+            raise KeyError(f"No model named or of the family {name} is registered in {self._registry_dir}")
+        return versions[-1]
+
+    def pins(self) -> Dict[str, str]:
+        pins_path = os.path.join(self._registry_dir, 'pins.json')
+        if not os.path.exists(pins_path):
+            return {}
+        with open(pins_path, "r") as f:
+            return json.load(f)
+
+    def pin(self, model_name: str):
+        """Pins the family of a registered model to it, so the family resolves to this version."""
+        self.manifest(model_name)
+        self._write_pins({**self.pins(), model_family(model_name): model_name})
+
+    def unpin(self, family: str):
+        pins = self.pins()
+        pins.pop(family, None)
+        self._write_pins(pins)
+
+    def _write_pins(self, pins: Dict[str, str]):
+        os.makedirs(self._registry_dir, exist_ok=True)
+        self._write_json(os.path.join(self._registry_dir, 'pins.json'), pins, sort_keys=True)
+
+    @staticmethod
+    def _write_json(path: str, data: Any, **kwargs):
+        """Writes a JSON file atomically, so readers see either the previous file or the complete new one."""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4, **kwargs)
+        os.replace(tmp_path, path)
+
+    def _path(self, model_name: str) -> str:
+        if (not model_name or os.sep in model_name or model_name.startswith('.')
+                or model_name.endswith(STAGING_SUFFIXES)):
+            raise ValueError(f"Invalid model name: {model_name!r}")
+        return os.path.join(self._registry_dir, model_name)
+
+    def _manifest_path(self, model_name: str) -> str:
+        return os.path.join(self._path(model_name), 'manifest.json')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the model registry.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="List the registered models.")
+    pin_parser = subparsers.add_parser('pin', help="Pin a model family to a registered version.")
+    pin_parser.add_argument('model_name')
+    unpin_parser = subparsers.add_parser('unpin', help="Resolve a model family to its highest version again.")
+    unpin_parser.add_argument('family')
+    import_parser = subparsers.add_parser('import', help="Register a model and scaler saved as joblib files.")
+    import_parser.add_argument('model_name')
+    import_parser.add_argument('model_path')
+    import_parser.add_argument('scaler_path')
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    if args.command == 'list':
+        pins = registry.pins()
+        for name in registry.model_names():
+            manifest = registry.manifest(name)
+            pinned = ' (pinned)' if pins.get(model_family(name)) == name else ''
+            print(f"{name}{pinned}  {manifest['artifact_id'][:12]}  {manifest['registered_at']}")
+    elif args.command == 'pin':
+        registry.pin(args.model_name)
+    elif args.command == 'unpin':
+        registry.unpin(args.family)
+    elif args.command == 'import':
+        registry.register(args.model_name, joblib.load(args.model_path), joblib.load(args.scaler_path),
+                          description=f"Imported from {args.model_path}")
@@ -0,0 +1,282 @@
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import rankdata
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, KFold, ParameterGrid, RandomizedSearchCV
+from sklearn.model_selection._search import BaseSearchCV
+from sklearn.pipeline import Pipeline
+from sklearn.utils import _safe_indexing
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class SearchEngine(ABC):
+    def __init__(self, cv: int = 5, n_jobs: int = -1):
+        """
+        Initializes the search engine.
+
+        :param:
+            cv (int): The number of cross-validation folds.
+            n_jobs (int): The number of parallel jobs used by the search.
+        """
+        self._cv = cv
+        self._n_jobs = n_jobs
+
+    @property
+    def n_jobs(self) -> int:
+        return self._n_jobs
+
+    def set_n_jobs(self, n_jobs: int):
+        """
+        Sets the number of parallel jobs used by the search, e.g. its share of a core budget split between searches.
+
+        :param:
+            n_jobs (int): The new number of parallel jobs
+        """
+        self._n_jobs = n_jobs
+
+    @abstractmethod
+    def search(self, pipeline: Pipeline, param_grid: Dict[str, List[Any]], scoring: Any,
+               X_train: pd.DataFrame, y_train: pd.Series, verbose: int = 0) -> BaseSearchCV:
+        """
+        Searches the hyperparameters of a pipeline and refits the best one on the whole training data.
+
+        :param:
+            pipeline (Pipeline): The pipeline to tune.
+            param_grid (Dict[str, List[Any]]): The candidate values of each pipeline parameter.
+            scoring (Any): The scorer used to rank the candidates.
+            X_train (pd.DataFrame): The training data features
+            y_train (pd.Series): The training data labels/targets
+            verbose (int): The verbosity of the search.
+        :return:
+            BaseSearchCV: The fitted search, exposing `best_params_` and `best_estimator_`.
+        """
+        pass
+
+
+class GridSearchEngine(SearchEngine):
+    def search(self, pipeline: Pipeline, param_grid: Dict[str, List[Any]], scoring: Any,
+               X_train: pd.DataFrame, y_train: pd.Series, verbose: int = 0) -> BaseSearchCV:
+        """Exhaustively evaluates every combination of the parameter grid."""
+        grid_search = GridSearchCV(estimator=pipeline, param_grid=param_grid, scoring=scoring, n_jobs=self._n_jobs,
+                                   cv=self._cv, verbose=verbose)
+        grid_search.fit(X_train, y_train)
+        return grid_search
+
+
+class RandomizedSearchEngine(SearchEngine):
+    def __init__(self, n_iter: int = 20, cv: int = 5, n_jobs: int = -1, random_state: Optional[int] = 42):
+        """
+        Evaluates a random sample of `n_iter` combinations of the parameter grid.
+
+        :param:
+            n_iter (int): The budget of parameter combinations to evaluate.
+            random_state (Optional[int]): The seed used to sample the combinations.
+        """
+        super().__init__(cv, n_jobs)
+        self._n_iter = n_iter
+        self._random_state = random_state
+
+    def search(self, pipeline: Pipeline, param_grid: Dict[str, List[Any]], scoring: Any,
+               X_train: pd.DataFrame, y_train: pd.Series, verbose: int = 0) -> BaseSearchCV:
+        n_combinations = 1
+        for values in param_grid.values():
+            n_combinations *= len(values)
+
+        random_search = RandomizedSearchCV(estimator=pipeline, param_distributions=param_grid,
+                                           n_iter=min(self._n_iter, n_combinations), scoring=scoring,
+                                           n_jobs=self._n_jobs, cv=self._cv, verbose=verbose,
+                                           random_state=self._random_state)
+        random_search.fit(X_train, y_train)
+        return random_search
+
+
+class SuccessiveHalvingSearchEngine(SearchEngine):
+    def __init__(self, resource: str = 'n_samples', factor: int = 3, cv: int = 5, n_jobs: int = -1,
+                 random_state: Optional[int] = 42):
+        """
+        Evaluates every combination on a small budget, then keeps the best 1/`factor` of them for the next round with
+        `factor` times the budget until one candidate remains.
+
+        :param:
+            resource (str): 'n_samples' to grow the number of training rows, or a pipeline parameter such as
+                'model__n_estimators' to grow the ensemble size. A parameter resource is removed from the grid and its
+                smallest and largest grid values become the first and last round budgets.
+            factor (int): The proportion of candidates eliminated, and the budget growth, in every round.
+            random_state (Optional[int]): The seed used to subsample rows when the resource is 'n_samples'.
+        """
+        super().__init__(cv, n_jobs)
+        self._resource = resource
+        self._factor = factor
+        self._random_state = random_state
+
+    def search(self, pipeline: Pipeline, param_grid: Dict[str, List[Any]], scoring: Any,
+               X_train: pd.DataFrame, y_train: pd.Series, verbose: int = 0) -> BaseSearchCV:
+        param_grid = dict(param_grid)
+        min_resources, max_resources = 'exhaust', 'auto'
+        if self._resource != 'n_samples' and self._resource in param_grid:
+            values = param_grid.pop(self._resource)
+            min_resources, max_resources = min(values), max(values)
+
+        logger.info(f"Running successive halving over {self._resource} with factor {self._factor}")
+        halving_search = HalvingGridSearchCV(estimator=pipeline, param_grid=param_grid, resource=self._resource,
+                                             factor=self._factor, min_resources=min_resources,
+                                             max_resources=max_resources, scoring=scoring, n_jobs=self._n_jobs,
+                                             cv=self._cv, verbose=verbose, random_state=self._random_state)
+        halving_search.fit(X_train, y_train)
+        return halving_search
+
+
+class _FixedPredictions(RegressorMixin, BaseEstimator):
+    def __init__(self, y_pred: np.ndarray):
+        """A stand-in estimator that returns precomputed predictions, so prefix predictions can go through a scorer."""
+        self.y_pred = y_pred
+
+    def predict(self, X):
+        return self.y_pred
+
+
+def _staged_predictions(model: BaseEstimator, X, n_estimators: List[int]) -> Dict[int, np.ndarray]:
+    """
+    Returns the predictions of the first n trees of a fitted ensemble for every n in `n_estimators`. Gradient boosting
+    uses its staged predictions; a forest averages the cumulative sums of its per-tree predictions.
+    """
+    wanted = set(n_estimators)
+    predictions = {}
+
+    if hasattr(model, 'staged_predict'):
+        for n, y_pred in enumerate(model.staged_predict(X), start=1):
+            if n in wanted:
+                predictions[n] = y_pred
+    elif hasattr(model, 'estimators_'):
+        tree_predictions = np.stack([tree.predict(X) for tree in model.estimators_])
+        cumulative = np.cumsum(tree_predictions, axis=0)
+        for n in wanted:
+            predictions[n] = cumulative[n - 1] / n
+    else:
+        raise ValueError(f"{type(model).__name__} exposes neither staged predictions nor its trees.")
+
+    return predictions
+
+
+def _fit_and_score_prefixes(preprocessed_fold, model: BaseEstimator, params: Dict[str, Any], n_estimators_name: str,
+                            n_estimators: List[int], scoring: Any, verbose: int) -> Dict[int, float]:
+    """Fits the largest ensemble for one fold and parameter combination, and scores each of its prefixes."""
+    X_train, y_train, X_val, y_val = preprocessed_fold
+
+    start = time.perf_counter()
+    model = clone(model).set_params(**params, **{n_estimators_name: max(n_estimators)})
+    model.fit(X_train, y_train)
+
+    scores = {n: scoring(_FixedPredictions(y_pred), X_val, y_val)
+              for n, y_pred in _staged_predictions(model, X_val, n_estimators).items()}
+
+    if verbose:
+        logger.info(f"Fitted {params} with {max(n_estimators)} trees in {time.perf_counter() - start:.2f}s, "
+                    f"prefix scores: {scores}")
+    return scores
+
+
+class EnsemblePrefixSearch:
+    def __init__(self, best_estimator_: Pipeline, best_params_: Dict[str, Any], best_score_: float,
+                 cv_results_: Dict[str, Any]):
+        """
+        The result of an `EnsemblePrefixSearchEngine` search. It exposes the same surface as a fitted GridSearchCV:
+        `best_estimator_`, `best_params_`, `best_score_`, `cv_results_` and `predict`.
+        """
+        self.best_estimator_ = best_estimator_
+        self.best_params_ = best_params_
+        self.best_score_ = best_score_
+        self.cv_results_ = cv_results_
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+
+class EnsemblePrefixSearchEngine(SearchEngine):
+    def __init__(self, n_estimators_param: str = 'model__n_estimators', cv: int = 5, n_jobs: int = -1):
+        """
+        Grid search for tree ensembles that fits only the largest `n_estimators` once per fold and remaining parameter
+        combination, and scores the smaller sizes on prefixes of it: staged predictions for gradient boosting and
+        averages over the first trees for random forests. Both are identical to fitting the smaller ensemble with the
+        same random_state. Each fold is also preprocessed once for all combinations.
+
+        :param:
+            n_estimators_param (str): The pipeline parameter holding the ensemble size.
+        """
+        super().__init__(cv, n_jobs)
+        self._n_estimators_param = n_estimators_param
+
+    def search(self, pipeline: Pipeline, param_grid: Dict[str, List[Any]], scoring: Any,
+               X_train: pd.DataFrame, y_train: pd.Series, verbose: int = 0) -> EnsemblePrefixSearch:
+        param_grid = dict(param_grid)
+        if self._n_estimators_param not in param_grid:
+            raise ValueError(f"The parameter grid must contain '{self._n_estimators_param}'.")
+        # Only the model is refitted per combination; the preprocessing of each fold is shared by all of them
+        model_prefix = f"{pipeline.steps[-1][0]}__"
+        for name in param_grid:
+            if not name.startswith(model_prefix):
+                raise ValueError(f"Parameter '{name}' does not target the model step '{pipeline.steps[-1][0]}'; "
+                                 f"{type(self).__name__} only searches model parameters.")
+        n_estimators = sorted(param_grid.pop(self._n_estimators_param))
+
+        n_estimators_name = self._n_estimators_param[len(model_prefix):]
+        combinations = list(ParameterGrid(param_grid))
+        splits = list(KFold(n_splits=self._cv).split(X_train))
+
+        logger.info(f"Fitting {len(combinations)} combinations x {len(splits)} folds with {max(n_estimators)} trees "
+                    f"and scoring n_estimators prefixes {n_estimators}")
+
+        folds = [self._preprocess_fold(pipeline, X_train, y_train, train_idx, val_idx) for train_idx, val_idx in splits]
+        fold_scores = Parallel(n_jobs=self._n_jobs)(
+            delayed(_fit_and_score_prefixes)(
+                fold, pipeline.steps[-1][1],
+                {name[len(model_prefix):]: value for name, value in params.items()},
+                n_estimators_name, n_estimators, scoring, verbose)
+            for params in combinations for fold in folds)
+
+        # Candidates in the order GridSearchCV would list them
+        candidates, split_scores = [], []
+        for i, params in enumerate(combinations):
+            scores = fold_scores[i * len(folds):(i + 1) * len(folds)]
+            for n in n_estimators:
+                candidates.append({**params, self._n_estimators_param: n})
+                split_scores.append([fold[n] for fold in scores])
+
+        split_scores = np.asarray(split_scores)
+        mean_scores = split_scores.mean(axis=1)
+        # Tied candidates share the best rank, as in GridSearchCV
+        ranks = rankdata(-mean_scores, method='min').astype(np.int32)
+        best_index = int(np.argmax(mean_scores))
+        best_params = candidates[best_index]
+
+        cv_results = {
+            "params": candidates,
+            "mean_test_score": mean_scores,
+            "std_test_score": split_scores.std(axis=1),
+            "rank_test_score": ranks,
+            **{f"split{k}_test_score": split_scores[:, k] for k in range(len(folds))},
+        }
+
+        logger.info(f"Refitting the best candidate {best_params} on the whole training data")
+        best_estimator = clone(pipeline).set_params(**best_params).fit(X_train, y_train)
+        return EnsemblePrefixSearch(best_estimator, best_params, float(mean_scores[best_index]), cv_results)
+
+    @staticmethod
+    def _preprocess_fold(pipeline: Pipeline, X, y, train_idx: np.ndarray, val_idx: np.ndarray):
+        """Fits the preprocessing steps on the fold's training rows and transforms both sides of the fold."""
+        X_fold_train, y_fold_train = _safe_indexing(X, train_idx), _safe_indexing(y, train_idx)
+        X_fold_val, y_fold_val = _safe_indexing(X, val_idx), _safe_indexing(y, val_idx)
+
+        preprocessing = clone(pipeline[:-1])
+        X_fold_train = preprocessing.fit_transform(X_fold_train, y_fold_train)
+        X_fold_val = preprocessing.transform(X_fold_val)
+        return X_fold_train, y_fold_train, X_fold_val, y_fold_val
@@ -1,63 +1,219 @@
 import numpy as np
-from scipy.stats import zscore
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from src.instrumentation import timed_method
+from src.quantile_sketch import KLLSketch, RunningMoments
+
 
 class OutlierHandlerCap(BaseEstimator, TransformerMixin):
-    def __init__(self, method='zscore', threshold=3.0, lower_cap=None, upper_cap=None):
+    def __init__(self, method='zscore', threshold=3.0, lower_cap=None, upper_cap=None, per_batch=False, copy=True,
+                 quantile_backend='exact', sketch_k=400, random_state=42):
         """
         Outlier handling transformer that caps the outliers to specified ranges.
 
+        The capping bounds are learned once in `fit` and stored per column in `lower_bounds_` and `upper_bounds_`,
+        so `transform` is a single `np.clip` over a contiguous float array and gives the same bounds for a single
+        row as for the full training set.
+
         Parameters:
         - method: 'zscore' or 'iqr', the method for outlier detection
         - threshold: The threshold value for detecting outliers (z-score or IQR).
         - lower_cap: Lower value to cap the outliers. If None, the lower bound from the method will be used.
         - upper_cap: Upper value to cap the outliers. If None, the upper bound from the method will be used.
+        - per_batch: If True, recompute the bounds from every batch passed to `transform` (legacy behaviour).
+        - copy: If False, float64 C-contiguous ndarray inputs are clipped in place.
+        - quantile_backend: 'exact' or 'kll', how the IQR quartiles are computed. 'exact' runs np.nanpercentile on the
+          whole column. 'kll' reads them from one KLL sketch per column, whose memory does not grow with the data and
+          whose rank error is about 1.65 / sketch_k; sketches are updated chunk by chunk with `partial_fit` and
+          combined across workers with `merge`. Z-score moments are exact and incremental with either backend.
+        - sketch_k: The accuracy parameter of the KLL sketches.
+        - random_state: The seed of the KLL sketches.
         """
         self.method = method
         self.threshold = threshold
         self.lower_cap = lower_cap
         self.upper_cap = upper_cap
+        self.per_batch = per_batch
+        self.copy = copy
+        self.quantile_backend = quantile_backend
+        self.sketch_k = sketch_k
+        self.random_state = random_state
 
+    @timed_method("OutlierHandlerCap.fit")
     def fit(self, X, y=None):
         """
-        Fit the transformer. In this case, we do not need to fit any parameters,
-        but it is required by scikit-learn.
+        Fit the transformer by learning the per-column lower and upper capping bounds.
+        """
+        if self.quantile_backend not in ('exact', 'kll'):
+            raise ValueError(f"Unsupported quantile backend: {self.quantile_backend}.")
+        self._reset_statistics()
+        if self.quantile_backend == 'kll':
+            return self.partial_fit(X)
+
+        self._feature_names = getattr(X, 'columns', None)
+        X_arr = self._as_float_array(X, copy=False)
+        self.n_features_in_ = X_arr.shape[1]
+        self.lower_bounds_, self.upper_bounds_ = self._compute_bounds(X_arr)
+        return self
+
+    @timed_method("OutlierHandlerCap.partial_fit")
+    def partial_fit(self, X, y=None, sample_weight=None):
+        """
+        Updates the running statistics with one chunk of rows and recomputes the bounds, so the bounds of data that
+        does not fit in memory can be learned chunk by chunk. IQR capping needs quantile_backend='kll'.
+
+        - sample_weight: Optional integer counts of every row, e.g. to add the fill value of n missing entries once.
+        """
+        if self.method == 'iqr' and self.quantile_backend != 'kll':
+            raise ValueError("Incremental IQR capping needs quantile_backend='kll'.")
+
+        X_arr = self._as_float_array(X, copy=False)
+        if not hasattr(self, 'n_features_in_') or self._statistics() is None:
+            self._feature_names = getattr(X, 'columns', None)
+            self.n_features_in_ = X_arr.shape[1]
+            self._init_statistics()
+        elif X_arr.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X_arr.shape[1]} features, "
+                             f"but OutlierHandlerCap was fitted with {self.n_features_in_} features.")
+
+        if self.method == 'iqr':
+            for j, sketch in enumerate(self.sketches_):
+                sketch.update(X_arr[:, j], sample_weight)
+        else:
+            self.moments_.update(X_arr, sample_weight)
+
+        self.lower_bounds_, self.upper_bounds_ = self._bounds_from_statistics()
+        return self
+
+    def merge(self, other: "OutlierHandlerCap") -> "OutlierHandlerCap":
+        """
+        Merges the running statistics of a handler fitted on other rows, e.g. by another worker, and recomputes the
+        bounds as if one handler had seen all the rows.
         """
-        self._feature_names = X.columns
+        if other._statistics() is None:
+            return self
+        if self._statistics() is None:
+            raise ValueError("Only handlers fitted incrementally, with partial_fit or the 'kll' backend, "
+                             "can be merged.")
+        if other.n_features_in_ != self.n_features_in_:
+            raise ValueError("Cannot merge handlers fitted on a different number of features.")
+
+        if self.method == 'iqr':
+            for sketch, other_sketch in zip(self.sketches_, other.sketches_):
+                sketch.merge(other_sketch)
+        else:
+            self.moments_.merge(other.moments_)
+
+        self.lower_bounds_, self.upper_bounds_ = self._bounds_from_statistics()
         return self
 
+    @property
+    def mergeable(self) -> bool:
+        """
+        Whether the handler keeps running statistics, so `partial_fit` and `merge` extend its bounds to new rows.
+        Handlers fitted with `fit` and the 'exact' backend do not, and `partial_fit` would restart them.
+        """
+        return self._statistics() is not None
+
+    @timed_method("OutlierHandlerCap.transform")
     def transform(self, X):
         """
         Transform the data by capping outliers.
 
-        If using Z-score, it caps values with z-score > threshold to the upper or lower cap.
-        If using IQR, it caps values outside the IQR range to the upper or lower cap.
+        If using Z-score, it caps values further than `threshold` standard deviations from the mean.
+        If using IQR, it caps values outside the [Q1 - threshold * IQR, Q3 + threshold * IQR] range.
         """
-        X_transformed = X.copy()
+        X_transformed = self._as_float_array(X, copy=self.copy)
 
-        if self.method == 'zscore':
-            # Calculate z-scores
-            z_scores = np.abs(zscore(X_transformed, nan_policy='omit'))
-            # Define upper and lower bounds for capping based on z-score threshold
-            lower_bound = -self.threshold
-            upper_bound = self.threshold
-            # Cap values based on z-score threshold
-            X_transformed[z_scores < lower_bound] = lower_bound
-            X_transformed[z_scores > upper_bound] = upper_bound
+        if self.per_batch:
+            lower_bound, upper_bound = self._compute_bounds(X_transformed)
+        else:
+            if not hasattr(self, 'lower_bounds_'):
+                raise ValueError("OutlierHandlerCap is not fitted yet. Call 'fit' before 'transform'.")
+            if X_transformed.shape[1] != self.n_features_in_:
+                raise ValueError(f"X has {X_transformed.shape[1]} features, "
+                                 f"but OutlierHandlerCap was fitted with {self.n_features_in_} features.")
+            lower_bound, upper_bound = self.lower_bounds_, self.upper_bounds_
 
+        np.clip(X_transformed, lower_bound, upper_bound, out=X_transformed)
+        return X_transformed
+
+    def _compute_bounds(self, X_arr):
+        """
+        Computes the per-column (lower, upper) capping bounds of a 2D float array, ignoring NaNs.
+        """
+        if self.method == 'zscore':
+            return self._bounds(np.nanmean(X_arr, axis=0), np.nanstd(X_arr, axis=0))
         elif self.method == 'iqr':
-            # Calculate the IQR
-            Q1 = np.percentile(X_transformed, 25, axis=0)
-            Q3 = np.percentile(X_transformed, 75, axis=0)
+            return self._bounds(*np.nanpercentile(X_arr, [25, 75], axis=0))
+        else:
+            raise ValueError(f"Unsupported method: {self.method}.")
+
+    def _bounds_from_statistics(self):
+        """
+        Computes the bounds from the running statistics of `partial_fit`.
+        """
+        if self.method == 'zscore':
+            return self._bounds(self.moments_.mean, np.sqrt(self.moments_.variance))
+        quartiles = np.array([sketch.quantile([0.25, 0.75]) if sketch.count else [np.nan, np.nan]
+                              for sketch in self.sketches_]).reshape(-1, 2)
+        return self._bounds(quartiles[:, 0], quartiles[:, 1])
+
+    def _bounds(self, first, second):
+        """
+        Turns (mean, std) for 'zscore' or (Q1, Q3) for 'iqr' into (lower, upper) bounds and applies the caps.
+        """
+        if self.method == 'zscore':
+            mean, std = first, second
+            lower_bound = mean - self.threshold * std
+            upper_bound = mean + self.threshold * std
+        else:
+            Q1, Q3 = first, second
             IQR = Q3 - Q1
-            # Define bounds for capping
-            lower_bound = Q1 - 1.5 * IQR if self.lower_cap is None else self.lower_cap
-            upper_bound = Q3 + 1.5 * IQR if self.upper_cap is None else self.upper_cap
-            # Cap outliers
-            X_transformed = np.clip(X_transformed, lower_bound, upper_bound)
+            lower_bound = Q1 - self.threshold * IQR
+            upper_bound = Q3 + self.threshold * IQR
 
-        return X_transformed
+        n_features = len(lower_bound)
+        if self.lower_cap is not None:
+            lower_bound = np.broadcast_to(np.asarray(self.lower_cap, dtype=np.float64), (n_features,)).copy()
+        if self.upper_cap is not None:
+            upper_bound = np.broadcast_to(np.asarray(self.upper_cap, dtype=np.float64), (n_features,)).copy()
+
+        return np.ascontiguousarray(lower_bound), np.ascontiguousarray(upper_bound)
+
+    def _init_statistics(self):
+        if self.method == 'iqr':
+            self.sketches_ = [KLLSketch(k=self.sketch_k, random_state=None if self.random_state is None
+                                        else self.random_state + j) for j in range(self.n_features_in_)]
+        elif self.method == 'zscore':
+            self.moments_ = RunningMoments(self.n_features_in_)
+        else:
+            raise ValueError(f"Unsupported method: {self.method}.")
+
+    def _statistics(self):
+        return getattr(self, 'sketches_' if self.method == 'iqr' else 'moments_', None)
+
+    def _reset_statistics(self):
+        for attribute in ('sketches_', 'moments_'):
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+
+    @staticmethod
+    def _as_float_array(X, copy):
+        """
+        Converts X to a 2D C-contiguous float64 array. With copy=False an input that already has that
+        layout is returned as is, so clipping it writes through to the caller's buffer.
+        """
+        if copy:
+            X_arr = np.array(X, dtype=np.float64, order='C')
+        else:
+            X_arr = np.ascontiguousarray(X, dtype=np.float64)
+            if not X_arr.flags.writeable:
+                X_arr = X_arr.copy()
+
+        if X_arr.ndim == 1:
+            X_arr = X_arr.reshape(-1, 1)
+        return X_arr
 
     def get_feature_names_out(self, input_features=None):
         # If input_features are provided, return them unchanged
@@ -0,0 +1,369 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.data_schema import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS
+from src.drift_monitor import DriftMonitor, ReferenceProfile
+from src.model_registry import ModelRegistry
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../models')
+
+Record = Dict[str, Any]
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 10_000):
+        """
+        Keeps the most recent `window` latencies and reports their percentiles.
+
+        :param:
+            window (int): The number of most recent latencies to keep.
+        """
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        :return:
+            Dict[str, float]: The count and the p50, p99 and max latencies in milliseconds.
+        """
+        with self._lock:
+            latencies = np.asarray(self._latencies)
+        if latencies.size == 0:
+            return {"count": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        return {"count": int(latencies.size), "p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3),
+                "max_ms": round(float(latencies.max() * 1000), 3)}
+
+
+class PredictionService:
+    def __init__(self, model_path: str, scaler_path: str):
+        """
+        Loads a trained pipeline and its target scaler once, and predicts sale prices for raw house records.
+
+        :param:
+            model_path (str): The joblib file of the trained pipeline.
+            scaler_path (str): The joblib file of the StandardScaler fitted on the target.
+        """
+        self.latency = LatencyTracker()
+        self._registry = None
+        self._monitor_drift = False
+        self.model_name = os.path.splitext(os.path.basename(model_path))[0]
+        self._set_model(joblib.load(model_path), joblib.load(scaler_path))
+        logger.info(f"Loaded model from {model_path} expecting {len(self.columns)} columns")
+
+    @classmethod
+    def from_registry(cls, name: str, registry: Optional[ModelRegistry] = None,
+                      monitor_drift: bool = True) -> "PredictionService":
+        """
+        Creates a service for a registered model and its own target scaler.
+
+        :param:
+            name (str): A versioned model name, or a model family, which resolves to its pinned or highest version.
+            registry (Optional[ModelRegistry]): The registry to load from, the default registry if None.
+            monitor_drift (bool): Whether to count every scored batch into a `DriftMonitor`, for models registered
+                with a reference profile.
+        """
+        service = cls.__new__(cls)
+        service.latency = LatencyTracker()
+        service._registry = registry if registry is not None else ModelRegistry()
+        service._monitor_drift = monitor_drift
+        service.switch_model(name)
+        return service
+
+    def switch_model(self, name: str):
+        """
+        Serves another registered version. Recently used versions are kept loaded by the registry, so switching back
+        and forth does not unpickle them again. Requests already running finish on the previous model. Drift is
+        monitored from scratch against the new version's profile.
+        """
+        if self._registry is None:
+            raise ValueError("Only a service created with from_registry can switch models.")
+        registered = self._registry.load(name)
+        self._set_model(registered.model, registered.scaler, registered.profile)
+        self.model_name = registered.model_name
+        logger.info(f"Serving {registered.model_name} ({registered.artifact_id[:12]})")
+
+    @property
+    def columns(self) -> List[str]:
+        return self._artifacts[2]
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        return self._artifacts[3]
+
+    @property
+    def drift_monitor(self) -> Optional[DriftMonitor]:
+        """The drift monitor of the served model, or None if drift is not monitored."""
+        return self._artifacts[4]
+
+    def _set_model(self, model: Any, scaler: Any, profile: Optional[Dict[str, Any]] = None):
+        columns = list(model.feature_names_in_)
+        dtypes = {
+            **{column: 'float64' for column in columns if column in NUMERIC_COLUMNS},
+            **{column: 'object' for column in columns if column in CATEGORICAL_COLUMNS},
+        }
+        monitor = DriftMonitor(ReferenceProfile.from_dict(profile)) \
+            if profile is not None and self._monitor_drift else None
+        # One attribute, so a concurrent request never sees the model of one version with the scaler of another
+        self._artifacts = (model, scaler, columns, dtypes, monitor)
+
+    def to_frame(self, records: List[Record]) -> pd.DataFrame:
+        """
+        Builds the model input from raw records. Missing fields become missing values, which only the columns
+        with an imputer in the pipeline accept; the model rejects the others.
+        """
+        # Building each typed column directly is several times faster than from_records followed by astype
+        _, _, columns, dtypes, _ = self._artifacts
+        data = {column: pd.Series([record.get(column, np.nan) for record in records], dtype=dtype)
+                for column, dtype in dtypes.items()}
+        return pd.DataFrame(data, columns=columns, copy=False)
+
+    def predict_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predicts the sale prices of a dataframe of houses, undoing the target scaling. With a drift monitor, the
+        houses and their prices are counted into it afterwards, which costs a small fraction of the prediction.
+        """
+        start = time.perf_counter()
+        model, scaler, _, _, monitor = self._artifacts
+        y_scaled = model.predict(df)
+        prices = scaler.inverse_transform(np.asarray(y_scaled).reshape(-1, 1)).ravel()
+        self.latency.record(time.perf_counter() - start)
+        if monitor is not None:
+            monitor.update(df, prices)
+        return prices
+
+    def predict(self, records: List[Record]) -> np.ndarray:
+        """
+        Predicts the sale prices of a batch of raw house records.
+        """
+        return self.predict_frame(self.to_frame(records))
+
+
+class MicroBatcher:
+    def __init__(self, service: PredictionService, max_batch_size: int = 256, max_wait_ms: float = 5.0):
+        """
+        Groups concurrent prediction requests into a single vectorized `predict` call. A background thread takes the
+        first waiting request and keeps collecting requests until the batch holds `max_batch_size` records or
+        `max_wait_ms` has passed. When the batched call fails, its requests are predicted one by one, so a malformed
+        request fails alone.
+
+        :param:
+            service (PredictionService): The service that runs the batched predictions.
+            max_batch_size (int): The maximum number of records per batch.
+            max_wait_ms (float): The maximum time the first request of a batch waits for others.
+        """
+        self._service = service
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self.request_latency = LatencyTracker()
+        self.batch_sizes = deque(maxlen=10_000)
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, records: List[Record]) -> Future:
+        """
+        Queues records for prediction.
+
+        :return:
+            Future: Resolves to the predicted prices of the records.
+        """
+        future = Future()
+        self._queue.put((records, future, time.perf_counter()))
+        return future
+
+    def predict(self, records: List[Record], timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(records).result(timeout)
+
+    def close(self):
+        self._stopped.set()
+        self._worker.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            n_records = len(first[0])
+            deadline = time.perf_counter() + self._max_wait
+            while n_records < self._max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                n_records += len(request[0])
+
+            self._predict_batch(batch, n_records)
+
+    def _predict_batch(self, batch, n_records: int):
+        records = [record for request_records, _, _ in batch for record in request_records]
+        try:
+            prices = self._service.predict(records)
+        except Exception:
+            # A malformed request fails the merged call; predicting each request alone fails only that request
+            self._predict_requests(batch)
+            return
+
+        self.batch_sizes.append(n_records)
+        offset = 0
+        finished = time.perf_counter()
+        for request_records, future, submitted in batch:
+            future.set_result(prices[offset:offset + len(request_records)])
+            offset += len(request_records)
+            self.request_latency.record(finished - submitted)
+
+    def _predict_requests(self, batch):
+        for request_records, future, submitted in batch:
+            try:
+                prices = self._service.predict(request_records)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            self.batch_sizes.append(len(request_records))
+            future.set_result(prices)
+            self.request_latency.record(time.perf_counter() - submitted)
+
+
+def _parse_records(payload: Union[Record, List[Record]]) -> List[Record]:
+    """Accepts a single record, a list of records or {"records": [...]}."""
+    if isinstance(payload, dict) and "records" in payload:
+        payload = payload["records"]
+    if isinstance(payload, dict):
+        return [payload]
+    if isinstance(payload, list) and all(isinstance(record, dict) for record in payload):
+        return payload
+    raise ValueError("Expected a JSON object, a list of objects or {\"records\": [...]}.")
+
+
+class PredictionServer(ThreadingHTTPServer):
+    # Accept bursts of concurrent connections instead of resetting them
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def make_handler(batcher: MicroBatcher, service: PredictionService):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path == '/model':
+                self._switch_model()
+                return
+            if self.path != '/predict':
+                self._respond(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                records = _parse_records(json.loads(self.rfile.read(length)))
+                prices = batcher.predict(records, timeout=30)
+            except (ValueError, KeyError) as e:
+                self._respond(400, {"error": str(e)})
+                return
+            except Exception as e:
+                logger.exception("Prediction failed")
+                self._respond(500, {"error": str(e)})
+                return
+            self._respond(200, {"predictions": [round(float(price), 2) for price in prices]})
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._respond(200, {"status": "ok", "model_name": service.model_name})
+            elif self.path == '/metrics':
+                batch_sizes = list(batcher.batch_sizes)
+                self._respond(200, {
+                    "request_latency": batcher.request_latency.summary(),
+                    "predict_latency": service.latency.summary(),
+                    "mean_batch_size": round(float(np.mean(batch_sizes)), 2) if batch_sizes else 0.0,
+                })
+            elif self.path == '/drift':
+                monitor = service.drift_monitor
+                if monitor is None:
+                    self._respond(404, {"error": f"Drift is not monitored for {service.model_name}"})
+                else:
+                    self._respond(200, {"model_name": service.model_name, **monitor.report()})
+            else:
+                self._respond(404, {"error": f"Unknown path {self.path}"})
+
+        def _switch_model(self):
+            """Serves the registered model named by {"model_name": ...}, a version or a family."""
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                service.switch_model(json.loads(self.rfile.read(length))["model_name"])
+            except (ValueError, KeyError) as e:
+                self._respond(400, {"error": str(e)})
+                return
+            self._respond(200, {"model_name": service.model_name})
+
+        def _respond(self, status: int, body: Dict[str, Any]):
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            # Keep per-request access logs out of the hot path
+            pass
+
+    return PredictionHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve house price predictions over HTTP.")
+    parser.add_argument('--model-name', default='GradientBoosting',
+                        help="The registered model name or family to serve.")
+    parser.add_argument('--model', help="Serve a joblib pipeline file instead of a registered model.")
+    parser.add_argument('--scaler', default=os.path.join(MODELS_DIR, 'scaler.pkl'),
+                        help="The target scaler file of --model.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--no-drift-monitor', action='store_true', help="Do not count the scored data for /drift.")
+    args = parser.parse_args()
+
+    service = PredictionService(args.model, args.scaler) if args.model \
+        else PredictionService.from_registry(args.model_name, monitor_drift=not args.no_drift_monitor)
+    batcher = MicroBatcher(service, args.max_batch_size, args.max_wait_ms)
+    server = PredictionServer((args.host, args.port), make_handler(batcher, service))
+
+    logger.info(f"Serving predictions on http://{args.host}:{args.port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'house-prices-preprocessing-cache')
+
+
+def fingerprint_estimator(estimator: BaseEstimator) -> str:
+    """Returns a hash of an (unfitted) estimator's class and parameters."""
+    return joblib.hash(estimator)
+
+
+def fingerprint_data(X) -> str:
+    """
+    Returns a hash identifying the rows and values of X. Within a search it identifies the CV fold the rows belong to.
+    """
+    if isinstance(X, pd.DataFrame):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(X, index=True).to_numpy().tobytes())
+        digest.update(repr(tuple(X.columns)).encode())
+        return digest.hexdigest()
+    return joblib.hash(X)
+
+
+def nbytes_of(value: Any) -> int:
+    """Approximate memory footprint of a cached value, counting its dense and sparse arrays."""
+    if isinstance(value, tuple):
+        return sum(nbytes_of(item) for item in value)
+    if sparse.issparse(value):
+        value = value.tocsr()
+        return value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return 0
+
+
+class PreprocessingCache(ABC):
+    def __init__(self, max_bytes: int):
+        """
+        Initializes a size-bounded cache of fitted preprocessors and their transformed outputs.
+
+        :param:
+            max_bytes (int): The maximum total size of the cached entries; least recently used entries are evicted.
+        """
+        self._max_bytes = max_bytes
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        Looks up an entry and records a hit or a miss.
+
+        :param:
+            key (str): The entry key.
+        :return:
+            Optional[Tuple[Any, float]]: The cached value and the seconds it took to compute, or None on a miss.
+        """
+        pass
+
+    @abstractmethod
+    def put(self, key: str, value: Any, compute_seconds: float):
+        """
+        Stores an entry, evicting least recently used entries while the cache is over its size bound.
+
+        :param:
+            key (str): The entry key.
+            value (Any): The value to cache.
+            compute_seconds (float): The seconds it took to compute the value, credited as saved on every hit.
+        """
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, float]:
+        """
+        :return:
+            Dict[str, float]: The number of hits and misses and the total compute seconds saved by hits.
+        """
+        pass
+
+
+class InMemoryPreprocessingCache(PreprocessingCache):
+    def __init__(self, max_bytes: int = 2 * 1024 ** 3):
+        """
+        An in-process LRU cache. It is shared by every clone of the pipeline within the process, which covers
+        searches run with n_jobs=1 or a threading backend; process-based workers each start with an empty copy.
+        """
+        super().__init__(max_bytes)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        if key not in self._entries:
+            self._stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        value, compute_seconds, _ = self._entries[key]
+        self._stats["hits"] += 1
+        self._stats["saved_seconds"] += compute_seconds
+        return value, compute_seconds
+
+    def put(self, key: str, value: Any, compute_seconds: float):
+        size = nbytes_of(value)
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[2]
+
+        self._entries[key] = (value, compute_seconds, size)
+        self._size += size
+        while self._size > self._max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def stats(self) -> Dict[str, float]:
+        return dict(self._stats)
+
+    def __deepcopy__(self, memo):
+        # sklearn's clone deep-copies non-estimator parameters; every clone must share this cache
+        return self
+
+    def __getstate__(self):
+        # Do not ship the cached matrices to worker processes
+        state = self.__dict__.copy()
+        state["_entries"] = OrderedDict()
+        state["_size"] = 0
+        return state
+
+
+class DiskPreprocessingCache(PreprocessingCache):
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 10 * 1024 ** 3):
+        """
+        A cache of joblib files in `cache_dir` that is shared by all worker processes of a search. Entries are evicted
+        by least recent access, and hits and misses are appended to a statistics file so that the parent process can
+        report the time saved in its workers.
+        """
+        super().__init__(max_bytes)
+        self._cache_dir = cache_dir
+        self._stats_file = os.path.join(cache_dir, 'stats.jsonl')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        path = self._entry_path(key)
+        try:
+            value, compute_seconds = joblib.load(path)
+            os.utime(path)
+        except (FileNotFoundError, EOFError):
+            self._record(hit=False, saved_seconds=0.0)
+            return None
+
+        self._record(hit=True, saved_seconds=compute_seconds)
+        return value, compute_seconds
+
+    def put(self, key: str, value: Any, compute_seconds: float):
+        # Write to a unique temporary file first so that concurrent workers never read a partial entry
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        joblib.dump((value, compute_seconds), tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def stats(self) -> Dict[str, float]:
+        stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+        try:
+            with open(self._stats_file, "r") as f:
+                for line in f:
+                    record = json.loads(line)
+                    stats["hits" if record["hit"] else "misses"] += 1
+                    stats["saved_seconds"] += record["saved_seconds"]
+        except FileNotFoundError:
+            pass
+        return stats
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, f"{key}.joblib")
+
+    def _record(self, hit: bool, saved_seconds: float):
+        with open(self._stats_file, "a") as f:
+            f.write(json.dumps({"hit": hit, "saved_seconds": saved_seconds}) + "\n")
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self._cache_dir):
+            if not name.endswith('.joblib'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self._cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self._max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self._cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+
+class CachedPreprocessor(BaseEstimator, TransformerMixin):
+    def __init__(self, preprocessor: BaseEstimator, cache: PreprocessingCache):
+        """
+        Wraps a preprocessor so that fitting it on the same rows, and transforming the same rows with the same fitted
+        preprocessor, is computed once per CV fold instead of once per parameter combination. Entries are keyed by the
+        preprocessor's fingerprint and a hash of the data.
+
+        :param:
+            preprocessor (BaseEstimator): The unfitted preprocessor to cache.
+            cache (PreprocessingCache): The cache storing the fitted preprocessors and their outputs.
+        """
+        self.preprocessor = preprocessor
+        self.cache = cache
+
+    def fit(self, X, y=None):
+        self.fit_transform(X, y)
+        return self
+
+    def fit_transform(self, X, y=None):
+        self.fit_key_ = f"fit-{fingerprint_estimator(self.preprocessor)}-{fingerprint_data(X)}"
+
+        cached = self.cache.get(self.fit_key_)
+        if cached is not None:
+            (self.preprocessor_, X_transformed), _ = cached
+            return X_transformed
+
+        start = time.perf_counter()
+        self.preprocessor_ = clone(self.preprocessor)
+        X_transformed = self.preprocessor_.fit_transform(X, y)
+        self.cache.put(self.fit_key_, (self.preprocessor_, X_transformed), time.perf_counter() - start)
+        return X_transformed
+
+    def transform(self, X):
+        key = f"transform-{self.fit_key_}-{fingerprint_data(X)}"
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+        start = time.perf_counter()
+        X_transformed = self.preprocessor_.transform(X)
+        self.cache.put(key, X_transformed, time.perf_counter() - start)
+        return X_transformed
+
+    def get_feature_names_out(self, input_features=None):
+        return self.preprocessor_.get_feature_names_out(input_features)
@@ -0,0 +1,213 @@
+import math
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+
+class KLLSketch:
+    UPDATE_BLOCK = 2 ** 16
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, random_state: Optional[int] = 42):
+        """
+        KLL quantile sketch (Karnin, Lang and Liberty, 2016). Values are kept in a stack of compactors: level h holds
+        items that each stand for 2^h original values. When a level outgrows its capacity it is sorted and every other
+        item, from a random offset, is promoted to the next level, so the sketch keeps O(k) items whatever the number
+        of values. The normalized rank error is about 1.65 / k with high probability.
+
+        Sketches with the same `k` and `c` can be merged, so chunks and parallel workers can each build their own
+        sketch and combine them.
+
+        :param:
+            k (int): The capacity of the top level; larger is more accurate and uses more memory.
+            c (float): The capacity ratio between consecutive levels.
+            random_state (Optional[int]): The seed of the compaction offsets.
+        """
+        if k < 8:
+            raise ValueError("k must be at least 8.")
+        self.k = k
+        self.c = c
+        self._rng = np.random.default_rng(random_state)
+        self._levels: List[np.ndarray] = [np.empty(0)]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def n_items(self) -> int:
+        """The number of retained items."""
+        return sum(len(level) for level in self._levels)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self._levels)
+
+    def update(self, values: Union[np.ndarray, Sequence[float]],
+               sample_weight: Optional[Union[np.ndarray, Sequence[int]]] = None) -> "KLLSketch":
+        """
+        Adds a batch of values, each counted `sample_weight` times. NaN values are ignored. Large batches are added
+        in blocks of `UPDATE_BLOCK` values, so the working memory of an update does not grow with the batch.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 1:
+            values = values.ravel()
+        weights = None if sample_weight is None else np.asarray(sample_weight, dtype=np.float64).ravel()
+
+        for start in range(0, len(values), self.UPDATE_BLOCK):
+            stop = start + self.UPDATE_BLOCK
+            self._update_block(values[start:stop], None if weights is None else weights[start:stop])
+        return self
+
+    def update_weighted(self, value: float, weight: int) -> "KLLSketch":
+        """
+        Adds `weight` copies of one value, e.g. the fill value of `weight` missing entries, in O(log weight) items.
+        """
+        if weight <= 0 or np.isnan(value):
+            return self
+
+        self.count += weight
+        self.min = min(self.min, float(value))
+        self.max = max(self.max, float(value))
+        # Each set bit h of the weight becomes one item at level h, which stands for 2^h values
+        for h in range(weight.bit_length()):
+            if weight >> h & 1:
+                self._ensure_level(h)
+                self._levels[h] = np.append(self._levels[h], value)
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """
+        Merges another sketch into this one.
+        """
+        if (other.k, other.c) != (self.k, self.c):
+            raise ValueError("Only sketches with the same k and c can be merged.")
+
+        self._ensure_level(len(other._levels) - 1)
+        for h, level in enumerate(other._levels):
+            self._levels[h] = np.concatenate([self._levels[h], level])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """
+        Returns the approximate q-quantiles, 0 <= q <= 1, interpolated between retained items like np.percentile.
+        """
+        if self.count == 0:
+            raise ValueError("Cannot compute quantiles of an empty sketch.")
+
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self._levels)])
+        order = np.argsort(items, kind='stable')
+        items, weights = items[order], weights[order]
+
+        # Each item covers the ranks (cumulative - weight, cumulative]; the middle of that range is its position
+        positions = np.cumsum(weights) - weights / 2
+        total = weights.sum()
+        result = np.interp(np.asarray(q, dtype=np.float64) * total, positions, items)
+        result = np.clip(result, self.min, self.max)
+        return float(result) if np.ndim(result) == 0 else result
+
+    def _update_block(self, values: np.ndarray, weights: Optional[np.ndarray]):
+        present = ~np.isnan(values)
+        values = values[present]
+        if weights is not None:
+            weights = weights[present]
+            if (weights < 0).any() or (weights != np.round(weights)).any():
+                raise ValueError("KLL sketches only support non-negative integer sample weights.")
+            weights = weights.astype(np.int64)
+            for value, weight in zip(values[weights > 1], weights[weights > 1]):
+                self.update_weighted(value, int(weight))
+            values = values[weights == 1]
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self._levels) - h - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+
+    def _ensure_level(self, h: int):
+        while len(self._levels) <= h:
+            self._levels.append(np.empty(0))
+
+    def _compress(self):
+        h = 0
+        while h < len(self._levels):
+            if len(self._levels[h]) > self._capacity(h):
+                self._compact(h)
+                # Adding a level lowers the capacity of every level below it, so start over
+                h = 0
+            else:
+                h += 1
+
+    def _compact(self, h: int):
+        items = np.sort(self._levels[h])
+        kept = np.empty(0)
+        if len(items) % 2:
+            # An odd item out stays at this level, keeping the promoted items' total weight exact
+            kept, items = items[-1:], items[:-1]
+
+        self._ensure_level(h + 1)
+        offset = int(self._rng.integers(2))
+        self._levels[h + 1] = np.concatenate([self._levels[h + 1], items[offset::2]])
+        self._levels[h] = kept
+
+
+class RunningMoments:
+    def __init__(self, n_columns: int):
+        """
+        Per-column count, mean and sum of squared deviations of the non-missing values, merged batch by batch with the
+        pairwise update of Chan et al., which stays accurate where a running sum of squares would cancel. Like the
+        sketches, moments of different chunks or workers can be merged.
+        """
+        self.count = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """The population variance, as np.nanvar and StandardScaler compute it."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.m2 / self.count, np.nan)
+
+    def update(self, X: np.ndarray, sample_weight: Optional[np.ndarray] = None) -> "RunningMoments":
+        """
+        Adds the rows of a 2D array, each counted `sample_weight` times. NaN values are ignored.
+        """
+        present = ~np.isnan(X)
+        weights = present.astype(np.float64)
+        if sample_weight is not None:
+            weights *= np.asarray(sample_weight, dtype=np.float64).reshape(-1, 1)
+        values = np.where(present, X, 0.0)
+
+        count = weights.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, (weights * values).sum(axis=0) / count, 0.0)
+        m2 = (weights * (values - mean) ** 2).sum(axis=0)
+        return self._merge(count, mean, m2)
+
+    def update_constant(self, values: np.ndarray, counts: np.ndarray) -> "RunningMoments":
+        """Adds `counts[j]` copies of `values[j]` to column j, e.g. the fill values of the missing entries."""
+        counts = np.asarray(counts, dtype=np.float64)
+        return self._merge(counts, np.where(counts > 0, values, 0.0), np.zeros_like(counts))
+
+    def merge(self, other: "RunningMoments") -> "RunningMoments":
+        return self._merge(other.count, other.mean, other.m2)
+
+    def _merge(self, count: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> "RunningMoments":
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(total > 0, count / total, 0.0)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * weight
+        self.count = total
+        return self
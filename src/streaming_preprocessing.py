@@ -0,0 +1,242 @@
+import logging
+from collections import Counter
+from typing import Callable, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+
+from src.fused_preprocessing import FusedPreprocessor, _CategoricalBlock, _NumericBlock
+from src.missing_values_handling import _mode
+from src.quantile_sketch import KLLSketch, RunningMoments
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _NumericStats:
+    def __init__(self, block: _NumericBlock, sketch_k: int, random_state: int):
+        """The running statistics of one numeric block, sized by its number of columns rather than rows."""
+        self.block = block
+        n_columns = len(block.columns)
+        method = block.imputer.method if block.imputer is not None else None
+
+        self.n_missing = np.zeros(n_columns, dtype=np.int64)
+        self.moments = RunningMoments(n_columns) if method == 'mean' else None
+        self.sketches = [KLLSketch(k=sketch_k, random_state=random_state + j) for j in range(n_columns)] \
+            if method == 'median' else None
+        # IQR bounds always come from sketches here, whatever backend the in-memory handler uses
+        self.outlier_handler = None if block.outlier_handler is None else clone(block.outlier_handler).set_params(
+            quantile_backend='kll', sketch_k=sketch_k, random_state=random_state)
+        self.counts = [Counter() for _ in range(n_columns)] if method == 'most_frequent' else None
+        self.scaled_moments = RunningMoments(n_columns)
+
+    def observe(self, X: pd.DataFrame):
+        out = np.empty((len(X), len(self.block.columns)), dtype=np.float64, order='F')
+        self.block._load(X, out)
+
+        self.n_missing += np.isnan(out).sum(axis=0)
+        if self.moments is not None:
+            self.moments.update(out)
+        for j in range(out.shape[1]):
+            if self.sketches is not None:
+                self.sketches[j].update(out[:, j])
+            if self.counts is not None:
+                self.counts[j].update(pd.Series(out[:, j]).value_counts(dropna=True).to_dict())
+        if self.outlier_handler is not None:
+            self.outlier_handler.partial_fit(out)
+
+    def finish_first_pass(self):
+        """Sets the fill values and capping bounds; the scaler moments need the capped values of a second pass."""
+        block = self.block
+        if block.imputer is not None:
+            block.fill_values = self._fill_values()
+            if self.outlier_handler is not None and self.n_missing.any():
+                # The imputed column j holds its fill value n_missing[j] more times: one weighted row per column
+                fill_rows = np.full((len(block.columns), len(block.columns)), np.nan)
+                np.fill_diagonal(fill_rows, block.fill_values)
+                self.outlier_handler.partial_fit(fill_rows, sample_weight=self.n_missing)
+
+        if self.outlier_handler is not None:
+            block.lower_bounds = self.outlier_handler.lower_bounds_
+            block.upper_bounds = self.outlier_handler.upper_bounds_
+
+    def observe_scaled(self, X: pd.DataFrame):
+        out = np.empty((len(X), len(self.block.columns)), dtype=np.float64, order='F')
+        self.block._load(X, out)
+        if self.block.fill_values is not None:
+            self.block._impute(out)
+        if self.block.lower_bounds is not None:
+            np.clip(out, self.block.lower_bounds, self.block.upper_bounds, out=out)
+        self.scaled_moments.update(out)
+
+    def finish(self):
+        scaler = self.block.scaler
+        if scaler is None:
+            return
+        self.block.mean = self.scaled_moments.mean if scaler.with_mean else None
+        if scaler.with_std:
+            # StandardScaler leaves constant columns unscaled
+            scale = np.sqrt(self.scaled_moments.variance)
+            self.block.scale = np.where(scale < 10 * np.finfo(np.float64).eps, 1.0, scale)
+
+    def _fill_values(self) -> np.ndarray:
+        imputer = self.block.imputer
+        if imputer.method == 'median':
+            return np.array([sketch.quantile(0.5) if sketch.count else np.nan for sketch in self.sketches])
+        if imputer.method == 'mean':
+            return self.moments.mean.copy()
+        if imputer.method == 'most_frequent':
+            return np.array([_mode(counts) for counts in self.counts], dtype=np.float64)
+        if imputer.method == 'constant':
+            if imputer.fill_value is None:
+                raise ValueError("The fill_value must be provided when method 'constant' is used.")
+            return np.full(len(self.block.columns), imputer.fill_value, dtype=np.float64)
+        raise ValueError(f"Unsupported method: {imputer.method}.")
+
+
+class _CategoricalStats:
+    def __init__(self, block: _CategoricalBlock):
+        """The running vocabulary and missing count of every column of one categorical block."""
+        self.block = block
+        self.counts = [Counter() for _ in block.columns]
+        self.n_missing = np.zeros(len(block.columns), dtype=np.int64)
+
+    def observe(self, X: pd.DataFrame):
+        for j, column in enumerate(self.block.columns):
+            values = X[column]
+            self.n_missing[j] += int(values.isna().sum())
+            self.counts[j].update(values.value_counts(dropna=True).to_dict())
+
+    def finish_first_pass(self):
+        """Sets the fill values and the sorted vocabularies, in the layout `_CategoricalBlock.fit` produces."""
+        block = self.block
+        imputer = block.imputer
+        if imputer is not None:
+            if imputer.method == 'most_frequent':
+                block.fill_values = {column: _mode(counts) for column, counts in zip(block.columns, self.counts)}
+            elif imputer.method == 'constant':
+                block.fill_values = {column: imputer.fill_value for column in block.columns}
+            else:
+                raise ValueError(f"Method '{imputer.method}' cannot fill the categorical branch '{block.name}'.")
+
+        block.categories = []
+        for column, counts, n_missing in zip(block.columns, self.counts, self.n_missing):
+            categories = set(counts)
+            missing = []
+            if n_missing:
+                if block.fill_values is not None:
+                    categories.add(block.fill_values[column])
+                else:
+                    missing = [np.nan]
+            block.categories.append(np.array(sorted(categories) + missing, dtype=object))
+        block._compile()
+
+    def observe_scaled(self, X: pd.DataFrame):
+        pass
+
+    def finish(self):
+        pass
+
+
+class StreamingPreprocessor:
+    def __init__(self, column_transformer: ColumnTransformer, sketch_k: int = 400, random_state: int = 42):
+        """
+        Fits the blocks of a `FusedPreprocessor` from an iterator of chunks instead of one dataframe, so the
+        preprocessing statistics of a file larger than memory can be learned with memory independent of its length.
+
+        The first pass collects, per column, missing counts, mean and variance moments, category vocabularies and
+        value counts, and a mergeable KLL quantile sketch of the numeric values, from which the medians and IQR
+        bounds are read. The fill value is added to each sketch with the weight of the missing entries, so the
+        bounds are those of the imputed column as in the in-memory pipeline. A second pass, run only when a branch
+        standardizes, collects the moments of the imputed and capped values for the scaler.
+
+        Vocabularies and bounds are exact; medians and IQR bounds are approximate to the rank error of the sketches,
+        about 1.65 / `sketch_k` of the number of rows.
+
+        :param:
+            column_transformer (ColumnTransformer): The unfitted column transformer, as accepted by FusedPreprocessor.
+            sketch_k (int): The accuracy parameter of the quantile sketches.
+            random_state (int): The seed of the quantile sketches.
+        """
+        self.column_transformer = column_transformer
+        self.sketch_k = sketch_k
+        self.random_state = random_state
+        self._fused = None
+
+    @property
+    def input_columns(self) -> List[str]:
+        columns = []
+        for _, transformer, transformer_columns in self.column_transformer.transformers:
+            if transformer != 'drop':
+                columns.extend(column for column in transformer_columns if column not in columns)
+        return columns
+
+    @property
+    def fused_preprocessor(self) -> FusedPreprocessor:
+        """The fitted FusedPreprocessor, to transform chunks or to save as the preprocessing step of a pipeline."""
+        if self._fused is None:
+            raise ValueError("StreamingPreprocessor is not fitted yet. Call 'fit' first.")
+        return self._fused
+
+    def fit(self, make_chunks: Callable[[], Iterable[pd.DataFrame]]) -> "StreamingPreprocessor":
+        """
+        :param:
+            make_chunks (Callable[[], Iterable[pd.DataFrame]]): Returns a new iterator over the chunks of the data,
+                e.g. `lambda: ingestor.ingest_chunks(file_path, chunksize)`. It is called once per pass.
+        :return:
+            StreamingPreprocessor: The fitted preprocessor.
+        """
+        fit_streaming([self], make_chunks)
+        return self
+
+    def transform(self, X: pd.DataFrame) -> Union[np.ndarray, sparse.csr_matrix]:
+        return self.fused_preprocessor.transform(X)
+
+    def _start(self) -> List[Union[_NumericStats, _CategoricalStats]]:
+        self._fused = None
+        self._blocks = FusedPreprocessor._compile(self.column_transformer)
+        return [_CategoricalStats(block) if isinstance(block, _CategoricalBlock)
+                else _NumericStats(block, self.sketch_k, self.random_state) for block in self._blocks]
+
+    def _finish(self):
+        fused = FusedPreprocessor(self.column_transformer)
+        fused._blocks = self._blocks
+        fused.feature_names_in_ = np.asarray(self.input_columns, dtype=object)
+        fused.n_features_in_ = len(fused.feature_names_in_)
+        self._fused = fused
+
+
+def fit_streaming(preprocessors: List[StreamingPreprocessor], make_chunks: Callable[[], Iterable[pd.DataFrame]]):
+    """
+    Fits several streaming preprocessors, e.g. of the features and of the target, in the same passes over the data.
+
+    :param:
+        preprocessors (List[StreamingPreprocessor]): The preprocessors to fit.
+        make_chunks (Callable[[], Iterable[pd.DataFrame]]): Returns a new iterator over the chunks of the data.
+    """
+    stats = [block_stats for preprocessor in preprocessors for block_stats in preprocessor._start()]
+
+    n_rows = 0
+    for chunk in make_chunks():
+        n_rows += len(chunk)
+        for block_stats in stats:
+            block_stats.observe(chunk)
+    if n_rows == 0:
+        raise ValueError("Cannot fit preprocessing statistics on an empty dataset.")
+    for block_stats in stats:
+        block_stats.finish_first_pass()
+    logger.info(f"Collected preprocessing statistics of {n_rows} rows")
+
+    if any(isinstance(block_stats, _NumericStats) and block_stats.block.scaler is not None for block_stats in stats):
+        for chunk in make_chunks():
+            for block_stats in stats:
+                block_stats.observe_scaled(chunk)
+        logger.info("Collected scaler moments of the imputed and capped values")
+
+    for block_stats in stats:
+        block_stats.finish()
+    for preprocessor in preprocessors:
+        preprocessor._finish()
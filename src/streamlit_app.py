@@ -1,7 +1,71 @@
-import streamlit as st
+import os
+import time
+from typing import Any, Dict, Tuple
 
+import numpy as np
+import pandas as pd
 import streamlit as st
 
+from src.ingest_data import CSVDataIngestor
+from src.prediction_service import PredictionService
+
+TRAIN_DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../data/train.csv')
+
+
+@st.cache_resource
+def load_prediction_service() -> PredictionService:
+    """
+    Loads the pinned or latest registered GradientBoosting model and its target scaler once per process, not on
+    every rerun.
+    """
+    return PredictionService.from_registry('GradientBoosting')
+
+
+@st.cache_resource
+def load_default_frame(_service: PredictionService) -> pd.DataFrame:
+    """
+    Builds the one-row model input holding the training-set defaults of every column: the median of numeric columns
+    and the most frequent value, missing included, of categorical columns. Computed once per process.
+    """
+    data = CSVDataIngestor(schema={}).ingest(TRAIN_DATA_PATH, columns=_service.columns)
+    defaults = {}
+    for column, dtype in _service.dtypes.items():
+        if dtype == 'float64':
+            defaults[column] = float(data[column].median())
+        else:
+            defaults[column] = data[column].value_counts(dropna=False).index[0]
+    return _service.to_frame([defaults])
+
+
+def to_code(label: Any) -> Any:
+    """
+    Maps a form value to its raw column code, e.g. "RL - Residential Low Density" to "RL", "20 - 1-STORY ..." to 20
+    and "NA - No alley access" to a missing value. Numbers are returned unchanged.
+    """
+    if not isinstance(label, str):
+        return label
+    code = label.split(" - ", 1)[0]
+    if code == "NA":
+        return np.nan
+    return int(code) if code.isdigit() else code
+
+
+def predict_price(inputs: Dict[str, Any]) -> Tuple[float, float]:
+    """
+    Predicts the sale price of the house described by the form, filling the other columns with the training defaults.
+
+    :return:
+        Tuple[float, float]: The predicted price and the prediction time in milliseconds.
+    """
+    start = time.perf_counter()
+    service = load_prediction_service()
+    frame = load_default_frame(service).copy()
+    for column, value in inputs.items():
+        frame[column] = pd.Series([to_code(value)], dtype=frame[column].dtype)
+
+    price = service.predict_frame(frame)[0]
+    return float(price), (time.perf_counter() - start) * 1000
+
 
 def main():
     st.markdown(
@@ -63,7 +127,7 @@ def main():
         # MSZoning
         st.subheader("MSZoning")
         ms_zoning = st.selectbox("General zoning classification of the sale:",
-                                 ["A - Agriculture", "C - Commercial", "FV - Floating Village Residential",
+                                 ["A - Agriculture", "C (all) - Commercial", "FV - Floating Village Residential",
                                   "I - Industrial", "RH - Residential High Density", "RL - Residential Low Density",
                                   "RP - Residential Low Density Park", "RM - Residential Medium Density"]
                                  )
@@ -95,7 +159,7 @@ def main():
                                      "BrkSide - Brookside", "ClearCr - Clear Creek", "CollgCr - College Creek",
                                      "Crawfor - Crawford", "Edwards - Edwards", "Gilbert - Gilbert",
                                      "IDOTRR - Iowa DOT and Rail Road", "MeadowV - Meadow Village",
-                                     "Mitchel - Mitchell", "Names - North Ames", "NoRidge - Northridge",
+                                     "Mitchel - Mitchell", "NAmes - North Ames", "NoRidge - Northridge",
                                      "NPkVill - Northpark Villa", "NridgHt - Northridge Heights",
                                      "NWAmes - Northwest Ames", "OldTown - Old Town", "SWISU - South & West of ISU",
                                      "Sawyer - Sawyer", "SawyerW - Sawyer West", "Somerst - Somerset",
@@ -109,9 +173,7 @@ def main():
 
     # Submit button
     if st.button("Submit"):
-        st.success("Data Submitted Successfully!")
-        st.write("Here is the data you submitted:")
-        st.write({
+        price, elapsed_ms = predict_price({
             "MSSubClass": ms_subclass,
             "MSZoning": ms_zoning,
             "LotFrontage": lot_frontage,
@@ -127,7 +189,10 @@ def main():
             "YearBuilt": year_built,
             "YearRemodAdd": year_remod
         })
+        st.success(f"Predicted sale price: ${price:,.0f}")
+        st.caption(f"Predicted in {elapsed_ms:.0f} ms")
 
 
+# Run from the repository root with `python -m streamlit run src/streamlit_app.py`
 if __name__ == "__main__":
     main()